@@ -0,0 +1,61 @@
+"""
+Benchmark of a million CooldownManager set/get operations
+Run from the repository root: python -m Benchmarks.bench_cooldowns
+"""
+
+import random
+import tracemalloc
+from time import perf_counter, sleep
+from typing import List
+from Utilities.cooldown import CooldownManager
+from Utilities.enums import CommandEnums, CooldownEnums
+
+OPERATIONS = 1_000_000
+USERS = 100_000
+GUILDS = 1_000
+COMMANDS = (CommandEnums.PICK_ROLE, CommandEnums.ADD_ROLE, CommandEnums.RELOAD)
+
+def _run(manager: CooldownManager, userIds: List[int], guildIds: List[int]) -> float:
+    """
+    Drive half a million set/get pairs through the manager
+    :return: Elapsed seconds
+    """
+    start = perf_counter()
+    for i in range(OPERATIONS // 2):
+        userId = userIds[i % USERS]
+        command = COMMANDS[i % len(COMMANDS)]
+        if i & 1:
+            manager.set_cooldown(command, userId, 1, CooldownEnums.GUILD, guildIds[i % GUILDS])
+            manager.get_cooldown(userId, command, guildIds[i % GUILDS])
+        else:
+            manager.set_cooldown(command, userId, 1, CooldownEnums.GLOBAL)
+            manager.get_cooldown(userId, command)
+    return perf_counter() - start
+
+def main() -> None:
+    rng = random.Random(0)
+    # snowflake sized ids so int keys are as large as in production
+    userIds = [rng.getrandbits(62) for _ in range(USERS)]
+    guildIds = [rng.getrandbits(62) for _ in range(GUILDS)]
+
+    elapsed = _run(CooldownManager(), userIds, guildIds)
+
+    # second pass under tracemalloc, which is too slow to time against
+    manager = CooldownManager()
+    tracemalloc.start()
+    _run(manager, userIds, guildIds)
+    _, peak = tracemalloc.get_traced_memory()
+
+    print(f"{OPERATIONS} set/get operations in {elapsed:.2f}s "
+          f"({OPERATIONS / elapsed:,.0f} ops/s, {elapsed / OPERATIONS * 1e9:.0f} ns/op)")
+    print(f"active cooldowns: {len(manager)}, peak traced memory: {peak / 2**20:.1f} MiB")
+
+    # every cooldown above was one second long, the next write sweeps them all
+    sleep(1.1)
+    manager.set_cooldown(CommandEnums.PING, userIds[0], 1, CooldownEnums.GLOBAL)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"after expiry: {len(manager)} active cooldowns, traced memory: {current / 2**20:.1f} MiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Micro-benchmark of per-query cost for interpolated vs registered statements
+Run from the repository root: python -m Benchmarks.bench_statements
+"""
+
+import sqlite3
+from time import perf_counter
+from typing import Callable, Tuple
+from Utilities.migrations import migrate
+from Utilities.queries import query, STATEMENT_CACHE_SIZE
+
+ITERATIONS = 20000
+GUILD_ID = 1000000000000000000
+
+def _make_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:", cached_statements=STATEMENT_CACHE_SIZE)
+    migrate(conn)
+    conn.execute(query("add_guild"), (GUILD_ID,))
+    for i in range(ITERATIONS):
+        conn.execute(query("add_user"), (i,))
+        conn.execute(query("add_guild_user"), (i, GUILD_ID, 1))
+    conn.commit()
+    return conn
+
+def _time(conn: sqlite3.Connection, run: Callable[[sqlite3.Connection, int], None]) -> float:
+    start = perf_counter()
+    for i in range(ITERATIONS):
+        run(conn, i)
+    return (perf_counter() - start) / ITERATIONS * 1e6
+
+BENCHMARKS: Tuple[Tuple[str, Callable, Callable], ...] = (
+    (
+        "get_user",
+        lambda conn, i: conn.execute(f"SELECT * FROM users WHERE user_id = {i};").fetchall(),
+        lambda conn, i: conn.execute(query("get_user"), (i,)).fetchall(),
+    ),
+    (
+        "get_guild_user",
+        lambda conn, i: conn.execute(
+            f"SELECT * FROM guild_users WHERE guild_id = {GUILD_ID} AND user_id = {i};").fetchall(),
+        lambda conn, i: conn.execute(query("get_guild_user"), (GUILD_ID, i)).fetchall(),
+    ),
+    (
+        "get_guild_user_permissions",
+        lambda conn, i: conn.execute(
+            f"SELECT permissions FROM guild_users WHERE guild_id = {GUILD_ID} AND user_id = {i};").fetchall(),
+        lambda conn, i: conn.execute(query("get_guild_user_permissions"), (GUILD_ID, i)).fetchall(),
+    ),
+    (
+        "add_assignable_guild_role",
+        lambda conn, i: conn.execute(f"""INSERT OR REPLACE INTO role_reactions(role_id, guild_id, role_name, descr)
+                                         VALUES({i}, {GUILD_ID}, 'role{i}', '');"""),
+        lambda conn, i: conn.execute(query("add_assignable_guild_role"), (i, GUILD_ID, f"role{i}", "")),
+    ),
+)
+
+def main() -> None:
+    conn = _make_connection()
+    print(f"{'query':<30}{'interpolated (us)':>20}{'registered (us)':>20}{'speedup':>10}")
+    for name, before, after in BENCHMARKS:
+        beforeCost = _time(conn, before)
+        afterCost = _time(conn, after)
+        print(f"{name:<30}{beforeCost:>20.2f}{afterCost:>20.2f}{beforeCost / afterCost:>9.2f}x")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
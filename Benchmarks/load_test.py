@@ -0,0 +1,336 @@
+"""
+Offline load test of the bot's command handlers
+Builds a Bot around a real interactions.Client that never connects, so extensions
+load exactly as they do in production, and drives their command callbacks with
+fake contexts whose Discord calls sleep for a simulated REST latency.
+Run from the repository root: python -m Benchmarks.load_test --users 2000
+With --max-p99-ms, --min-throughput or --max-errors it exits with 1 when a limit is exceeded.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+from statistics import quantiles
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from interactions import BaseCommand, Client, Extension, Permissions
+from bot import Bot
+from Utilities.rate_limit import RateLimiter
+
+DEVELOPER_ID = 311663246622982145
+GUILD_ID = 900000000000000000
+OWNER_ID = 800000000000000000
+
+class RestLatency:
+    """
+    Simulated Discord REST round trip
+    """
+    def __init__(self, meanMs: float, jitterMs: float) -> None:
+        self.mean = meanMs / 1000
+        self.jitter = jitterMs / 1000
+        self.calls = 0
+
+    async def __call__(self) -> None:
+        self.calls += 1
+        await asyncio.sleep(max(0, random.gauss(self.mean, self.jitter)))
+
+class FakeRole:
+    def __init__(self, id: int, name: str, permissions: int = 0) -> None:
+        self.id = id
+        self.name = name
+        self.permissions = permissions
+
+class FakeUser:
+    def __init__(self, id: int) -> None:
+        self.id = id
+        self.username = f"user{id}"
+        self.avatar_url = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+class FakeMember(FakeUser):
+    def __init__(self, id: int, roles: List[FakeRole], guild: "FakeGuild", rest: RestLatency) -> None:
+        super().__init__(id)
+        self.roles = roles
+        self._guild = guild
+        self._rest = rest
+
+    async def add_role(self, roleId: int) -> None:
+        await self._rest()
+        self.roles.append(self._guild.rolesById[int(roleId)])
+
+    async def add_roles(self, roleIds: List[int]) -> None:
+        await self._rest()
+        self.roles.extend(self._guild.rolesById[int(roleId)] for roleId in roleIds)
+
+    async def edit(self, roles: List[int] = None, **kwargs) -> None:
+        await self._rest()
+        if roles is not None:
+            self.roles = [self._guild.rolesById[int(roleId)] for roleId in roles]
+
+class FakeGuild:
+    def __init__(self, id: int, roles: List[FakeRole], rest: RestLatency) -> None:
+        self.id = id
+        self.roles = roles
+        self.rolesById = {role.id: role for role in roles}
+        self.members: Dict[int, FakeMember] = dict()
+        self._rest = rest
+
+    def member(self, userId: int) -> FakeMember:
+        if userId not in self.members:
+            self.members[userId] = FakeMember(userId, list(), self, self._rest)
+        return self.members[userId]
+
+    def get_role(self, roleId: int) -> Optional[FakeRole]:
+        return self.rolesById.get(int(roleId))
+
+    async def fetch_owner(self) -> FakeUser:
+        await self._rest()
+        return FakeUser(OWNER_ID)
+
+    async def fetch_member(self, userId: int) -> FakeMember:
+        await self._rest()
+        return self.member(int(userId))
+
+class FakeComponent:
+    def __init__(self, options: List[Any]) -> None:
+        self.options = options
+
+class FakeSlashContext:
+    def __init__(self, guild: FakeGuild, userId: int, rest: RestLatency) -> None:
+        self.guild = guild
+        self.guild_id = guild.id
+        self.member = guild.member(userId)
+        self.user = self.member
+        self.author = self.member
+        self._rest = rest
+        self.sent: List[Dict[str, Any]] = list()
+        self.message_id = random.getrandbits(60)
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> None:
+        await self._rest()
+        self.sent.append(dict(kwargs, content=content))
+
+    async def defer(self, **kwargs) -> None:
+        await self._rest()
+
+class FakeComponentContext(FakeSlashContext):
+    def __init__(self, guild: FakeGuild, userId: int, rest: RestLatency, customId: str,
+    values: Optional[List[str]] = None, component: Optional[FakeComponent] = None) -> None:
+        super().__init__(guild, userId, rest)
+        self.custom_id = customId
+        self.values = values or []
+        self.component = component
+
+    async def edit_origin(self, **kwargs) -> None:
+        await self._rest()
+        self.sent.append(kwargs)
+
+    async def delete(self, messageId: int) -> None:
+        await self._rest()
+
+def _select_options(sent: List[Dict[str, Any]]) -> List[Any]:
+    """
+    Dig the select options out of the components of the last response
+    """
+    if not sent:
+        return []
+    components = sent[-1].get("components") or []
+    stack = list(components) if isinstance(components, list) else [components]
+    while stack:
+        component = stack.pop()
+        if getattr(component, "options", None):
+            return list(component.options)
+        stack.extend(getattr(component, "components", None) or [])
+    return []
+
+class LoadTest:
+    """
+    Drives simulated users through the role commands and records every call's latency
+    """
+    def __init__(self, bot: Bot, client: Client, guild: FakeGuild, rest: RestLatency) -> None:
+        self.bot = bot
+        self.client = client
+        self.guild = guild
+        self.rest = rest
+        self.latencies: Dict[str, List[float]] = dict()
+        self.errors: Dict[str, int] = dict()
+        # first exception of each call, printed with the report
+        self.firstErrors: Dict[str, str] = dict()
+
+    def _extension(self, module: str) -> Extension:
+        return self.client.get_extensions(module)[0]
+
+    def _command(self, module: str, attribute: str) -> BaseCommand:
+        # the loaded command, its callback bound to the extension and instrumented like in production
+        for command in self._extension(module)._commands:
+            if getattr(command.callback, "__wrapped__", command.callback).func.__name__ == attribute:
+                return command
+        raise KeyError(f"{module} has no command {attribute}")
+
+    async def _call(self, name: str, module: str, attribute: str, *args) -> None:
+        command = self._command(module, attribute)
+        start = perf_counter()
+        try:
+            await command.callback(*args)
+        except Exception as e:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            self.firstErrors.setdefault(name, repr(e))
+        self.latencies.setdefault(name, list()).append(perf_counter() - start)
+
+    async def setup_roles(self, adminId: int) -> None:
+        for role in self.guild.roles:
+            if role.permissions:
+                continue
+            ctx = FakeSlashContext(self.guild, adminId, self.rest)
+            await self._call("add_role", "Commands.add_role", "add_role", ctx, role, f"The {role.name} role")
+
+    async def user_session(self, userId: int) -> None:
+        ctx = FakeSlashContext(self.guild, userId, self.rest)
+        await self._call("pick_role", "Commands.pick_role", "pick_role", ctx)
+        options = _select_options(ctx.sent)
+        if not options:
+            return
+
+        option = random.choice(options)
+        select = FakeComponentContext(self.guild, userId, self.rest, "SelectRole:0",
+                                      [str(option.value)], FakeComponent(options))
+        await self._call("select_role", "Commands.pick_role", "select_role", select)
+
+        apply = FakeComponentContext(self.guild, userId, self.rest, "ApplyRole:0")
+        await self._call("apply_role", "Commands.pick_role", "apply_role", apply)
+
+    async def reload(self) -> None:
+        ctx = FakeSlashContext(self.guild, DEVELOPER_ID, self.rest)
+        await self._call("reload", "Commands.reload", "reload", ctx)
+
+    async def run(self, users: int, concurrency: int, reloads: int) -> float:
+        semaphore = asyncio.Semaphore(concurrency)
+        userIds = [10**17 + i for i in range(users)]
+
+        async def limited(coroutine) -> None:
+            async with semaphore:
+                await coroutine
+
+        tasks = [limited(self.user_session(userId)) for userId in userIds]
+        tasks += [limited(self.reload()) for _ in range(reloads)]
+        random.shuffle(tasks)
+        start = perf_counter()
+        await asyncio.gather(*tasks)
+        return perf_counter() - start
+
+    def summarize(self) -> Dict[str, Tuple[int, float, float, float]]:
+        """
+        :return: Count, p50, p99 and max seconds of every call
+        """
+        summary: Dict[str, Tuple[int, float, float, float]] = dict()
+        for name, values in self.latencies.items():
+            values = sorted(values)
+            # inclusive, the default method extrapolates past the largest sample on small counts
+            cuts = quantiles(values, n=100, method="inclusive") if len(values) > 1 else values * 99
+            summary[name] = (len(values), cuts[49], cuts[98], values[-1])
+        return summary
+
+    def report(self, elapsed: float) -> None:
+        total = sum(len(values) for values in self.latencies.values())
+        print(f"{total} calls in {elapsed:.2f}s, {total / elapsed:,.0f} calls/s, "
+              f"{self.rest.calls} simulated REST calls")
+        print(f"{'call':<14}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+        for name, (count, p50, p99, slowest) in self.summarize().items():
+            print(f"{name:<14}{count:>8}{p50 * 1000:>10.1f}{p99 * 1000:>10.1f}"
+                  f"{slowest * 1000:>10.1f}{self.errors.get(name, 0):>8}")
+        for name, error in self.firstErrors.items():
+            print(f"first {name} error: {error}")
+
+    def check_limits(self, elapsed: float, maxP99Ms: Optional[float], minThroughput: Optional[float],
+    maxErrors: Optional[int]) -> List[str]:
+        """
+        Compare the run against the limits it was given, None skips a limit
+        :param elapsed: Seconds the run took
+        :param maxP99Ms: Highest p99 latency in milliseconds any call may have
+        :param minThroughput: Fewest calls per second the run must reach
+        :param maxErrors: Most failed calls across the run
+        :return: Description of every limit that was exceeded
+        """
+        problems: List[str] = list()
+        if maxP99Ms is not None:
+            for name, (_, _, p99, _) in self.summarize().items():
+                if p99 * 1000 > maxP99Ms:
+                    problems.append(f"{name} p99 {p99 * 1000:.1f}ms is above {maxP99Ms:g}ms")
+        total = sum(len(values) for values in self.latencies.values())
+        if minThroughput is not None and total / elapsed < minThroughput:
+            problems.append(f"throughput {total / elapsed:,.0f} calls/s is below {minThroughput:,g} calls/s")
+        errors = sum(self.errors.values())
+        if maxErrors is not None and errors > maxErrors:
+            problems.append(f"{errors} failed calls, at most {maxErrors} allowed")
+        return problems
+
+def build(args: argparse.Namespace) -> Tuple[Bot, Client, FakeGuild, RestLatency, Optional[str]]:
+    rest = RestLatency(args.rest_latency_ms, args.rest_jitter_ms)
+    roles = [FakeRole(GUILD_ID + 1, "Admin", permissions=Permissions.ADMINISTRATOR)]
+    roles += [FakeRole(GUILD_ID + 2 + i, f"role-{i:03d}") for i in range(args.roles)]
+    guild = FakeGuild(GUILD_ID, roles, rest)
+
+    directory = None
+    if args.memory:
+        conn = sqlite3.connect(":memory:")
+    else:
+        directory = tempfile.mkdtemp(prefix="mallard-load-")
+        conn = sqlite3.connect(os.path.join(directory, "mallard.db"))
+
+    # only used to load extensions and register events, it never logs in
+    client = Client(token="load-test")
+    # no command here draws cards or evaluates math, their workers would only add noise
+    bot = Bot(client, conn, asyncDatabase=not args.memory, writeBehind=args.write_behind, warmWorkers=False)
+    if not args.rate_limits:
+        bot._rateLimits = RateLimiter(policies={}, globalPolicies=[])
+    return bot, client, guild, rest, directory
+
+async def main(args: argparse.Namespace) -> int:
+    random.seed(args.seed)
+    bot, client, guild, rest, directory = build(args)
+    try:
+        for listener in client.listeners.get("ready", []):
+            await listener.callback()
+
+        test = LoadTest(bot, client, guild, rest)
+        await test.setup_roles(OWNER_ID)
+        test.latencies.clear()
+
+        elapsed = await test.run(args.users, args.concurrency, args.reloads)
+        test.report(elapsed)
+        problems = test.check_limits(elapsed, args.max_p99_ms, args.min_throughput, args.max_errors)
+    finally:
+        bot.close()
+        if directory and args.keep:
+            print(f"database left in {directory}")
+        elif directory:
+            shutil.rmtree(directory, ignore_errors=True)
+    for problem in problems:
+        print(f"FAIL {problem}")
+    return 1 if problems else 0
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000, help="simulated users, each opens, selects and applies")
+    parser.add_argument("--concurrency", type=int, default=500, help="users in flight at once")
+    parser.add_argument("--roles", type=int, default=40, help="self-assignable roles in the guild")
+    parser.add_argument("--reloads", type=int, default=5, help="/reload calls mixed into the run")
+    parser.add_argument("--rest-latency-ms", type=float, default=50, help="mean simulated REST latency")
+    parser.add_argument("--rest-jitter-ms", type=float, default=15, help="standard deviation of REST latency")
+    parser.add_argument("--memory", action="store_true", help="in-memory database, forces synchronous mode")
+    parser.add_argument("--write-behind", action="store_true", help="batch database writes")
+    parser.add_argument("--rate-limits", action="store_true", help="keep the default rate limits enabled")
+    parser.add_argument("--keep", action="store_true", help="keep the database directory for inspection")
+    parser.add_argument("--max-p99-ms", type=float, help="fail when any call's p99 latency is above this")
+    parser.add_argument("--min-throughput", type=float, help="fail below this many calls per second")
+    parser.add_argument("--max-errors", type=int, help="fail when more calls than this raised")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
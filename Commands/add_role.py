@@ -1,6 +1,6 @@
-from interactions import Extension, Client, SlashContext, slash_command, SlashCommandOption, OptionType, Permissions, Role, ChannelType
+from interactions import Extension, Client, SlashContext, ComponentContext, slash_command, component_callback, SlashCommandOption, OptionType, Permissions, Role, RoleSelectMenu, ChannelType
 from bot import Bot
-from Utilities.enums import CommandEnums, CooldownEnums
+from Utilities.enums import CommandEnums
 from typing import Optional
 
 class AddRole(Extension):
@@ -32,17 +32,62 @@ class AddRole(Extension):
     async def add_role(self, ctx: SlashContext, role: Role, descr: Optional[str] = "") -> None:
         await self._parent.sql.setup_bot_info(ctx)
 
-        cooldown = self._parent.get_cooldown(ctx.user.id, CommandEnums.ADD_ROLE)
+        cooldown = self._parent.check_rate_limit(CommandEnums.ADD_ROLE, ctx.user.id, ctx.guild_id)
         if cooldown:
             await ctx.send("You are on cooldown for this command for another " + str(cooldown) + " seconds.",
             ephemeral = True)
             return
         
-        self._parent.sql.add_assignable_guild_role(int(ctx.guild_id), int(role.id), role.name, descr = descr)
+        await self._parent.sql.add_assignable_guild_role_async(int(ctx.guild_id), int(role.id), role.name, descr = descr)
 
         await ctx.send(f"Role {role.name} added to self-assignment.", ephemeral=True)
-        self._parent.set_cooldown(CooldownEnums.GLOBAL, CommandEnums.ADD_ROLE, ctx.user.id, 5)
         
+    @slash_command(
+        name = "admin",
+        sub_cmd_name = "add-roles",
+        sub_cmd_description = "Pick many roles from this server to be self-assignable at once.",
+        default_member_permissions = Permissions.ADMINISTRATOR | Permissions.MANAGE_ROLES,
+        dm_permission = False
+    )
+    async def add_roles(self, ctx: SlashContext) -> None:
+        await self._parent.sql.setup_bot_info(ctx)
+
+        cooldown = self._parent.check_rate_limit(CommandEnums.ADD_ROLE, ctx.user.id, ctx.guild_id)
+        if cooldown:
+            await ctx.send("You are on cooldown for this command for another " + str(cooldown) + " seconds.",
+            ephemeral = True)
+            return
+
+        # the menu is ephemeral, so only the admin who ran the command can submit it
+        selectMenu = RoleSelectMenu(
+            custom_id = "AddRoles",
+            placeholder = "Select roles to make self-assignable...",
+            min_values = 1,
+            max_values = 25
+        )
+        await ctx.send("Pick the roles to make self-assignable, descriptions can be set with /admin add-role.",
+                       components=selectMenu, ephemeral=True)
+
+    @component_callback("AddRoles")
+    async def add_roles_selected(self, ctx: ComponentContext) -> None:
+        guildId = int(ctx.guild_id)
+        # roles that are already self-assignable keep their description
+        descrs = {roleId: descr for roleId, _, descr in await self._parent.sql.get_cached_guild_roles(guildId)}
+        roles = list()
+        for value in ctx.values:
+            # resolved to Role objects when the guild is cached, plain IDs otherwise
+            role = value if isinstance(value, Role) else ctx.guild.get_role(int(value))
+            if role:
+                roles.append((int(role.id), role.name, descrs.get(int(role.id), "")))
+        if not roles:
+            await ctx.edit_origin(content="None of those roles could be found.", components=[])
+            return
+
+        await self._parent.sql.add_assignable_guild_roles_async(guildId, roles)
+
+        await ctx.edit_origin(content="Roles " + ", ".join(roleName for _, roleName, _ in roles) +
+                              " added to self-assignment.", components=[])
+
     def add_parent(self, parent: Bot) -> None:
         self._parent = parent
 
@@ -0,0 +1,86 @@
+from interactions import Extension, Client, SlashContext, slash_command, SlashCommandOption, OptionType, User, File
+from bot import Bot
+from Utilities.enums import CommandEnums
+from Utilities.leveling import level_for_xp, xp_for_level
+from typing import Optional
+from io import BytesIO
+
+class Cards(Extension):
+    def __init__(self, client: Client) -> None:
+        self.client = client
+        self._parent: Bot = None
+
+    async def _check(self, ctx: SlashContext, commandId: CommandEnums) -> bool:
+        await self._parent.sql.setup_bot_info(ctx)
+
+        cooldown = self._parent.check_rate_limit(commandId, ctx.user.id, ctx.guild_id)
+        if cooldown:
+            await ctx.send("You are on cooldown for this command for another " + str(cooldown) + " seconds.",
+            ephemeral = True)
+            return False
+        return True
+
+    @slash_command(
+        name = "rank",
+        description = "Show a rank card with level and leaderboard position 🏅",
+        dm_permission = False,
+        options = [
+            SlashCommandOption(
+                name = "user",
+                description = "Whose rank to show.",
+                required = False,
+                type = OptionType.USER
+            )
+        ]
+    )
+    async def rank(self, ctx: SlashContext, user: Optional[User] = None) -> None:
+        if not await self._check(ctx, CommandEnums.RANK):
+            return
+
+        target = user if user else ctx.user
+        guildId, userId = int(ctx.guild_id), int(target.id)
+        xp = self._parent.levels.get_xp(guildId, userId)
+        level = level_for_xp(xp)
+        board = await self._parent.leaderboards.get(guildId)
+        card = await self._parent.cards.render_rank_card(userId, target.username, target.avatar_url, level, xp,
+                                                         xp_for_level(level), xp_for_level(level + 1),
+                                                         board.rank(userId))
+        await ctx.send(file=File(BytesIO(card), file_name="rank.png"))
+
+    @slash_command(
+        name = "profile",
+        description = "Show a profile card with level and balance 🪪",
+        dm_permission = False,
+        options = [
+            SlashCommandOption(
+                name = "user",
+                description = "Whose profile to show.",
+                required = False,
+                type = OptionType.USER
+            )
+        ]
+    )
+    async def profile(self, ctx: SlashContext, user: Optional[User] = None) -> None:
+        if not await self._check(ctx, CommandEnums.PROFILE):
+            return
+
+        target = user if user else ctx.user
+        guildId, userId = int(ctx.guild_id), int(target.id)
+        xp = self._parent.levels.get_xp(guildId, userId)
+        level = level_for_xp(xp)
+        card = await self._parent.cards.render_profile_card(userId, target.username, target.avatar_url, level, xp,
+                                                            xp_for_level(level), xp_for_level(level + 1),
+                                                            self._parent.sql.get_balance(userId))
+        await ctx.send(file=File(BytesIO(card), file_name="profile.png"))
+
+    def add_parent(self, parent: Bot) -> None:
+        self._parent = parent
+
+    def __str__(self) -> str:
+        return "Card commands: rank and profile cards drawn as images."
+
+    def __repr__(self) -> str:
+        return str(self)
+
+def setup(client: Client):
+    return Cards(client)
@@ -0,0 +1,96 @@
+from interactions import Extension, Client, SlashContext, slash_command, SlashCommandOption, OptionType, User, Embed, Color
+from bot import Bot
+from Utilities.enums import CommandEnums
+from typing import Optional
+
+class Economy(Extension):
+    def __init__(self, client: Client) -> None:
+        self.client = client
+        self._parent: Bot = None
+
+    @slash_command(
+        name = "balance",
+        description = "Show your currency balance 💰",
+        dm_permission = False,
+        options = [
+            SlashCommandOption(
+                name = "user",
+                description = "Whose balance to show.",
+                required = False,
+                type = OptionType.USER
+            )
+        ]
+    )
+    async def balance(self, ctx: SlashContext, user: Optional[User] = None) -> None:
+        await self._parent.sql.setup_bot_info(ctx)
+
+        cooldown = self._parent.check_rate_limit(CommandEnums.BALANCE, ctx.user.id, ctx.guild_id)
+        if cooldown:
+            await ctx.send("You are on cooldown for this command for another " + str(cooldown) + " seconds.",
+            ephemeral = True)
+            return
+
+        target = user if user else ctx.user
+        embed = Embed()
+        embed.color = Color().random()
+        embed.title = "Balance"
+        embed.add_field(name=target.username, value=str(self._parent.sql.get_balance(int(target.id))))
+        if int(target.id) == int(ctx.user.id):
+            history = await self._parent.sql.get_currency_history_async(int(ctx.user.id)) or []
+            lines = [f"{amount:+d} {reason}" + (f" (<@{counterparty}>)" if counterparty else "")
+                     for amount, reason, counterparty, _ in history]
+            if lines:
+                embed.add_field(name="Recent", value="\n".join(lines))
+        await ctx.send(embed=embed, ephemeral=True)
+
+    @slash_command(
+        name = "pay",
+        description = "Give some of your currency to another user 💸",
+        dm_permission = False,
+        options = [
+            SlashCommandOption(
+                name = "user",
+                description = "The user to pay.",
+                required = True,
+                type = OptionType.USER
+            ),
+            SlashCommandOption(
+                name = "amount",
+                description = "How much to pay.",
+                required = True,
+                type = OptionType.INTEGER,
+                min_value = 1
+            )
+        ]
+    )
+    async def pay(self, ctx: SlashContext, user: User, amount: int) -> None:
+        await self._parent.sql.setup_bot_info(ctx)
+
+        cooldown = self._parent.check_rate_limit(CommandEnums.PAY, ctx.user.id, ctx.guild_id)
+        if cooldown:
+            await ctx.send("You are on cooldown for this command for another " + str(cooldown) + " seconds.",
+            ephemeral = True)
+            return
+
+        if int(user.id) == int(ctx.user.id) or user.bot or amount < 1:
+            await ctx.send("You can't pay that user.", ephemeral=True)
+            return
+
+        balances = await self._parent.sql.transfer_currency_async(int(ctx.user.id), int(user.id), amount)
+        if balances is None:
+            await ctx.send(f"You only have {self._parent.sql.get_balance(int(ctx.user.id))}.", ephemeral=True)
+            return
+
+        await ctx.send(f"Paid {amount} to {user.mention}. Your balance is now {balances[0]}.")
+
+    def add_parent(self, parent: Bot) -> None:
+        self._parent = parent
+
+    def __str__(self) -> str:
+        return "Economy commands: check balances and pay other users."
+
+    def __repr__(self) -> str:
+        return str(self)
+
+def setup(client: Client):
+    return Economy(client)
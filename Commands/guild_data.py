@@ -0,0 +1,120 @@
+from interactions import Extension, Client, SlashContext, slash_command, SlashCommandOption, SlashCommandChoice, OptionType, Attachment, File
+from bot import Bot
+from Utilities.enums import UserType, GUILD_DATA_FORMATS
+from Utilities.guild_data import format_for_path
+from os import close, fdopen, makedirs, path, remove
+from shutil import move
+from tempfile import mkstemp
+from time import time
+
+# exports are kept here on the bot's host, larger ones can't be attached
+EXPORT_DIRECTORY = "exports"
+# Discord's attachment limit for bots
+MAX_ATTACHMENT_BYTES = 25 * 1024 * 1024
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+FORMAT_OPTION = SlashCommandOption(
+    name = "format",
+    description = "File format, JSONL unless given.",
+    required = False,
+    type = OptionType.STRING,
+    choices = [SlashCommandChoice(name=fmt.upper(), value=fmt) for fmt in GUILD_DATA_FORMATS]
+)
+
+class GuildData(Extension):
+    def __init__(self, client: Client) -> None:
+        self.client = client
+        self._parent: Bot = None
+
+    async def _check(self, ctx: SlashContext) -> bool:
+        await self._parent.sql.setup_bot_info(ctx)
+
+        userPerms = await self._parent.sql.derive_user_permissions(ctx)
+        if userPerms != UserType.DEVELOPER.value:
+            await ctx.send("Your permissions level is not high enough for this command.", ephemeral=True)
+            return False
+        return True
+
+    @slash_command(
+        name = "guild-data",
+        sub_cmd_name = "export",
+        sub_cmd_description = "Export this server's bot data 📤 (Dev Tool)",
+        dm_permission = False,
+        options = [FORMAT_OPTION]
+    )
+    async def export(self, ctx: SlashContext, format: str = "jsonl") -> None:
+        if not await self._check(ctx):
+            return
+        await ctx.defer(ephemeral=True)
+
+        fileName = f"guild_{int(ctx.guild_id)}_{int(time())}.{format}"
+        descriptor, exportPath = mkstemp(suffix="." + format)
+        close(descriptor)
+        try:
+            counts = await self._parent.sql.export_guild_async(int(ctx.guild_id), exportPath, format)
+
+            summary = "Exported " + ", ".join(f"{amount} {table}" for table, amount in counts.items()) + "."
+            if path.getsize(exportPath) > MAX_ATTACHMENT_BYTES:
+                # only exports that can't be attached stay on the host
+                makedirs(EXPORT_DIRECTORY, exist_ok=True)
+                keptPath = move(exportPath, path.join(EXPORT_DIRECTORY, fileName))
+                await ctx.send(summary + f" The export is too large to attach, it was kept at `{keptPath}`.",
+                               ephemeral=True)
+                return
+            await ctx.send(summary, file=File(exportPath, file_name=fileName), ephemeral=True)
+        finally:
+            if path.exists(exportPath):
+                remove(exportPath)
+
+    @slash_command(
+        name = "guild-data",
+        sub_cmd_name = "import",
+        sub_cmd_description = "Import a bot data export 📥 (Dev Tool)",
+        dm_permission = False,
+        options = [
+            SlashCommandOption(
+                name = "file",
+                description = "A file made by /guild-data export.",
+                required = True,
+                type = OptionType.ATTACHMENT
+            ),
+            FORMAT_OPTION
+        ]
+    )
+    async def import_(self, ctx: SlashContext, file: Attachment, format: str = None) -> None:
+        if not await self._check(ctx):
+            return
+        await ctx.defer(ephemeral=True)
+
+        # streamed to disk so the import never holds the whole file
+        import aiohttp
+        format = format or format_for_path(file.filename)
+        descriptor, importPath = mkstemp(suffix="." + format)
+        try:
+            with fdopen(descriptor, "wb") as fp:
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(file.url) as response:
+                        response.raise_for_status()
+                        async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_BYTES):
+                            fp.write(chunk)
+            counts, guildIds = await self._parent.import_guild_data(importPath, format)
+        except Exception as e:
+            await ctx.send(f"Import failed, nothing was changed: {e}", ephemeral=True)
+            return
+        finally:
+            remove(importPath)
+
+        await ctx.send("Imported " + ", ".join(f"{amount} {table}" for table, amount in counts.items()) +
+                       f" for {len(guildIds)} server(s).", ephemeral=True)
+
+    def add_parent(self, parent: Bot) -> None:
+        self._parent = parent
+
+    def __str__(self) -> str:
+        return "Guild data commands: export and import one server's bot data."
+
+    def __repr__(self) -> str:
+        return str(self)
+
+def setup(client: Client):
+    return GuildData(client)
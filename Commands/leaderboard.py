@@ -0,0 +1,86 @@
+from interactions import Extension, Client, SlashContext, ComponentContext, slash_command, component_callback, SlashCommandOption, OptionType, Embed, Color, Button, ButtonStyle, spread_to_rows
+from bot import Bot
+from Utilities.enums import CommandEnums
+from Utilities.interaction_state import encode_custom_id, decode_custom_id
+from Utilities.leaderboard import GuildLeaderboard
+from Utilities.leveling import level_for_xp
+from typing import Union, Optional
+import re
+
+class Leaderboard(Extension):
+    def __init__(self, client: Client) -> None:
+        self.client = client
+        self._parent: Bot = None
+
+    def _make_embed(self, ctx: Union[SlashContext, ComponentContext], board: GuildLeaderboard, page: int) -> Embed:
+        embed = Embed()
+        embed.color = Color().random()
+        embed.title = "Leaderboard"
+        # mentions render names client side, no member fetches needed
+        lines = [f"**#{rank}** <@{userId}> level {level_for_xp(xp)} ({xp} XP)" for rank, userId, xp in board.page(page)]
+        embed.description = "\n".join(lines) if lines else "Nobody has earned XP here yet."
+
+        userId = int(ctx.user.id)
+        rank = board.rank(userId)
+        if rank is not None:
+            xp = board.xp[userId]
+            embed.add_field(name="Your rank", value=f"#{rank} of {len(board)}, level {level_for_xp(xp)} ({xp} XP)")
+        embed.set_footer(text=f"Page {page + 1}/{board.page_count()}")
+        return embed
+
+    def _make_components(self, board: GuildLeaderboard, page: int) -> list:
+        if board.page_count() <= 1:
+            return []
+        return spread_to_rows(
+            Button(custom_id = encode_custom_id("LeaderboardPage", page - 1), style = ButtonStyle.GREY,
+                   label = "Previous", disabled = page <= 0),
+            Button(custom_id = encode_custom_id("LeaderboardPage", page + 1), style = ButtonStyle.GREY,
+                   label = "Next", disabled = page >= board.page_count() - 1),
+        )
+
+    @slash_command(
+        name = "leaderboard",
+        description = "Show this server's XP leaderboard 🏆",
+        dm_permission = False,
+        options = [
+            SlashCommandOption(
+                name = "page",
+                description = "Page of the leaderboard to show.",
+                required = False,
+                type = OptionType.INTEGER,
+                min_value = 1
+            )
+        ]
+    )
+    async def leaderboard(self, ctx: SlashContext, page: Optional[int] = 1) -> None:
+        await self._parent.sql.setup_bot_info(ctx)
+
+        cooldown = self._parent.check_rate_limit(CommandEnums.LEADERBOARD, ctx.user.id, ctx.guild_id)
+        if cooldown:
+            await ctx.send("You are on cooldown for this command for another " + str(cooldown) + " seconds.",
+            ephemeral = True)
+            return
+
+        board = await self._parent.leaderboards.get(int(ctx.guild_id))
+        page = min(max(0, page - 1), board.page_count() - 1)
+        await ctx.send(embed=self._make_embed(ctx, board, page), components=self._make_components(board, page))
+
+    @component_callback(re.compile(r"^LeaderboardPage:-?\d+$"))
+    async def change_page(self, ctx: ComponentContext) -> None:
+        _, values = decode_custom_id(ctx.custom_id)
+
+        board = await self._parent.leaderboards.get(int(ctx.guild_id))
+        page = min(max(0, int(values[0])), board.page_count() - 1)
+        await ctx.edit_origin(embed=self._make_embed(ctx, board, page), components=self._make_components(board, page))
+
+    def add_parent(self, parent: Bot) -> None:
+        self._parent = parent
+
+    def __str__(self) -> str:
+        return "Leaderboard command: ranks a server's members by XP."
+
+    def __repr__(self) -> str:
+        return str(self)
+
+def setup(client: Client):
+    return Leaderboard(client)
@@ -0,0 +1,56 @@
+from interactions import Extension, Client, SlashContext, slash_command, SlashCommandOption, OptionType
+from bot import Bot
+from Utilities.enums import CommandEnums, CooldownEnums
+from Utilities.math_eval import MathError, normalize
+
+# seconds between evaluations per user
+MATH_COOLDOWN = 5
+
+class Math(Extension):
+    def __init__(self, client: Client) -> None:
+        self.client = client
+        self._parent: Bot = None
+
+    @slash_command(
+        name = "math",
+        description = "Evaluate, simplify or solve a math expression 🧮",
+        options = [
+            SlashCommandOption(
+                name = "expression",
+                description = "For example 2^10, sin(pi/4), (x+1)^2 or x^2 = 4.",
+                required = True,
+                type = OptionType.STRING,
+                max_length = 200
+            )
+        ]
+    )
+    async def math(self, ctx: SlashContext, expression: str) -> None:
+        await self._parent.sql.setup_bot_info(ctx)
+
+        cooldown = self._parent.get_cooldown(ctx.user.id, CommandEnums.MATH)
+        if cooldown:
+            await ctx.send("You are on cooldown for this command for another " + str(cooldown) + " seconds.",
+            ephemeral = True)
+            return
+        self._parent.set_cooldown(CooldownEnums.GLOBAL, CommandEnums.MATH, ctx.user.id, MATH_COOLDOWN)
+
+        # a cold evaluation can outlast the initial response window
+        await ctx.defer()
+        try:
+            result = await self._parent.math.evaluate(expression)
+        except MathError as e:
+            await ctx.send(f"Couldn't evaluate `{normalize(expression)}`: {e}")
+            return
+        await ctx.send(f"`{normalize(expression)}`\n```\n{result}\n```")
+
+    def add_parent(self, parent: Bot) -> None:
+        self._parent = parent
+
+    def __str__(self) -> str:
+        return "Math command: evaluates expressions with sympy in worker processes."
+
+    def __repr__(self) -> str:
+        return str(self)
+
+def setup(client: Client):
+    return Math(client)
@@ -1,148 +1,186 @@
-from interactions import Extension, Client, Permissions, CommandType, ComponentContext, SlashContext, slash_command, component_callback, StringSelectMenu, StringSelectOption, Embed, Color, Button, ButtonStyle, spread_to_rows
-from time import time
+from interactions import Extension, Client, Permissions, CommandType, ComponentContext, SlashContext, slash_command, component_callback, StringSelectMenu, StringSelectOption, Embed, Color, Button, ButtonStyle, spread_to_rows, SlashCommandOption, OptionType
 from bot import Bot
-from Utilities.enums import CommandEnums, CooldownEnums
-from typing import Tuple, List, Dict, Any, Union, Optional
-import json
+from Utilities.enums import CommandEnums
+from Utilities.interaction_state import encode_custom_id, decode_custom_id
+from Utilities.role_menu import RoleMenuPages
+from Utilities.role_cache import RoleData
+from typing import Tuple, List, Dict, Any, Union, Optional, Set
+import re
+
+# most roles that can be picked in one go, Discord caps select menus at 25 values
+MAX_ROLE_PICKS = 25
 
 class PickRole(Extension):
     def __init__(self, client: Client) -> None:
         self.client = client
         self._parent: Bot = None
-        self.guildSelections: Dict[str, Tuple[List[Tuple[int, str]], float]] = dict()
-        self.selectionTracker: Dict[str, Tuple(int, str, str)] = dict()
 
-    def _make_embed(self, ctx: Union[SlashContext, ComponentContext], roleName: Optional[str] = None, \
-                    roleDesc: Optional[str] = None, applied: bool = False):
+    def _make_embed(self, ctx: Union[SlashContext, ComponentContext], roles: Optional[List[RoleData]] = None,
+                    applied: bool = False):
         embed = Embed()
         embed.color = Color().random()
         embed.title = "Pick a role"
-        if roleName and not applied:
+        if roles and not applied and len(roles) == 1:
+            _, roleName, roleDesc = roles[0]
             embed.add_field(name="Role name", value=roleName)
             embed.add_field(name="Description", value=roleDesc if roleDesc and roleDesc != "" else "No description.")
+        elif roles and not applied:
+            embed.add_field(name="Selected roles", value="\n".join(
+                f"**{roleName}**: {roleDesc}" if roleDesc else f"**{roleName}**" for _, roleName, roleDesc in roles))
         else:
-            embed.add_field(name="Role picker", value="Select a role from the dropdown and click 'Apply' to be given that role.")
+            embed.add_field(name="Role picker", value="Select one or more roles from the dropdown and click 'Apply' to be given them.")
             if applied:
-                embed.add_field(name="Last applied role", value=roleName)
+                embed.add_field(name="Last applied roles" if len(roles) > 1 else "Last applied role",
+                                value=", ".join(roleName for _, roleName, _ in roles))
         embed.set_footer(text="Interaction available for: " + ctx.user.username, icon_url=ctx.user.avatar_url)
         return embed
-    
-    def _get_role_data(self, ctx: Union[SlashContext, ComponentContext]) -> List[Tuple[int, str, str]]:
-        roleData: List[Tuple[int, str, str]] = list()
-
-        # cache and re-grab every 10 seconds
-        if self.guildSelections.get(ctx.guild_id):
-            data, last = self.guildSelections.get(ctx.guild_id)
-            if time() - last >= 10:
-                roleData = self._parent.sql.get_assignable_guild_roles(int(ctx.guild_id))
-                self.guildSelections[ctx.guild_id] = (roleData, time())
-            else:
-                roleData = data
-        else:
-            roleData = self._parent.sql.get_assignable_guild_roles(int(ctx.guild_id))
-
-        return roleData
-    
-    async def _get_filtered_role_data(self, ctx: Union[SlashContext, ComponentContext]) -> List[Tuple[int, str, str]]:
-        roleData = self._get_role_data(ctx)
-        filteredData: List[Tuple[int, str, str]] = list()
-        userMember = await ctx.guild.fetch_member(ctx.user.id)
-        # using a dict for O(1) accesses, only O(n) instantiation keeping this from O(n^2)
-        userRoles = {str(role.id): True for role in userMember.roles}
-        for role in roleData:
-            if str(role[0]) not in userRoles:
-                filteredData.append(role)
-        
-        return filteredData
 
+    async def _get_pages(self, ctx: Union[SlashContext, ComponentContext]) -> RoleMenuPages:
+        """
+        Get the guild's precomputed menu pages, rebuilt only when its roles change
+        """
+        guildId = int(ctx.guild_id)
+        roleData = await self._parent.sql.get_cached_guild_roles(guildId)
+        return self._parent.roles.derived(guildId, "menu_pages", RoleMenuPages) or RoleMenuPages(roleData)
+
+    async def _get_held_role_ids(self, ctx: Union[SlashContext, ComponentContext]) -> Set[int]:
+        # handlers of the same member, e.g. quick page changes, share one fetch
+        userMember = await self._parent.rest.fetch("member", int(ctx.guild_id), int(ctx.user.id),
+                                                   lambda: ctx.guild.fetch_member(ctx.user.id))
+        # a set for O(1) accesses while filtering a page
+        return {int(role.id) for role in userMember.roles}
+
+    def _get_search(self, ctx: Union[SlashContext, ComponentContext]) -> Optional[str]:
+        return self._parent.state.get(("RoleSearch", int(ctx.user.id)))
+
+    def _make_components(self, pages: RoleMenuPages, page: int, options: List[StringSelectOption],
+                         search: Optional[str], selected: bool = False) -> list:
+        """
+        Build the select menu for a page along with apply and page buttons
+        """
+        selectMenu = StringSelectMenu(
+            options,
+            custom_id = encode_custom_id("SelectRole", page),
+            placeholder = "Select roles...",
+            min_values = 1,
+            max_values = min(MAX_ROLE_PICKS, len(options)),
+        )
+        buttons: List[Button] = list()
+        if selected:
+            buttons.append(Button(custom_id = encode_custom_id("ApplyRole", page), style = ButtonStyle.GREEN,
+                                  label = "Apply"))
+        pageCount = pages.page_count(search)
+        if pageCount > 1:
+            buttons.append(Button(custom_id = encode_custom_id("RolePage", page - 1), style = ButtonStyle.GREY,
+                                  label = "Previous", disabled = page <= 0))
+            buttons.append(Button(custom_id = encode_custom_id("RolePage", page + 1), style = ButtonStyle.GREY,
+                                  label = f"Next ({page + 1}/{pageCount})", disabled = page >= pageCount - 1))
+        return spread_to_rows(selectMenu, *buttons)
 
     @slash_command(
         name = "role",
         sub_cmd_name = "list",
         sub_cmd_description = "Display a list of roles available to pick from.",
         dm_permission = False,
+        options = [
+            SlashCommandOption(
+                name = "search",
+                description = "Only list roles whose names start with this.",
+                required = False,
+                type = OptionType.STRING
+            )
+        ]
     )
-    async def pick_role(self, ctx: SlashContext) -> None:
+    async def pick_role(self, ctx: SlashContext, search: Optional[str] = None) -> None:
         await self._parent.sql.setup_bot_info(ctx)
 
-        cooldown = self._parent.get_cooldown(ctx.user.id, CommandEnums.PICK_ROLE)
+        cooldown = self._parent.check_rate_limit(CommandEnums.PICK_ROLE, ctx.user.id, ctx.guild_id)
         if cooldown:
             await ctx.send("You are on cooldown for this command for another " + str(cooldown) + " seconds.",
             ephemeral = True)
             return
-        
-        roleData = await self._get_filtered_role_data(ctx)
 
-        if len(roleData) < 1:
+        if search:
+            self._parent.state.set(("RoleSearch", int(ctx.user.id)), search)
+        else:
+            self._parent.state.pop(("RoleSearch", int(ctx.user.id)))
+
+        pages = await self._get_pages(ctx)
+        page, options = pages.page(0, await self._get_held_role_ids(ctx), search)
+
+        if len(options) < 1:
             await ctx.send("No roles are available for self-assignment.", ephemeral=True)
             return
 
-        selectMenu = StringSelectMenu(
-            [
-                StringSelectOption(
-                    label = roleName,
-                    value = json.dumps([role, roleName, descr])
-                ) for role, roleName, descr in roleData
-            ],
-            custom_id = "SelectRole",
-            placeholder = "Select a role...",
-        )
+        await ctx.send(embed=self._make_embed(ctx), ephemeral=True,
+                       components = self._make_components(pages, page, options, search))
 
-        await ctx.send(embed=self._make_embed(ctx), ephemeral=True, components = selectMenu)
-        self._parent.set_cooldown(CooldownEnums.GLOBAL, CommandEnums.PICK_ROLE, ctx.user.id, 5)
-
-    @component_callback("SelectRole")
+    @component_callback(re.compile(r"^SelectRole(:\d+)?$"))
     async def select_role(self, ctx: ComponentContext) -> None:
-        roleId, roleName, roleDescr = json.loads(ctx.values[0])
-        self.selectionTracker[ctx.user.id] = (roleId, roleName, roleDescr)
+        _, values = decode_custom_id(ctx.custom_id)
+        page = int(values[0]) if values else 0
 
-        applyButton = Button(
-            custom_id = "ApplyRole",
-            style = ButtonStyle.GREEN,
-            label = "Apply"
-        )
+        pages = await self._get_pages(ctx)
+        roles = [pages.byId[int(value)] for value in ctx.values if int(value) in pages.byId]
+        if not roles:
+            await ctx.edit_origin(content="Those roles are no longer available.", embed=None, components=None)
+            return
+        self._parent.state.set(("SelectRole", int(ctx.user.id)), roles)
 
-        componentRow = spread_to_rows(ctx.component, applyButton, max_in_row=2)
+        # the menu itself is unchanged, only the buttons around it are rebuilt
+        search = self._get_search(ctx)
+        componentRows = self._make_components(pages, page, ctx.component.options, search, selected=True)
 
-        await ctx.edit_origin(embed=self._make_embed(ctx, roleName, roleDescr), components=componentRow)
+        await ctx.edit_origin(embed=self._make_embed(ctx, roles), components=componentRows)
 
-    @component_callback("ApplyRole")
+    @component_callback(re.compile(r"^ApplyRole(:\d+)?$"))
     async def apply_role(self, ctx: ComponentContext) -> None:
-        roleId, roleName, roleDescr = int(), str(), str()
+        _, values = decode_custom_id(ctx.custom_id)
+        page = int(values[0]) if values else 0
 
-        if self.selectionTracker.get(ctx.user.id):
-            roleId, roleName, roleDescr = self.selectionTracker.get(ctx.user.id)
-        else:
+        roles = self._parent.state.pop(("SelectRole", int(ctx.user.id)))
+        if not roles:
             await ctx.edit_origin(content="Something went wrong.", embed=None, components=None)
             return
-        
-        await ctx.member.add_role(roleId)
-        
-        self.selectionTracker.pop(ctx.user.id)
-        
-        roleData = await self._get_filtered_role_data(ctx)
-
-        if len(roleData) < 1:
+
+        # add_roles is a single member edit, afterwards the new role set is known without fetching the member
+        heldRoleIds = {int(role.id) for role in ctx.member.roles}
+        pickedRoleIds = [roleId for roleId, _, _ in roles if roleId not in heldRoleIds]
+        if pickedRoleIds:
+            await ctx.member.add_roles(pickedRoleIds)
+            # a member fetched before the edit is stale, don't wait for the gateway to say so
+            self._parent.rest.invalidate(int(ctx.guild_id), int(ctx.user.id))
+        newRoleIds = heldRoleIds.union(pickedRoleIds)
+
+        search = self._get_search(ctx)
+        pages = await self._get_pages(ctx)
+        page, options = pages.page(page, newRoleIds, search)
+
+        if len(options) < 1:
             message_id = ctx.message_id
             await ctx.send(content="No more roles are available for self-assignment.", ephemeral=True)
             await ctx.delete(message_id)
             return
 
-        selectMenu = StringSelectMenu(
-            [
-                StringSelectOption(
-                    label = roleName,
-                    value = json.dumps([role, roleName, descr])
-                ) for role, roleName, descr in roleData
-            ],
-            custom_id = "SelectRole",
-            placeholder = "Select a role...",
-        )
+        await ctx.edit_origin(embed=self._make_embed(ctx, roles, applied=True),
+                              components=self._make_components(pages, page, options, search))
+
+    @component_callback(re.compile(r"^RolePage:-?\d+$"))
+    async def change_page(self, ctx: ComponentContext) -> None:
+        _, values = decode_custom_id(ctx.custom_id)
 
-        await ctx.edit_origin(embed=self._make_embed(ctx, roleName, applied=True), components=selectMenu)
+        search = self._get_search(ctx)
+        pages = await self._get_pages(ctx)
+        page, options = pages.page(int(values[0]), await self._get_held_role_ids(ctx), search)
+
+        if len(options) < 1:
+            await ctx.edit_origin(content="No more roles are available for self-assignment.", embed=None,
+                                  components=None)
+            return
 
+        await ctx.edit_origin(embed=self._make_embed(ctx),
+                              components=self._make_components(pages, page, options, search))
 
-        
     def add_parent(self, parent: Bot) -> None:
         self._parent = parent
 
@@ -153,4 +191,4 @@ class PickRole(Extension):
         return str(self)
 
 def setup(client: Client):
-    return PickRole(client)
\ No newline at end of file
+    return PickRole(client)
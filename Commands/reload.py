@@ -1,6 +1,6 @@
 from interactions import SlashContext, Extension, Client, slash_command
 from bot import Bot
-from Utilities.enums import UserType
+from Utilities.enums import UserType, CommandEnums
 
 # will need to lock down to only me being able to use this
 
@@ -17,14 +17,23 @@ class Reload(Extension):
     async def reload(self, ctx: SlashContext) -> None:
         await self._parent.sql.setup_bot_info(ctx)
 
-        userPerms = await self._parent.sql.get_guild_user_permissions(int(ctx.guild_id), int(ctx.user.id))
+        userPerms = await self._parent.sql.derive_user_permissions(ctx)
         if not userPerms:
             await ctx.send("Unable to load your user data.", ephemeral=True)
             return
         
         if userPerms == UserType.DEVELOPER.value:
-            await self._parent.reload_commands()
-            await ctx.send("Reloaded Commands.", ephemeral=True)
+            cooldown = self._parent.check_rate_limit(CommandEnums.RELOAD, ctx.user.id, ctx.guild_id)
+            if cooldown:
+                await ctx.send("Commands were just reloaded, try again in " + str(cooldown) + " seconds.",
+                ephemeral = True)
+                return
+            report = await self._parent.reload_commands()
+            if not report:
+                await ctx.send("No command changes found.", ephemeral=True)
+                return
+            lines = [f"`{command}` {action} in {elapsed * 1000:.1f}ms" for command, action, elapsed in report]
+            await ctx.send("Reloaded Commands.\n" + "\n".join(lines), ephemeral=True)
         else:
             await ctx.send("Your permissions level is not high enough for this command.")
     
@@ -0,0 +1,65 @@
+from interactions import SlashContext, Extension, Client, slash_command
+from bot import Bot
+from Utilities.enums import UserType
+from Utilities.metrics import PHASES
+
+class Stats(Extension):
+    def __init__(self, client: Client) -> None:
+        self.client = client
+        self._parent: Bot = None
+
+    def _summarize(self) -> str:
+        """
+        Summarize command latency and the bot's counters
+        :return: Summary text
+        """
+        metrics = self._parent.metrics
+        commands = sorted({command for command, _ in metrics.histograms})
+        lines = ["**Command latency** (p50 / p99 total, mean per phase)"]
+        for command in commands:
+            total = metrics.histograms[(command, "total")]
+            means = ", ".join(
+                f"{name} {metrics.histograms[(command, name)].total / total.count * 1000:.1f}ms" for name in PHASES
+            )
+            lines.append(f"`{command}` x{total.count}: {total.quantile(0.5) * 1000:g}ms / "
+                         f"{total.quantile(0.99) * 1000:g}ms ({means})")
+        if not commands:
+            lines.append("No commands recorded yet.")
+
+        roles = self._parent.roles
+        lines.append(f"**Role cache** hit rate {roles.hit_rate() * 100:.1f}% ({roles.hits} hits, {roles.misses} misses)")
+        rejections = self._parent.get_rate_limit_rejections()
+        lines.append("**Rate limit rejections** " +
+                     (", ".join(f"{name} {amount}" for name, amount in sorted(rejections.items())) or "none"))
+        flushes = self._parent.sql.get_flush_metrics()
+        if flushes:
+            lines.append(f"**DB flushes** {flushes['flushes']}, avg batch {flushes['avg_batch_size']:.1f}, "
+                         f"avg commit {flushes['avg_commit_latency'] * 1000:.2f}ms")
+        return "\n".join(lines)
+
+    @slash_command(
+        name = "stats",
+        description = "Show command latency and cache statistics 📈 (Dev Tool)",
+        dm_permission = False
+    )
+    async def stats(self, ctx: SlashContext) -> None:
+        await self._parent.sql.setup_bot_info(ctx)
+
+        userPerms = await self._parent.sql.derive_user_permissions(ctx)
+        if userPerms != UserType.DEVELOPER.value:
+            await ctx.send("Your permissions level is not high enough for this command.", ephemeral=True)
+            return
+
+        await ctx.send(self._summarize(), ephemeral=True)
+
+    def add_parent(self, parent: Bot) -> None:
+        self._parent = parent
+
+    def __str__(self) -> str:
+        return "Stats command: shows developers where time goes inside commands."
+
+    def __repr__(self) -> str:
+        return str(self)
+
+def setup(client: Client):
+    return Stats(client)
@@ -1,3 +0,0 @@
-CREATE TABLE IF NOT EXISTS guilds (
-    guild_id INTEGER PRIMARY KEY
-);
\ No newline at end of file
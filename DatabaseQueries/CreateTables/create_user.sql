@@ -1,4 +0,0 @@
-CREATE TABLE IF NOT EXISTS users(
-    user_id   INTEGER PRIMARY KEY,
-    currency  INTEGER DEFAULT 50 NOT NULL
-);
\ No newline at end of file
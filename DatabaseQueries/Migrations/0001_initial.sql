@@ -0,0 +1,27 @@
+-- Initial schema, the tables previously created by DatabaseQueries/CreateTables
+CREATE TABLE IF NOT EXISTS guilds (
+    guild_id INTEGER PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS users(
+    user_id   INTEGER PRIMARY KEY,
+    currency  INTEGER DEFAULT 50 NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS guild_users(
+    user_id            INTEGER             PRIMARY KEY,
+    guild_id           INTEGER             NOT NULL,
+    xp                 INTEGER DEFAULT 0   NOT NULL,
+    xp_needed          INTEGER DEFAULT 100 NOT NULL,
+    guild_level        INTEGER DEFAULT 0   NOT NULL,
+    permissions        INTEGER DEFAULT 1   NOT NULL,
+    FOREIGN KEY(guild_id) REFERENCES guilds(guild_id)
+);
+
+CREATE TABLE IF NOT EXISTS role_reactions(
+    role_id        INTEGER PRIMARY KEY,
+    guild_id       INTEGER NOT NULL,
+    role_name      TEXT,
+    descr          TEXT,
+    FOREIGN KEY(guild_id) REFERENCES guilds(guild_id)
+);
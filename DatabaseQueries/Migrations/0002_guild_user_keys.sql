@@ -0,0 +1,23 @@
+-- guild_users was keyed on user_id alone, so a user could only exist in one guild.
+-- Rebuild it keyed on (guild_id, user_id); as a WITHOUT ROWID table the primary key
+-- is the clustered index, so guild user lookups are covered by it.
+CREATE TABLE guild_users_new(
+    guild_id           INTEGER             NOT NULL,
+    user_id            INTEGER             NOT NULL,
+    xp                 INTEGER DEFAULT 0   NOT NULL,
+    xp_needed          INTEGER DEFAULT 100 NOT NULL,
+    guild_level        INTEGER DEFAULT 0   NOT NULL,
+    permissions        INTEGER DEFAULT 1   NOT NULL,
+    PRIMARY KEY(guild_id, user_id),
+    FOREIGN KEY(guild_id) REFERENCES guilds(guild_id)
+) WITHOUT ROWID;
+
+INSERT INTO guild_users_new(guild_id, user_id, xp, xp_needed, guild_level, permissions)
+    SELECT guild_id, user_id, xp, xp_needed, guild_level, permissions FROM guild_users;
+
+DROP TABLE guild_users;
+ALTER TABLE guild_users_new RENAME TO guild_users;
+
+-- role menus read every role of one guild, covering the whole row avoids the table lookup
+CREATE INDEX IF NOT EXISTS role_reactions_guild
+    ON role_reactions(guild_id, role_id, role_name, descr);
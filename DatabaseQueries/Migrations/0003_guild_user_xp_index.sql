@@ -0,0 +1,4 @@
+-- leaderboards load a guild's members in XP order, the index also covers user_id
+-- since a WITHOUT ROWID table's secondary indexes hold its primary key
+CREATE INDEX IF NOT EXISTS guild_users_xp
+    ON guild_users(guild_id, xp);
@@ -0,0 +1,29 @@
+-- append-only record of every currency change, balances are the starting 50 plus a user's entries
+CREATE TABLE IF NOT EXISTS currency_ledger(
+    entry_id       INTEGER PRIMARY KEY,
+    user_id        INTEGER NOT NULL,
+    amount         INTEGER NOT NULL,
+    reason         TEXT    NOT NULL,
+    counterparty   INTEGER,
+    created_at     INTEGER NOT NULL,
+    FOREIGN KEY(user_id) REFERENCES users(user_id)
+);
+
+-- covers the per-user sums read on startup, history is served by currency_ledger_history (0005)
+CREATE INDEX IF NOT EXISTS currency_ledger_user
+    ON currency_ledger(user_id, amount);
+
+CREATE TRIGGER IF NOT EXISTS currency_ledger_no_update BEFORE UPDATE ON currency_ledger
+BEGIN
+    SELECT RAISE(ABORT, 'currency_ledger is append-only');
+END;
+
+CREATE TRIGGER IF NOT EXISTS currency_ledger_no_delete BEFORE DELETE ON currency_ledger
+BEGIN
+    SELECT RAISE(ABORT, 'currency_ledger is append-only');
+END;
+
+-- carry over any balance that already moved away from the starting amount
+INSERT INTO currency_ledger(user_id, amount, reason, created_at)
+    SELECT user_id, currency - 50, 'opening balance', CAST(strftime('%s', 'now') AS INTEGER)
+    FROM users WHERE currency != 50;
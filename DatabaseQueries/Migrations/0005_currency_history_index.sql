@@ -0,0 +1,4 @@
+-- a user's history reads their newest entries first, with only user_id indexed the
+-- rowid order within the index is entry_id order, so no sort over every entry is needed
+CREATE INDEX IF NOT EXISTS currency_ledger_history
+    ON currency_ledger(user_id);
@@ -1,59 +1,286 @@
 from sqlite3 import Connection
-from interactions import SlashContext, Permissions
+from interactions import SlashContext
 from Utilities.enums import UserType
-from typing import Tuple, List, Optional
+from Utilities.db_executor import DatabaseExecutor, FlushMetrics, get_database_path
+from Utilities.economy import BalanceCache, BalanceConflict, LEDGER_RETRIES, STARTING_BALANCE
+from Utilities.entity_index import KnownEntityIndex
+from Utilities.guild_data import export_guild_file, import_guild_file
+from Utilities.metrics import phase
+from Utilities.permission_cache import PermissionCache
+from Utilities.rest_coalescer import RestCoalescer
+from Utilities.role_cache import RoleCache
+from Utilities.queries import query, STATEMENT_CACHE_SIZE
+from time import time
+from typing import Any, Tuple, List, Optional, Sequence, Callable, Dict, Set
+
+# writes raise, on the writer thread the executor logs errors nobody waits for and counts them
+
+def _execute(conn: Connection, queryString: str, params: Sequence = ()) -> None:
+    conn.execute(queryString, params)
+
+def _commit(conn: Connection, queryString: str, params: Sequence = ()) -> None:
+    try:
+        conn.execute(queryString, params)
+        conn.commit()
+    except:
+        conn.rollback()
+        raise
+
+def _execute_many(conn: Connection, queryString: str, rows: Sequence[Sequence]) -> None:
+    conn.executemany(queryString, rows)
+
+def _commit_many(conn: Connection, queryString: str, rows: Sequence[Sequence]) -> None:
+    try:
+        conn.executemany(queryString, rows)
+        conn.commit()
+    except:
+        conn.rollback()
+        raise
+
+def _append_ledger(conn: Connection, entries: Sequence[Sequence], balances: Sequence[Sequence],
+expected: Sequence[Sequence] = ()) -> None:
+    """
+    Append ledger entries and mirror the new balances, all or nothing.
+    Errors are raised so the caller never keeps a balance that wasn't stored.
+    A BalanceConflict is raised when a stored balance isn't the expected (user_id, balance).
+    """
+    for userId, balance in expected:
+        row = conn.execute(query("get_user_currency"), (userId,)).fetchone()
+        current = row[0] if row else STARTING_BALANCE
+        if current != balance:
+            raise BalanceConflict(userId, current)
+
+    if not conn.in_transaction:
+        conn.execute("BEGIN;")
+    # a savepoint keeps this write atomic inside a batch shared with other writes
+    conn.execute("SAVEPOINT ledger;")
+    try:
+        conn.executemany(query("add_ledger_entry"), entries)
+        conn.executemany(query("set_user_currency"), balances)
+    except:
+        conn.execute("ROLLBACK TO ledger;")
+        conn.execute("RELEASE ledger;")
+        raise
+    conn.execute("RELEASE ledger;")
+
+def _select(conn: Connection, queryString: str, params: Sequence = ()) -> List[Tuple]:
+    try:
+        selectionCursor = conn.execute(queryString, params)
+        return selectionCursor.fetchall()
+    except:
+        return
 
 class BotSQL:
-    def __init__(self, connection: Connection) -> None:
+    def __init__(self, connection: Connection, asyncMode: bool = False, readers: int = 2,
+    statementCacheSize: int = STATEMENT_CACHE_SIZE, writeBehind: bool = False, batchSize: int = 100,
+    batchInterval: float = 0.25, onFlush: Optional[Callable[[FlushMetrics], None]] = None,
+    roleCache: Optional[RoleCache] = None, executor: Optional[DatabaseExecutor] = None,
+    publish: Optional[Callable[..., None]] = None, rest: Optional[RestCoalescer] = None) -> None:
+        """
+        :param connection: Connection to the bot database
+        :param asyncMode: Run database work on background threads instead of the event loop
+        :param readers: Amount of read-only connections used for selections in async mode
+        :param statementCacheSize: Prepared statements kept per background connection
+        :param writeBehind: Queue writes and commit them in batches, requires async mode
+        :param batchSize: Writes that force a write-behind flush
+        :param batchInterval: Seconds after which a write-behind batch is flushed
+        :param onFlush: Called with the batch size and commit latency of every flush
+        :param roleCache: Role cache kept current write-through, a private one if not given
+        :param executor: Executor to use instead of creating one, for a writer living in another process
+        :param publish: Called with (kind, *args) when cached state other processes hold has changed
+        :param rest: Shares owner and member fetches with other callers, a private one if not given
+        :return: None
+        """
         self.conn = connection
+        self._executor: Optional[DatabaseExecutor] = executor
+        self._publish = publish
+        self.known = KnownEntityIndex()
+        self.permissions = PermissionCache()
+        self.roles = roleCache if roleCache is not None else RoleCache()
+        self.balances = BalanceCache()
+        self.rest = rest if rest is not None else RestCoalescer()
+
+        # in-memory databases can't be shared between connections, they stay synchronous
+        dbPath = get_database_path(connection)
+        if asyncMode and dbPath and self._executor is None:
+            self._executor = DatabaseExecutor(dbPath, readers, statementCacheSize, writeBehind,
+                                              batchSize, batchInterval, onFlush)
+
+    @property
+    def writeBehind(self) -> bool:
+        return self._executor is not None and self._executor.writeBehind
+
+    def publish(self, kind: str, *args: Any) -> None:
+        """
+        Tell other processes that cached state changed, nothing is sent when running alone
+        :param kind: Kind of state that changed
+        :return: None
+        """
+        if self._publish:
+            self._publish(kind, *args)
 
-    def execute_and_commit(self, queryString: str) -> None:
+    def flush(self) -> None:
+        """
+        Commit every queued write, blocks until done
+        :return: None
+        """
+        if self._executor:
+            self._executor.flush()
+
+    async def flush_async(self) -> None:
+        """
+        Commit every queued write without blocking the event loop
+        :return: None
+        """
+        if self._executor:
+            with phase("db"):
+                await self._executor.flush_async()
+
+    def get_flush_metrics(self) -> Optional[Dict[str, float]]:
+        """
+        Batch size and commit latency of the writes committed so far
+        :return: Dictionary of flush metrics or None when not in async mode
+        """
+        return self._executor.get_flush_metrics() if self._executor else None
+
+    def close(self) -> None:
+        """
+        Flush queued writes and close background connections
+        :return: None
+        """
+        if self._executor:
+            self._executor.close()
+            self._executor = None
+
+    def execute_and_commit(self, queryString: str, params: Sequence = ()) -> None:
         """
         Executes and commits a query. For use when data will change. (ex: insertion, deletion)
+        In write-behind mode the query is only queued, see flush.
+        :param queryString: SQL text, ideally a registered statement from Utilities.queries
+        :param params: Values bound to the statement's placeholders
+        :return: None
+        """
+        if self._executor:
+            # only the writer thread may write, the caller waits for it unless writing behind
+            if self._executor.writeBehind:
+                self._executor.submit_write(_execute, queryString, params)
+            else:
+                self._executor.run_write_blocking(_execute, queryString, params)
+            return
+        _commit(self.conn, queryString, params)
+
+    def execute_many_and_commit(self, queryString: str, rows: Sequence[Sequence]) -> None:
+        """
+        Execute a query once per row of parameters and commit them together
+        :param queryString: SQL text, ideally a registered statement from Utilities.queries
+        :param rows: Parameters of every execution
         :return: None
         """
-        try:
-            self.conn.execute(queryString)
-            self.conn.commit()
-        except:
+        if self._executor:
+            if self._executor.writeBehind:
+                self._executor.submit_write(_execute_many, queryString, rows)
+            else:
+                self._executor.run_write_blocking(_execute_many, queryString, rows)
             return
+        _commit_many(self.conn, queryString, rows)
 
-    def execute_selection(self, queryString: str) -> List[Tuple]:
+    def execute_selection(self, queryString: str, params: Sequence = ()) -> List[Tuple]:
         """
         Make a selection query
+        :param queryString: SQL text, ideally a registered statement from Utilities.queries
+        :param params: Values bound to the statement's placeholders
         :return: List of data selected, will usually be in tuple form.
         """
-        try:
-            selectionCursor = self.conn.execute(queryString)
-            return selectionCursor.fetchall()
-        except:
-            return
+        return _select(self.conn, queryString, params)
+
+    async def execute_and_commit_async(self, queryString: str, params: Sequence = ()) -> None:
+        """
+        Awaitable execute_and_commit, runs on the writer thread in async mode.
+        In write-behind mode this returns as soon as the query is queued.
+        :return: None
+        """
+        with phase("db"):
+            if self._executor:
+                if self._executor.writeBehind:
+                    self._executor.submit_write(_execute, queryString, params)
+                    return
+                return await self._executor.run_write(_execute, queryString, params)
+            return self.execute_and_commit(queryString, params)
+
+    async def execute_many_and_commit_async(self, queryString: str, rows: Sequence[Sequence]) -> None:
+        """
+        Awaitable execute_many_and_commit, all rows go through the writer as one write
+        :return: None
+        """
+        with phase("db"):
+            if self._executor:
+                if self._executor.writeBehind:
+                    self._executor.submit_write(_execute_many, queryString, rows)
+                    return
+                return await self._executor.run_write(_execute_many, queryString, rows)
+            return self.execute_many_and_commit(queryString, rows)
+
+    async def execute_selection_async(self, queryString: str, params: Sequence = ()) -> List[Tuple]:
+        """
+        Awaitable execute_selection, runs on a read-only connection in async mode
+        :return: List of data selected, will usually be in tuple form.
+        """
+        with phase("db"):
+            if self._executor:
+                return await self._executor.run_read(_select, queryString, params)
+            return self.execute_selection(queryString, params)
     
     async def derive_user_permissions(self, ctx: SlashContext) -> int:
+        """
+        Resolve a user's permission level in the interaction's guild.
+        Cached per guild and kept fresh by gateway events, so usually a dict lookup.
+        :param ctx: Event context from Discord
+        :return: UserType value
+        """
+        guildId, userId = int(ctx.guild_id), int(ctx.user.id)
+        cached = self.permissions.get_member(guildId, userId)
+        if cached is not None:
+            return cached
+
+        guild = self.permissions.get_guild(guildId)
+        if guild is None:
+            guildOwner = await self.rest.fetch("owner", guildId, None, ctx.guild.fetch_owner)
+            guild = self.permissions.set_guild(guildId, guildOwner.id, ctx.guild.roles)
+
         perms = UserType.NORMAL.value
-        guildOwner = await ctx.guild.fetch_owner()
         if str(ctx.user.id) == "311663246622982145":
             perms = UserType.DEVELOPER.value
-        elif ctx.user.id == guildOwner.id:
+        elif userId == guild.ownerId:
             perms = UserType.GUILD_ADMIN.value
         else:
-            userMember = await ctx.guild.fetch_member(ctx.user.id)
-            userRoles = userMember.roles
-            for role in userRoles:
-                isAdmin = (role.permissions & Permissions.ADMINISTRATOR) == Permissions.ADMINISTRATOR
-                if isAdmin:
-                    perms = UserType.GUILD_ADMIN.value
-                    break
+            userMember = ctx.member if ctx.member else \
+                await self.rest.fetch("member", guildId, userId, lambda: ctx.guild.fetch_member(ctx.user.id))
+            if guild.is_admin(role.id for role in userMember.roles):
+                perms = UserType.GUILD_ADMIN.value
+
+        self.permissions.set_member(guildId, userId, perms)
+        # keep the stored level in line after an invalidation changed it
+        if self.known.has_guild_user(guildId, userId):
+            await self.execute_and_commit_async(query("set_guild_user_permissions"), (perms, guildId, userId))
         return perms
     
     def get_user(self, userId: int) -> Optional[List[Tuple]]:
-        return self.execute_selection(f"SELECT * FROM users WHERE user_id = {int(userId)};")
+        return self.execute_selection(query("get_user"), (int(userId),))
+
+    async def get_user_async(self, userId: int) -> Optional[List[Tuple]]:
+        return await self.execute_selection_async(query("get_user"), (int(userId),))
     
     def get_guild_user(self, guildId: int, userId: int) -> Optional[List[Tuple]]:
-        return self.execute_selection(f"SELECT * FROM guild_users WHERE guild_id = {guildId} AND user_id = {userId};")
+        return self.execute_selection(query("get_guild_user"), (guildId, userId))
+
+    async def get_guild_user_async(self, guildId: int, userId: int) -> Optional[List[Tuple]]:
+        return await self.execute_selection_async(query("get_guild_user"), (guildId, userId))
     
     def get_guild(self, guildId: int) -> Optional[List[Tuple]]:
-        return self.execute_selection(f"SELECT * from guilds WHERE guild_id = {guildId};")
+        return self.execute_selection(query("get_guild"), (guildId,))
+
+    async def get_guild_async(self, guildId: int) -> Optional[List[Tuple]]:
+        return await self.execute_selection_async(query("get_guild"), (guildId,))
             
     async def setup_user(self, ctx: SlashContext) -> None:
         """
@@ -62,28 +289,47 @@ class BotSQL:
         :return: none
         """
         if ctx.user:
-            user = self.get_user(int(ctx.user.id))
-            guild_user = self.get_guild_user(int(ctx.guild_id), int(ctx.user.id))
-            
-            if not user:
-                self.execute_and_commit(f"""
-                                                INSERT OR REPLACE INTO users(user_id)
-                                                VALUES({int(ctx.user.id)});
-                                            """)
-            if not guild_user:
-                self.execute_and_commit(f"""
-                                            INSERT OR REPLACE INTO guild_users(user_id, guild_id, permissions)
-                                            VALUES({int(ctx.user.id)}, {int(ctx.guild_id)}, {await self.derive_user_permissions(ctx)});
-                                        """)
+            userId, guildId = int(ctx.user.id), int(ctx.guild_id)
+
+            # the index holds every stored row, a database check is only needed on a miss
+            if not self.known.has_user(userId):
+                if not await self.get_user_async(userId):
+                    await self.execute_and_commit_async(query("add_user"), (userId,))
+                self.known.add_user(userId)
+            if not self.known.has_guild_user(guildId, userId):
+                if not await self.get_guild_user_async(guildId, userId):
+                    permissions = await self.derive_user_permissions(ctx)
+                    await self.execute_and_commit_async(query("add_guild_user"), (userId, guildId, permissions))
+                self.known.add_guild_user(guildId, userId)
     
     async def setup_guild(self, ctx: SlashContext):
         if ctx.guild:
-            guild = self.get_guild(int(ctx.guild_id))
+            guildId = int(ctx.guild_id)
+            if self.known.has_guild(guildId):
+                return
 
-            if not guild:
-                self.execute_and_commit(f"INSERT OR REPLACE INTO guilds(guild_id) VALUES({int(ctx.guild_id)})")
+            if not await self.get_guild_async(guildId):
+                await self.execute_and_commit_async(query("add_guild"), (guildId,))
+            self.known.add_guild(guildId)
     
+    def load_known_entities(self) -> None:
+        """
+        Fill the known entity index from the database, done once at startup
+        :return: None
+        """
+        self.known.load(
+            (row[0] for row in self.execute_selection(query("get_all_guild_ids")) or []),
+            (row[0] for row in self.execute_selection(query("get_all_user_ids")) or []),
+            self.execute_selection(query("get_all_guild_user_ids")) or [],
+        )
+
     async def setup_bot_info(self, ctx: SlashContext) -> None:
+        """
+        Make sure the guild, user and guild user behind an interaction exist.
+        Once they're in the known entity index this doesn't touch the database.
+        :param ctx: Event context from Discord
+        :return: None
+        """
         await self.setup_guild(ctx)
         await self.setup_user(ctx)
         
@@ -94,29 +340,272 @@ class BotSQL:
         :param userId: The user ID as an integer
         :return: Permission level as integer or None
         """
-        permissions = self.execute_selection(f"SELECT permissions FROM guild_users WHERE \
-                                               guild_id = {guildId} AND user_id = {userId};")
+        permissions = await self.execute_selection_async(query("get_guild_user_permissions"), (guildId, userId))
         
         return permissions[0][0] if permissions else None
     
     def get_assignable_guild_roles(self, guildId: int) -> List[Tuple[int, str, str]]:
-        return self.execute_selection(
-                        f"""
-                            SELECT 
-                                role_id,
-                                role_name,
-                                descr
-                            FROM role_reactions
-                            WHERE guild_id = {guildId};
-                        """
-                    )
+        return self.execute_selection(query("get_assignable_guild_roles"), (guildId,))
+
+    async def get_assignable_guild_roles_async(self, guildId: int) -> List[Tuple[int, str, str]]:
+        return await self.execute_selection_async(query("get_assignable_guild_roles"), (guildId,))
+        
+    async def get_all_assignable_roles_async(self) -> List[Tuple[int, int, str, str]]:
+        """
+        Every guild's assignable roles in one query, used to warm the role cache
+        :return: List of (guild_id, role_id, role_name, descr)
+        """
+        return await self.execute_selection_async(query("get_all_assignable_roles"))
+
+    async def get_cached_guild_roles(self, guildId: int) -> List[Tuple[int, str, str]]:
+        """
+        Get a guild's assignable roles through the role cache
+        :param guildId: The guild ID as an integer
+        :return: List of (role_id, role_name, descr)
+        """
+        roles = self.roles.get(guildId)
+        if roles is None:
+            # a role written while reading isn't cached write-through yet, the read may miss it
+            generation = self.roles.generation(guildId)
+            # a queued role for this guild has to land before reading the guild back
+            await self.flush_async()
+            roles = await self.get_assignable_guild_roles_async(guildId) or []
+            self.roles.set(guildId, roles, generation)
+        return roles
         
     def add_assignable_guild_role(self, guildId: int, roleId: int, roleName: str, descr: str = "") -> None:
-        self.execute_and_commit(
-            f"""
-                INSERT OR REPLACE INTO
-                  role_reactions(role_id, guild_id, role_name, descr)
-                VALUES({roleId}, {guildId}, '{roleName}', '{descr}');
-             """
-        )
-    
\ No newline at end of file
+        self.execute_and_commit(query("add_assignable_guild_role"), (roleId, guildId, roleName, descr))
+        self.roles.put_role(guildId, (roleId, roleName, descr))
+        self.publish("roles", guildId)
+
+    async def add_assignable_guild_role_async(self, guildId: int, roleId: int, roleName: str, descr: str = "") -> None:
+        await self.execute_and_commit_async(query("add_assignable_guild_role"), (roleId, guildId, roleName, descr))
+        self.roles.put_role(guildId, (roleId, roleName, descr))
+        self.publish("roles", guildId)
+
+    async def add_assignable_guild_roles_async(self, guildId: int, roles: Sequence[Tuple[int, str, str]]) -> None:
+        """
+        Make many roles self-assignable with one executemany
+        :param guildId: ID of the guild
+        :param roles: List of (role_id, role_name, descr)
+        :return: None
+        """
+        await self.execute_many_and_commit_async(query("add_assignable_guild_role"),
+                                                 [(roleId, guildId, roleName, descr) for roleId, roleName, descr in roles])
+        self.roles.put_roles(guildId, list(roles))
+        self.publish("roles", guildId)
+
+    def get_all_guild_user_xp(self) -> List[Tuple[int, int, int]]:
+        """
+        Every guild user's XP, loaded once at startup
+        :return: List of (guild_id, user_id, xp)
+        """
+        return self.execute_selection(query("get_all_guild_user_xp"))
+
+    def save_guild_user_xp(self, rows: Sequence[Tuple[int, int, int, int, int]]) -> None:
+        """
+        Store the XP of many guild users in one transaction, waits for the commit even in write-behind mode
+        :param rows: List of (guild_id, user_id, xp, xp_needed, guild_level)
+        :return: None
+        :raises Exception: Whatever the write or its commit raised
+        """
+        if self._executor:
+            self._executor.run_write_blocking(_execute_many, query("save_guild_user_xp"), rows)
+            return
+        _commit_many(self.conn, query("save_guild_user_xp"), rows)
+
+    async def save_guild_user_xp_async(self, rows: Sequence[Tuple[int, int, int, int, int]]) -> None:
+        """
+        Awaitable save_guild_user_xp, the caller keeps the rows pending when it raises
+        :param rows: List of (guild_id, user_id, xp, xp_needed, guild_level)
+        :return: None
+        :raises Exception: Whatever the write or its commit raised
+        """
+        with phase("db"):
+            if self._executor:
+                await self._executor.run_write(_execute_many, query("save_guild_user_xp"), rows)
+                return
+            _commit_many(self.conn, query("save_guild_user_xp"), rows)
+
+    async def get_guild_leaderboard_async(self, guildId: int) -> List[Tuple[int, int]]:
+        """
+        A guild's members in XP order, read from the (guild_id, xp) index
+        :param guildId: The guild ID as an integer
+        :return: List of (user_id, xp)
+        """
+        return await self.execute_selection_async(query("get_guild_leaderboard"), (guildId,))
+
+    def load_balances(self) -> None:
+        """
+        Reconcile every balance from the currency ledger, done once at startup
+        :return: None
+        """
+        self.balances.load(self.execute_selection(query("get_ledger_balances")) or [])
+
+    async def reload_balances_since_async(self, entryId: int) -> None:
+        """
+        Sum the ledger again for every user with entries after entryId, like the users an import opened.
+        Their balance locks are held meanwhile, a change in progress is never overwritten by an older sum.
+        :param entryId: Newest ledger entry already reflected in the balances
+        :return: None
+        """
+        rows = await self.execute_selection_async(query("get_ledger_users_since"), (entryId,)) or []
+        userIds = {userId for userId, in rows}
+        if not userIds:
+            return
+        async with self.balances.locked(*userIds):
+            for userId, total in await self.execute_selection_async(query("get_ledger_balances_since"),
+                                                                    (entryId,)) or []:
+                # users whose entries landed after the first read weren't locked, their changes set them
+                if userId in userIds:
+                    self.balances.set(userId, STARTING_BALANCE + total)
+
+    def get_balance(self, userId: int) -> int:
+        """
+        :param userId: The user ID as an integer
+        :return: The user's balance, read from memory
+        """
+        return self.balances.get(userId)
+
+    async def get_currency_history_async(self, userId: int, limit: int = 5) -> List[Tuple[int, str, Optional[int], int]]:
+        """
+        A user's latest ledger entries
+        :param userId: The user ID as an integer
+        :param limit: Most entries returned
+        :return: List of (amount, reason, counterparty, created_at), newest first
+        """
+        return await self.execute_selection_async(query("get_currency_history"), (int(userId), limit))
+
+    async def _append_ledger_async(self, entries: Sequence[Tuple], balances: Sequence[Tuple],
+    expected: Sequence[Tuple]) -> None:
+        """
+        Store ledger entries, waits for the commit. Concurrent changes share the writer's commit.
+        On success every other process is told the new balances.
+        """
+        with phase("db"):
+            if self._executor:
+                written = self._executor.run_write(_append_ledger, entries, balances, expected)
+                if self._executor.writeBehind:
+                    # currency doesn't wait out the batch interval, the batch closes with whatever is queued
+                    await self._executor.flush_async()
+                await written
+            else:
+                try:
+                    _append_ledger(self.conn, entries, balances, expected)
+                    self.conn.commit()
+                except:
+                    self.conn.rollback()
+                    raise
+        for userId, balance in balances:
+            self.publish("balance", userId, balance)
+
+    async def grant_currency_async(self, userId: int, amount: int, reason: str = "grant") -> Optional[int]:
+        """
+        Add currency to a user, or take it away with a negative amount
+        :param userId: The user ID as an integer
+        :param amount: Currency to add
+        :param reason: Reason stored with the ledger entry
+        :return: The new balance, None if it would go below zero
+        """
+        userId = int(userId)
+        async with self.balances.locked(userId):
+            for attempt in range(LEDGER_RETRIES):
+                current = self.balances.get(userId)
+                balance = current + amount
+                if balance < 0:
+                    return None
+                try:
+                    await self._append_ledger_async([(userId, amount, reason, None, int(time()))],
+                                                    [(userId, balance)], [(userId, current)])
+                except BalanceConflict as e:
+                    # another process changed the balance, retry from the stored one
+                    self.balances.set(e.userId, e.balance)
+                    if attempt == LEDGER_RETRIES - 1:
+                        raise
+                    continue
+                self.balances.set(userId, balance)
+                return balance
+
+    async def transfer_currency_async(self, fromUserId: int, toUserId: int, amount: int,
+    reason: str = "transfer") -> Optional[Tuple[int, int]]:
+        """
+        Move currency between two users, both ledger entries are committed together
+        :param fromUserId: User paying
+        :param toUserId: User being paid
+        :param amount: Currency to move, must be positive
+        :param reason: Reason stored with both ledger entries
+        :return: New balances of (payer, payee), None if the payer can't afford it
+        """
+        fromUserId, toUserId = int(fromUserId), int(toUserId)
+        if amount <= 0:
+            raise ValueError("Transfer amount must be positive")
+        if fromUserId == toUserId:
+            raise ValueError("Can't transfer currency to the same user")
+
+        async with self.balances.locked(fromUserId, toUserId):
+            for attempt in range(LEDGER_RETRIES):
+                fromCurrent, toCurrent = self.balances.get(fromUserId), self.balances.get(toUserId)
+                fromBalance, toBalance = fromCurrent - amount, toCurrent + amount
+                if fromBalance < 0:
+                    return None
+                now = int(time())
+                try:
+                    await self._append_ledger_async(
+                        [(fromUserId, -amount, reason, toUserId, now), (toUserId, amount, reason, fromUserId, now)],
+                        [(fromUserId, fromBalance), (toUserId, toBalance)],
+                        [(fromUserId, fromCurrent), (toUserId, toCurrent)])
+                except BalanceConflict as e:
+                    # another process changed a balance, retry from the stored one
+                    self.balances.set(e.userId, e.balance)
+                    if attempt == LEDGER_RETRIES - 1:
+                        raise
+                    continue
+                self.balances.set(fromUserId, fromBalance)
+                self.balances.set(toUserId, toBalance)
+                return fromBalance, toBalance
+
+    async def export_guild_async(self, guildId: int, path: str, fmt: str) -> Dict[str, int]:
+        """
+        Stream a guild's rows into a file, see Utilities.guild_data
+        :param guildId: The guild ID as an integer
+        :param path: File written to
+        :param fmt: jsonl or csv
+        :return: Rows written per table
+        """
+        # queued writes belong in the export
+        await self.flush_async()
+        with phase("db"):
+            if self._executor:
+                return await self._executor.run_read(export_guild_file, int(guildId), path, fmt)
+            return export_guild_file(self.conn, int(guildId), path, fmt)
+
+    async def import_guild_async(self, path: str, fmt: str) -> Tuple[Dict[str, int], Set[int]]:
+        """
+        Load an export in one transaction and drop whatever was cached of the imported guilds
+        :param path: File read from
+        :param fmt: jsonl or csv
+        :return: Rows read per table and the guilds that were imported
+        """
+        # entries after this one are the import's, only the users they belong to are summed again
+        lastEntryId = (await self.execute_selection_async(query("get_last_ledger_entry")))[0][0] or 0
+        with phase("db"):
+            if self._executor:
+                imported = self._executor.run_write(import_guild_file, path, fmt)
+                if self._executor.writeBehind:
+                    await self._executor.flush_async()
+                counts, guildIds = await imported
+            else:
+                try:
+                    counts, guildIds = import_guild_file(self.conn, path, fmt)
+                    self.conn.commit()
+                except:
+                    self.conn.rollback()
+                    raise
+        for guildId in guildIds:
+            self.roles.invalidate(guildId)
+            self.permissions.invalidate_guild(guildId)
+            self.publish("roles", guildId)
+        # new users opened with ledger entries, every process sums theirs again
+        await self.reload_balances_since_async(lastEntryId)
+        self.publish("balances", lastEntryId)
+        return counts, guildIds
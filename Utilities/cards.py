@@ -0,0 +1,259 @@
+"""
+Rank and profile card rendering
+Cards are drawn with Pillow in worker processes so image work never runs on the
+gateway loop. Every worker loads its fonts and background templates once, and
+finished cards are kept in an LRU cache in the bot process.
+"""
+
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Any, Dict, Hashable, Optional
+
+from Utilities.lru import LRUCache
+from Utilities.metrics import phase
+
+CARD_SIZE = (934, 282)
+AVATAR_SIZE = 200
+# level progress is drawn in steps of this many percent, cards within the same step are shared
+XP_BUCKET_PERCENT = 2
+BACKGROUND = (35, 39, 42)
+ACCENT = (88, 101, 242)
+TEXT = (255, 255, 255)
+MUTED = (185, 187, 190)
+# tried in order, Pillow looks names up in the system font directories
+FONT_NAMES = ("DejaVuSans-Bold.ttf", "DejaVuSans.ttf", "Arial Bold.ttf", "arial.ttf")
+
+# per worker process, filled by _init_worker
+_fonts: Dict[str, Any] = dict()
+_templates: Dict[str, Any] = dict()
+
+def _load_font(size: int) -> Any:
+    from PIL import ImageFont
+    for name in FONT_NAMES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # Pillow before 10.1 only has the fixed size bitmap font
+        return ImageFont.load_default()
+
+def _init_worker() -> None:
+    """
+    Load fonts, background templates and the avatar mask once per worker process
+    """
+    from PIL import Image, ImageDraw
+    _fonts.update(large=_load_font(52), medium=_load_font(36), small=_load_font(26))
+
+    base = Image.new("RGBA", CARD_SIZE, BACKGROUND + (255,))
+    ImageDraw.Draw(base).rectangle((0, 0, 12, CARD_SIZE[1]), fill=ACCENT + (255,))
+    _templates["rank"] = base
+    _templates["profile"] = base.copy()
+
+    mask = Image.new("L", (AVATAR_SIZE, AVATAR_SIZE), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, AVATAR_SIZE - 1, AVATAR_SIZE - 1), fill=255)
+    _templates["avatar_mask"] = mask
+
+def _warm() -> bool:
+    return bool(_fonts)
+
+def _paste_avatar(card: Any, avatar: Optional[bytes]) -> None:
+    from PIL import Image, ImageDraw
+    position = (40, (CARD_SIZE[1] - AVATAR_SIZE) // 2)
+    if avatar:
+        try:
+            image = Image.open(BytesIO(avatar)).convert("RGBA").resize((AVATAR_SIZE, AVATAR_SIZE))
+            card.paste(image, position, _templates["avatar_mask"])
+            return
+        except OSError:
+            pass
+    ImageDraw.Draw(card).ellipse((position[0], position[1], position[0] + AVATAR_SIZE - 1,
+                                  position[1] + AVATAR_SIZE - 1), fill=MUTED + (255,))
+
+def _to_png(card: Any) -> bytes:
+    buffer = BytesIO()
+    card.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def _render_rank_card(username: str, level: int, progressPercent: int, rank: Optional[int],
+avatar: Optional[bytes]) -> bytes:
+    """
+    Draw a rank card, runs in a worker process
+    :return: PNG bytes
+    """
+    from PIL import ImageDraw
+    card = _templates["rank"].copy()
+    _paste_avatar(card, avatar)
+    draw = ImageDraw.Draw(card)
+
+    left = 280
+    draw.text((left, 50), username, font=_fonts["large"], fill=TEXT)
+    draw.text((left, 120), f"Level {level}", font=_fonts["medium"], fill=MUTED)
+    if rank is not None:
+        rankText = f"#{rank}"
+        draw.text((CARD_SIZE[0] - 40 - draw.textlength(rankText, font=_fonts["large"]), 50), rankText,
+                  font=_fonts["large"], fill=ACCENT)
+
+    barTop, barBottom, barRight = 190, 230, CARD_SIZE[0] - 40
+    draw.rounded_rectangle((left, barTop, barRight, barBottom), radius=20, fill=(72, 75, 78))
+    filled = left + (barRight - left) * progressPercent // 100
+    if filled > left + 40:
+        draw.rounded_rectangle((left, barTop, filled, barBottom), radius=20, fill=ACCENT)
+    draw.text((barRight - draw.textlength(f"{progressPercent}%", font=_fonts["small"]), 150),
+              f"{progressPercent}%", font=_fonts["small"], fill=MUTED)
+    return _to_png(card)
+
+def _render_profile_card(username: str, level: int, progressPercent: int, balance: int,
+avatar: Optional[bytes]) -> bytes:
+    """
+    Draw a profile card, runs in a worker process
+    :return: PNG bytes
+    """
+    from PIL import ImageDraw
+    card = _templates["profile"].copy()
+    _paste_avatar(card, avatar)
+    draw = ImageDraw.Draw(card)
+
+    left = 280
+    draw.text((left, 50), username, font=_fonts["large"], fill=TEXT)
+    draw.text((left, 130), f"Level {level} ({progressPercent}% to {level + 1})", font=_fonts["medium"], fill=MUTED)
+    draw.text((left, 190), f"Balance {balance}", font=_fonts["medium"], fill=ACCENT)
+    return _to_png(card)
+
+def progress_bucket(xp: int, levelStart: int, levelEnd: int) -> int:
+    """
+    :return: Progress through the level in percent, rounded down to XP_BUCKET_PERCENT
+    """
+    percent = 100 * (xp - levelStart) // max(1, levelEnd - levelStart)
+    return percent - percent % XP_BUCKET_PERCENT
+
+class CardRenderer:
+    """
+    Renders cards in a process pool, caching downloaded avatars and finished PNGs
+    """
+    def __init__(self, workers: int = 2, cacheSize: int = 512, avatarCacheSize: int = 1024) -> None:
+        """
+        :param workers: Rendering processes
+        :param cacheSize: Finished cards kept
+        :param avatarCacheSize: Downloaded avatars kept
+        :return: None
+        """
+        # started by warm or the first render
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._workers = max(1, workers)
+        self.cards = LRUCache(cacheSize)
+        self.avatars = LRUCache(avatarCacheSize)
+        # renders in flight, identical requests wait on the same one
+        self._pending: Dict[Hashable, "asyncio.Future[bytes]"] = dict()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # forking is only safe before the bot opens threads and connections a fork would copy,
+            # a pool started later on the first render spawns its workers instead
+            forkable = "fork" in multiprocessing.get_all_start_methods() and threading.active_count() == 1
+            context = multiprocessing.get_context("fork" if forkable else "spawn")
+            self._pool = ProcessPoolExecutor(max_workers=self._workers, mp_context=context, initializer=_init_worker)
+        return self._pool
+
+    def warm(self) -> None:
+        """
+        Start every worker now, before the bot opens threads and connections a fork would copy.
+        The first submit forks all of them, their fonts and templates load while the bot keeps starting.
+        :return: None
+        """
+        pool = self._get_pool()
+        for _ in range(self._workers):
+            pool.submit(_warm)
+
+    async def _get_avatar(self, url: Optional[str]) -> Optional[bytes]:
+        if not url:
+            return None
+        avatar = self.avatars.get(url)
+        if avatar is not None:
+            return avatar
+
+        # aiohttp comes with interactions, avatars are cached so a session per download is fine
+        import aiohttp
+        try:
+            with phase("rest"):
+                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
+                    async with session.get(url) as response:
+                        if response.status != 200:
+                            return None
+                        avatar = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+        self.avatars.set(url, avatar)
+        return avatar
+
+    async def _render(self, key: Hashable, avatarUrl: Optional[str], render: Any, *args) -> bytes:
+        card = self.cards.get(key)
+        if card is not None:
+            return card
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        loop = asyncio.get_running_loop()
+        future = self._pending[key] = loop.create_future()
+        try:
+            avatar = await self._get_avatar(avatarUrl)
+            card = await loop.run_in_executor(self._get_pool(), render, *args, avatar)
+            # a failed avatar download is drawn as a placeholder, that card isn't kept so the next request retries
+            if avatar is not None or not avatarUrl:
+                self.cards.set(key, card)
+            future.set_result(card)
+            return card
+        except BaseException as e:
+            future.set_exception(e)
+            # consumed here so an unawaited failure isn't reported
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+
+    async def render_rank_card(self, userId: int, username: str, avatarUrl: Optional[str], level: int,
+    xp: int, levelStart: int, levelEnd: int, rank: Optional[int]) -> bytes:
+        """
+        Get a rank card, rendered only if no card with the same contents is cached
+        :param userId: The user's ID
+        :param username: Name shown on the card
+        :param avatarUrl: URL of the user's avatar, it changes with the avatar hash
+        :param level: Current level
+        :param xp: Total XP
+        :param levelStart: Total XP at which the current level was reached
+        :param levelEnd: Total XP at which the next level is reached
+        :param rank: Position on the guild leaderboard
+        :return: PNG bytes
+        """
+        progress = progress_bucket(xp, levelStart, levelEnd)
+        key = ("rank", int(userId), level, progress, avatarUrl, username, rank)
+        return await self._render(key, avatarUrl, _render_rank_card, username, level, progress, rank)
+
+    async def render_profile_card(self, userId: int, username: str, avatarUrl: Optional[str], level: int,
+    xp: int, levelStart: int, levelEnd: int, balance: int) -> bytes:
+        """
+        Get a profile card, rendered only if no card with the same contents is cached
+        :param balance: Currency balance, see render_rank_card for the rest
+        :return: PNG bytes
+        """
+        progress = progress_bucket(xp, levelStart, levelEnd)
+        key = ("profile", int(userId), level, progress, avatarUrl, username, balance)
+        return await self._render(key, avatarUrl, _render_profile_card, username, level, progress, balance)
+
+    def metrics(self) -> Dict[str, int]:
+        return {"card_hits": self.cards.hits, "card_misses": self.cards.misses, "cards": len(self.cards),
+                "avatar_hits": self.avatars.hits, "avatar_misses": self.avatars.misses}
+
+    def close(self) -> None:
+        """
+        Stop the worker processes
+        :return: None
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
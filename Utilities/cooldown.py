@@ -1,35 +1,69 @@
-from typing import Optional, Union
+from enum import Enum
+from heapq import heapify, heappop, heappush
+from math import ceil
+from typing import Dict, List, Optional, Tuple, Union
 
-from interactions import Snowflake
 from Utilities.enums import CooldownEnums
-from time import time
+from time import monotonic
+
+# snowflakes arrive as ints or strings depending on where they came from
+SnowflakeType = Union[int, str]
+# (command, guild, user), global cooldowns use guild 0
+CooldownKey = Tuple[int, int, int]
 
 class CooldownTimer:
     """
     Simple wrapper for holding cooldown time information
     """
+    __slots__ = ("time", "start", "expires")
+
     def __init__(self, time: int, start: float) -> None:
         """
         :param time: Cooldown time in seconds
-        :param start: Time at which cooldown began
+        :param start: Monotonic time at which cooldown began
         :return: None
         """
         self.time = time
         self.start = start
+        self.expires = start + time
+
+def _command_key(commandId: Union[Enum, int]) -> int:
+    return commandId.value if isinstance(commandId, Enum) else int(commandId)
 
 class CooldownManager:
     """
-    A simple wrapper to manage command cooldowns
+    Manages command cooldowns keyed by integer (command, guild, user) tuples.
+    Expired timers are reclaimed by a min-heap sweeper ordered on expiry, so
+    memory stays proportional to the cooldowns that are still active.
     """
     def __init__(self) -> None:
-        self.globalCooldowns = dict()
-        self.guildCooldowns = dict()
+        self._timers: Dict[CooldownKey, CooldownTimer] = dict()
+        # (expires, key) entries, may hold stale entries for keys that were set again
+        self._expiries: List[Tuple[float, CooldownKey]] = list()
+
+    def _sweep(self, now: float) -> None:
+        """
+        Drop every timer that has expired
+        :param now: Current monotonic time
+        :return: None
+        """
+        expiries = self._expiries
+        timers = self._timers
+        while expiries and expiries[0][0] <= now:
+            expires, key = heappop(expiries)
+            timer = timers.get(key)
+            if timer is not None and timer.expires == expires:
+                del timers[key]
+
+        # re-setting active cooldowns leaves stale heap entries behind, compact once they dominate
+        if len(expiries) > 64 and len(expiries) > 2 * len(timers):
+            self._expiries = [(timer.expires, key) for key, timer in timers.items()]
+            heapify(self._expiries)
 
-    def set_cooldown(self, commandId: int, userId: Snowflake, timeout: int,
-    cType: int, guildId: Optional[Snowflake] = None) -> None:
+    def set_cooldown(self, commandId: int, userId: SnowflakeType, timeout: int,
+    cType: int, guildId: Optional[SnowflakeType] = None) -> None:
         """
         Set a global or guild timeout for commands bound to a specific user.
-        Limiting of a whole guild is not currently supported
         :param commandId: Enum of command
         :param userId: User ID of user to timeout
         :param timeout: Time in seconds to timeout user
@@ -37,62 +71,41 @@ class CooldownManager:
         :guildId: Guild ID to timeout user
         :return: None
         """
-        userId = str(userId)
-        guildId = str(guildId)
+        if cType == CooldownEnums.GUILD:
+            if not guildId:
+                return
+            key = (_command_key(commandId), int(guildId), int(userId))
+        elif cType == CooldownEnums.GLOBAL:
+            key = (_command_key(commandId), 0, int(userId))
+        else:
+            return
 
-        if cType == CooldownEnums.GLOBAL:
-            self.globalCooldowns[str(commandId)] = {userId: CooldownTimer(timeout, time())}
-        elif cType == CooldownEnums.GUILD:
-            self.guildCooldowns[guildId] = {str(commandId): {userId: CooldownTimer(timeout, time())}}
+        now = monotonic()
+        self._sweep(now)
+        timer = CooldownTimer(timeout, now)
+        self._timers[key] = timer
+        heappush(self._expiries, (timer.expires, key))
 
-    def _check_guild_cooldown(self, guildId: Snowflake, userId: Snowflake, commandId: int) \
-    -> Optional[Union[bool, int]]:
-        """
-        Check if a user is on cooldown for a specific command in a guild
-        :param userId: Integer or string representing user's unique Id
-        :param guildId: Integer or string representing a guild's unique string
-        :param commandId: Enumeration of command
-        :return: Whether user is on cooldown or None and time left on cooldown or None
-        """
-        # snowflake auto represents as string, just being safe
-        userId = str(userId)
-        guildId = str(guildId)
-
-        guildCooldowns: dict = self.guildCooldowns.get(guildId)
-        if guildCooldowns and guildCooldowns != {} and guildCooldowns:
-            commandCooldowns: dict = guildCooldowns.get(str(commandId))
-            if commandCooldowns and commandCooldowns != {}:
-                userCooldown: CooldownTimer = commandCooldowns.get(userId)
-                if userCooldown:
-                    timeLeft = int(round(time() - userCooldown.start))
-                    return timeLeft < userCooldown.time, timeLeft
-        return None, None
-
-    def get_cooldown(self, userId: Snowflake, commandId: int, guildId: Snowflake = None) -> Optional[int]:
+    def get_cooldown(self, userId: SnowflakeType, commandId: int,
+    guildId: Optional[SnowflakeType] = None) -> Optional[int]:
         """
         Check if a user is on cooldown for a specific command
         :param userId: Integer or string representing user's unique Id
         :param commandId: Enumeration of command
-        :param guildId: Integer or string representing a guild's unique string
-        :return: Time left on cooldown or None
+        :param guildId: Integer or string representing a guild's unique string, checks the
+        guild cooldown instead of the global one when given
+        :return: Seconds left on cooldown or None
         """
-        userId = str(userId)
-        if guildId:
-            guildId = str(guildId)
-        # check for a guild cooldown
-        if guildId:
-            onCooldown, timeLeft = self._check_guild_cooldown(guildId, userId, commandId)
-            if onCooldown:
-                return timeLeft
+        key = (_command_key(commandId), int(guildId) if guildId else 0, int(userId))
+        timer = self._timers.get(key)
+        if timer is None:
+            return None
+
+        now = monotonic()
+        if timer.expires <= now:
+            self._sweep(now)
             return None
+        return ceil(timer.expires - now)
 
-        # check the global cooldowns
-        commandCooldowns: dict = self.globalCooldowns.get(str(commandId))
-        if commandCooldowns and commandCooldowns != {}:
-            userCooldown: CooldownTimer = commandCooldowns.get(userId)
-            if userCooldown:
-                timeLeft = int(round(time() - userCooldown.start))
-                onCooldown = timeLeft < userCooldown.time
-                if onCooldown:
-                    return timeLeft
-                return None
+    def __len__(self) -> int:
+        return len(self._timers)
@@ -0,0 +1,375 @@
+"""
+Off-loop execution of database work
+A single writer thread owns the only writable connection, while a small pool
+of read-only WAL connections serves selections.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Queue
+from time import perf_counter
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# markers understood by the writer thread
+_STOP = object()
+_FLUSH = object()
+
+# callback receiving (result, exception) once a write has been committed
+Notify = Optional[Callable[[Any, Optional[BaseException]], None]]
+
+def get_database_path(connection: sqlite3.Connection) -> Optional[str]:
+    """
+    Find the file backing a connection's main database
+    :param connection: An open sqlite3 connection
+    :return: Path of the database file or None for in-memory databases
+    """
+    for _, name, path in connection.execute("PRAGMA database_list;").fetchall():
+        if name == "main":
+            return path if path else None
+    return None
+
+class FlushMetrics:
+    """
+    Record of a single committed batch of writes
+    """
+    __slots__ = ("batchSize", "commitLatency")
+
+    def __init__(self, batchSize: int, commitLatency: float) -> None:
+        """
+        :param batchSize: Amount of writes committed together
+        :param commitLatency: Seconds spent inside commit()
+        :return: None
+        """
+        self.batchSize = batchSize
+        self.commitLatency = commitLatency
+
+class DatabaseExecutor:
+    """
+    Runs database calls away from the event loop.
+    Writes are serialized through one dedicated thread so SQLite never sees
+    competing writers, reads are spread over a pool of read-only connections.
+    Writes waiting in the queue are committed together in one transaction. In
+    write-behind mode the writer also holds a batch open until it reaches
+    batchSize writes or batchInterval seconds, and callers don't wait for it.
+    """
+    def __init__(self, dbPath: str, readers: int = 2, cachedStatements: int = 128,
+    writeBehind: bool = False, batchSize: int = 100, batchInterval: float = 0.25,
+    onFlush: Optional[Callable[[FlushMetrics], None]] = None) -> None:
+        """
+        :param dbPath: Path to the database file
+        :param readers: Amount of read-only connections to keep open
+        :param cachedStatements: Size of each connection's prepared statement cache
+        :param writeBehind: Queue writes and flush them on a size or time threshold
+        :param batchSize: Most writes committed in one transaction
+        :param batchInterval: Longest time in seconds a write-behind batch stays open
+        :param onFlush: Called on the writer thread with the metrics of every flush
+        :return: None
+        """
+        self.dbPath = dbPath
+        self.cachedStatements = cachedStatements
+        self.writeBehind = writeBehind
+        self.batchSize = max(1, batchSize)
+        self.batchInterval = batchInterval
+        self.onFlush = onFlush
+
+        self.flushCount = 0
+        self.flushedWrites = 0
+        # writes that raised or whose commit failed, reported to their caller or logged when nobody waits
+        self.failedWrites = 0
+        self.flushHistory: Deque[FlushMetrics] = deque(maxlen=256)
+
+        self._writeQueue: Queue = Queue()
+
+        # the writer connection switches the database to WAL so readers never block on it
+        writerReady = threading.Event()
+        # set by the writer thread when its connection couldn't be opened
+        self._writerError: Optional[BaseException] = None
+        self._writer = threading.Thread(target=self._writer_loop, args=(writerReady,),
+                                        name="mallard-db-writer", daemon=True)
+        self._writer.start()
+        writerReady.wait()
+        if self._writerError is not None:
+            self._writer.join()
+            raise self._writerError
+
+        self._start_readers(readers)
+        self._closed = False
+
+    def _start_readers(self, readers: int) -> None:
+        """
+        Create the read-only connection pool, threads are started as reads come in
+        :param readers: Amount of read-only connections to keep open
+        :return: None
+        """
+        self._readerLocal = threading.local()
+        self._readers = ThreadPoolExecutor(max_workers=max(1, readers), thread_name_prefix="mallard-db-reader",
+                                           initializer=self._open_reader)
+
+    def _collect_batch(self, first: Tuple) -> Tuple[List[Tuple], bool]:
+        """
+        Gather queued writes that should be committed alongside the first one
+        :param first: The write that opened the batch
+        :return: Writes in the batch and whether the writer should stop afterwards
+        """
+        batch = [first]
+        if first[0] is _FLUSH:
+            return batch, False
+        deadline = perf_counter() + self.batchInterval
+        # after a flush the batch stops waiting, but writes already queued still join it
+        draining = False
+        while len(batch) < self.batchSize:
+            try:
+                if self.writeBehind and not draining:
+                    remaining = deadline - perf_counter()
+                    if remaining <= 0:
+                        break
+                    item = self._writeQueue.get(timeout=remaining)
+                else:
+                    item = self._writeQueue.get_nowait()
+            except Empty:
+                break
+
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+            if item[0] is _FLUSH:
+                draining = True
+        return batch, False
+
+    def _commit_batch(self, conn: sqlite3.Connection, batch: List[Tuple]) -> None:
+        """
+        Run every write of a batch and commit them as one transaction
+        :param conn: The writer connection
+        :param batch: Writes to run
+        :return: None
+        """
+        results: List[Tuple[Notify, Any]] = list()
+        writes = 0
+        succeeded = 0
+        for func, args, notify in batch:
+            if func is _FLUSH:
+                results.append((notify, None))
+                continue
+            writes += 1
+            try:
+                results.append((notify, func(conn, *args)))
+                succeeded += 1
+            except BaseException as e:
+                self.failedWrites += 1
+                if notify:
+                    notify(None, e)
+                else:
+                    logger.error("queued write %s failed", getattr(func, "__name__", func), exc_info=e)
+
+        commitError: Optional[BaseException] = None
+        start = perf_counter()
+        try:
+            conn.commit()
+        except BaseException as e:
+            conn.rollback()
+            commitError = e
+            # every write that ran is lost with the batch
+            self.failedWrites += succeeded
+            logger.error("commit of %d writes failed", succeeded, exc_info=e)
+        latency = perf_counter() - start
+
+        if writes:
+            metrics = FlushMetrics(writes, latency)
+            self.flushCount += 1
+            self.flushedWrites += writes
+            self.flushHistory.append(metrics)
+            if self.onFlush:
+                self.onFlush(metrics)
+
+        for notify, result in results:
+            if notify:
+                notify(result, commitError)
+
+    def _writer_loop(self, ready: threading.Event) -> None:
+        """
+        Body of the writer thread, executes queued writes in order
+        :param ready: Event set once the writer connection is open or failed to open
+        :return: None
+        """
+        try:
+            conn = sqlite3.connect(self.dbPath, cached_statements=self.cachedStatements)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL;")
+            except:
+                conn.close()
+                raise
+        except BaseException as e:
+            # raised again by the constructor, which waits on ready
+            self._writerError = e
+            ready.set()
+            return
+        ready.set()
+
+        stop = False
+        while not stop:
+            item = self._writeQueue.get()
+            if item is _STOP:
+                break
+            batch, stop = self._collect_batch(item)
+            self._commit_batch(conn, batch)
+
+        conn.close()
+
+    def _open_reader(self) -> None:
+        """
+        Open the read-only connection for the current reader thread
+        :return: None
+        """
+        self._readerLocal.conn = sqlite3.connect(f"file:{self.dbPath}?mode=ro", uri=True,
+                                                cached_statements=self.cachedStatements)
+
+    def _run_reader(self, func: Callable, args: Tuple) -> Any:
+        return func(self._readerLocal.conn, *args)
+
+    def _enqueue(self, func: Any, args: Tuple, notify: Notify) -> None:
+        """
+        Hand a write or flush marker to the writer
+        """
+        self._writeQueue.put((func, args, notify))
+
+    def run_write(self, func: Callable, *args) -> "asyncio.Future":
+        """
+        Queue a call on the writer thread. The callable must not commit, the
+        writer commits once for the whole batch it lands in.
+        :param func: Callable taking the writer connection followed by args
+        :return: Awaitable resolving to the callable's result once committed
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._enqueue(func, args, _future_notify(loop, future))
+        return future
+
+    def submit_write(self, func: Callable, *args, notify: Notify = None) -> None:
+        """
+        Queue a call on the writer thread without waiting for its commit
+        :param func: Callable taking the writer connection followed by args
+        :param notify: Called on the writer thread with (result, error) once committed
+        :return: None
+        """
+        self._enqueue(func, args, notify)
+
+    def request_flush(self, notify: Notify) -> None:
+        """
+        Commit every queued write without waiting
+        :param notify: Called on the writer thread once they're committed
+        :return: None
+        """
+        self._enqueue(_FLUSH, (), notify)
+
+    def run_read(self, func: Callable, *args) -> "asyncio.Future":
+        """
+        Run a call on one of the read-only connections
+        :param func: Callable taking a reader connection followed by args
+        :return: Awaitable resolving to the callable's result
+        """
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._readers, self._run_reader, func, args)
+
+    def run_write_blocking(self, func: Callable, *args) -> Any:
+        """
+        Run a call on the writer thread and wait for its commit without an event loop
+        :param func: Callable taking the writer connection followed by args
+        :return: The callable's result
+        :raises Exception: Whatever the callable or the commit raised
+        """
+        done = threading.Event()
+        outcome: List[Tuple[Any, Optional[BaseException]]] = list()
+
+        def notify(result: Any, error: Optional[BaseException]) -> None:
+            outcome.append((result, error))
+            done.set()
+
+        self.submit_write(func, *args, notify=notify)
+        if self.writeBehind:
+            self.request_flush(None)
+        done.wait()
+        result, error = outcome[0]
+        if error is not None:
+            raise error
+        return result
+
+    def flush(self) -> None:
+        """
+        Commit every queued write, blocking until it's done
+        :return: None
+        """
+        if self._closed:
+            return
+        done = threading.Event()
+        self.request_flush(lambda result, error: done.set())
+        done.wait()
+
+    def flush_async(self) -> "asyncio.Future":
+        """
+        Commit every queued write
+        :return: Awaitable resolving once the queued writes are committed
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if self._closed:
+            future.set_result(None)
+        else:
+            self.request_flush(_future_notify(loop, future))
+        return future
+
+    def get_flush_metrics(self) -> Dict[str, float]:
+        """
+        Summarize the batches committed so far
+        :return: Flush count, committed writes, average batch size and commit latency
+        """
+        history = list(self.flushHistory)
+        return {
+            "flushes": self.flushCount,
+            "writes": self.flushedWrites,
+            "failed_writes": self.failedWrites,
+            "avg_batch_size": sum(m.batchSize for m in history) / len(history) if history else 0,
+            "avg_commit_latency": sum(m.commitLatency for m in history) / len(history) if history else 0,
+            "last_batch_size": history[-1].batchSize if history else 0,
+            "last_commit_latency": history[-1].commitLatency if history else 0,
+        }
+
+    def close(self) -> None:
+        """
+        Flush queued writes and shut down every connection
+        :return: None
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._writeQueue.put(_STOP)
+        self._writer.join()
+        self._readers.shutdown(wait=True)
+
+def _future_notify(loop: asyncio.AbstractEventLoop, future: "asyncio.Future") -> Notify:
+    """
+    Build a writer notification that resolves an asyncio future on its own loop
+    """
+    def notify(result: Any, error: Optional[BaseException]) -> None:
+        try:
+            if error is not None:
+                loop.call_soon_threadsafe(_set_exception, future, error)
+            else:
+                loop.call_soon_threadsafe(_set_result, future, result)
+        except RuntimeError:
+            # the loop closed while shutting down, nobody waits on the future anymore
+            pass
+    return notify
+
+def _set_result(future: "asyncio.Future", result: Any) -> None:
+    if not future.cancelled():
+        future.set_result(result)
+
+def _set_exception(future: "asyncio.Future", exception: BaseException) -> None:
+    if not future.cancelled():
+        future.set_exception(exception)
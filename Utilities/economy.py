@@ -0,0 +1,73 @@
+"""
+In-memory currency balances
+The currency ledger is the source of truth, balances are summed from it once on
+startup and then kept current as entries are appended.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, Tuple
+from weakref import WeakValueDictionary
+
+# balance of a user before any ledger entries, the users.currency default
+STARTING_BALANCE = 50
+# attempts at a currency change before a BalanceConflict is given up on
+LEDGER_RETRIES = 3
+
+class BalanceConflict(Exception):
+    """
+    The stored balance isn't the one a change was computed from, another process changed it first
+    """
+    def __init__(self, userId: int, balance: int) -> None:
+        super().__init__(userId, balance)
+        self.userId = userId
+        self.balance = balance
+
+class BalanceCache:
+    """
+    Balance of every user with ledger entries plus a lock per user being changed.
+    Locks are only kept alive while in use, so changes to unrelated users never wait on each other.
+    """
+    def __init__(self) -> None:
+        self._balances: Dict[int, int] = dict()
+        self._locks: "WeakValueDictionary[int, asyncio.Lock]" = WeakValueDictionary()
+
+    def load(self, rows: Iterable[Tuple[int, int]]) -> None:
+        """
+        Rebuild every balance from the ledger
+        :param rows: (user_id, sum of amounts) for every user with ledger entries
+        :return: None
+        """
+        self._balances = {int(userId): STARTING_BALANCE + total for userId, total in rows}
+
+    def get(self, userId: int) -> int:
+        return self._balances.get(int(userId), STARTING_BALANCE)
+
+    def set(self, userId: int, balance: int) -> None:
+        self._balances[int(userId)] = balance
+
+    def _lock(self, userId: int) -> asyncio.Lock:
+        lock = self._locks.get(userId)
+        if lock is None:
+            lock = self._locks[userId] = asyncio.Lock()
+        return lock
+
+    @asynccontextmanager
+    async def locked(self, *userIds: int) -> AsyncIterator[None]:
+        """
+        Hold the locks of every given user, taken in ID order so two transfers can't deadlock
+        :param userIds: Users whose balances are about to change
+        """
+        locks = [self._lock(userId) for userId in sorted(set(int(userId) for userId in userIds))]
+        acquired = list()
+        try:
+            for lock in locks:
+                await lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+    def __len__(self) -> int:
+        return len(self._balances)
@@ -0,0 +1,55 @@
+"""
+In-memory index of the guilds, users and guild users already stored in the database
+"""
+
+from typing import Iterable, Set, Tuple
+
+def _pair_key(guildId: int, userId: int) -> int:
+    """
+    Pack a (guild, user) pair of 64 bit snowflakes into one int
+    """
+    return (guildId << 64) | userId
+
+class KnownEntityIndex:
+    """
+    Tracks which rows exist so setup_bot_info can skip its selections.
+    Rows are never deleted, so once an id is known it stays known.
+    """
+    def __init__(self) -> None:
+        self.guilds: Set[int] = set()
+        self.users: Set[int] = set()
+        self.guildUsers: Set[int] = set()
+
+    def load(self, guildIds: Iterable[int], userIds: Iterable[int],
+    guildUserIds: Iterable[Tuple[int, int]]) -> None:
+        """
+        Bulk load ids read from the database
+        :param guildIds: Ids from the guilds table
+        :param userIds: Ids from the users table
+        :param guildUserIds: (guild_id, user_id) pairs from the guild_users table
+        :return: None
+        """
+        self.guilds.update(guildIds)
+        self.users.update(userIds)
+        self.guildUsers.update(_pair_key(guildId, userId) for guildId, userId in guildUserIds)
+
+    def has_guild(self, guildId: int) -> bool:
+        return guildId in self.guilds
+
+    def has_user(self, userId: int) -> bool:
+        return userId in self.users
+
+    def has_guild_user(self, guildId: int, userId: int) -> bool:
+        return _pair_key(guildId, userId) in self.guildUsers
+
+    def add_guild(self, guildId: int) -> None:
+        self.guilds.add(guildId)
+
+    def add_user(self, userId: int) -> None:
+        self.users.add(userId)
+
+    def add_guild_user(self, guildId: int, userId: int) -> None:
+        self.guildUsers.add(_pair_key(guildId, userId))
+
+    def __len__(self) -> int:
+        return len(self.guilds) + len(self.users) + len(self.guildUsers)
@@ -5,6 +5,9 @@ Enumerations for various bot functions
 
 from enum import Enum
 
+# file formats of guild data exports, here so slash command choices don't load the exporter
+GUILD_DATA_FORMATS = ("jsonl", "csv")
+
 class CooldownEnums(Enum):
     """Enumerations of cooldown types"""
     GUILD = 1
@@ -16,9 +19,28 @@ class CommandEnums(Enum):
     RELOAD = 2
     PICK_ROLE = 3
     ADD_ROLE = 4
+    MESSAGE_XP = 5
+    LEADERBOARD = 6
+    BALANCE = 7
+    PAY = 8
+    RANK = 9
+    PROFILE = 10
+    MATH = 11
 
 class UserType(Enum):
     NORMAL = 1
     BOT_ADMIN = 2
     GUILD_ADMIN = 3
     DEVELOPER = 4
+
+class RateLimitScope(Enum):
+    """Who shares a rate limit"""
+    USER = 1
+    GUILD = 2
+    COMMAND = 3
+    GLOBAL = 4
+
+class RateLimitType(Enum):
+    """Rate limiting algorithms"""
+    TOKEN_BUCKET = 1
+    SLIDING_WINDOW = 2
@@ -0,0 +1,183 @@
+"""
+Streaming export and import of one guild's data
+A guild's guilds, users, guild_users and role_reactions rows are written as
+JSONL or CSV straight from a cursor in fixed-size chunks, and read back in
+batches of executemany, so memory use doesn't grow with the guild.
+"""
+
+import csv
+import json
+from sqlite3 import Connection
+from time import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+
+from Utilities.economy import STARTING_BALANCE
+from Utilities.enums import GUILD_DATA_FORMATS as FORMATS
+from Utilities.queries import query
+
+# rows fetched from a cursor or handed to executemany at once
+CHUNK_SIZE = 500
+
+# in dependency order, users and guilds exist before the rows referencing them
+GUILD_TABLES: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("guilds", ("guild_id",)),
+    ("users", ("user_id", "currency")),
+    ("guild_users", ("guild_id", "user_id", "xp", "xp_needed", "guild_level", "permissions")),
+    ("role_reactions", ("role_id", "guild_id", "role_name", "descr")),
+)
+COLUMNS: Dict[str, Tuple[str, ...]] = dict(GUILD_TABLES)
+
+def format_for_path(path: str, default: str = "jsonl") -> str:
+    """
+    :return: The format a file name's extension stands for
+    """
+    extension = path.rpartition(".")[2].lower()
+    return extension if extension in FORMATS else default
+
+def _stream(conn: Connection, queryString: str, guildId: int, chunkSize: int) -> Iterator[List[Tuple]]:
+    cursor = conn.execute(queryString, (guildId,))
+    try:
+        while True:
+            rows = cursor.fetchmany(chunkSize)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cursor.close()
+
+def export_guild(conn: Connection, guildId: int, out: TextIO, fmt: str = "jsonl",
+chunkSize: int = CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Write every row belonging to a guild, all read from one snapshot
+    :param conn: Connection to the bot database, only read from
+    :param guildId: The guild ID as an integer
+    :param out: Text stream the rows are written to
+    :param fmt: jsonl or csv. CSV rows start with their table, each table begins with a header row
+    :param chunkSize: Rows fetched from the cursor at a time
+    :return: Rows written per table
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt}, expected one of {', '.join(FORMATS)}")
+    writer = csv.writer(out) if fmt == "csv" else None
+    counts: Dict[str, int] = dict()
+    # one read transaction, every table is read from the same WAL snapshot while writes carry on
+    ownTransaction = not conn.in_transaction
+    if ownTransaction:
+        conn.execute("BEGIN;")
+    try:
+        for table, columns in GUILD_TABLES:
+            counts[table] = 0
+            if writer:
+                writer.writerow(["#" + table, *columns])
+            for rows in _stream(conn, query("export_guild_" + table), int(guildId), chunkSize):
+                if writer:
+                    writer.writerows([table, *row] for row in rows)
+                else:
+                    out.writelines(json.dumps({"table": table, **dict(zip(columns, row))}) + "\n" for row in rows)
+                counts[table] += len(rows)
+    finally:
+        if ownTransaction:
+            conn.execute("COMMIT;")
+    return counts
+
+def _read_rows(rows: TextIO, fmt: str) -> Iterator[Tuple[str, Tuple]]:
+    """
+    Parse an export lazily
+    :return: Iterator of (table, values in GUILD_TABLES column order)
+    """
+    if fmt == "csv":
+        columns: Dict[str, List[str]] = dict()
+        for line in csv.reader(rows):
+            if not line:
+                continue
+            if line[0].startswith("#"):
+                columns[line[0][1:]] = line[1:]
+                continue
+            table = line[0]
+            if table not in COLUMNS:
+                raise ValueError(f"Unknown table {table} in import")
+            values = dict(zip(columns.get(table, COLUMNS[table]), line[1:]))
+            # CSV loses the difference between NULL and empty text, only descriptions may be either
+            yield table, tuple(values.get(column, "") if column == "descr" else values.get(column) or None
+                               for column in COLUMNS[table])
+        return
+    if fmt != "jsonl":
+        raise ValueError(f"Unknown import format {fmt}, expected one of {', '.join(FORMATS)}")
+    for line in rows:
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        table = row.get("table")
+        if table not in COLUMNS:
+            raise ValueError(f"Unknown table {table} in import")
+        yield table, tuple(row.get(column) for column in COLUMNS[table])
+
+def _import_batch(conn: Connection, table: str, batch: List[Tuple], now: int) -> None:
+    if table == "guilds":
+        conn.executemany(query("add_guild"), batch)
+    elif table == "users":
+        # users new to this database open with their exported balance on the ledger
+        conn.executemany(query("import_user_balance"),
+                         [(int(userId), int(currency) - STARTING_BALANCE, now, int(userId))
+                          for userId, currency in batch if int(currency) != STARTING_BALANCE])
+        conn.executemany(query("import_user"), batch)
+    elif table == "guild_users":
+        conn.executemany(query("import_guild_user"), batch)
+    else:
+        conn.executemany(query("add_assignable_guild_role"), batch)
+
+def import_guild(conn: Connection, rows: Iterable[str], fmt: str = "jsonl",
+batchSize: int = CHUNK_SIZE) -> Tuple[Dict[str, int], Set[int]]:
+    """
+    Load an export in one transaction, all or nothing. Doesn't commit, the caller
+    or the writer thread does. Existing guild users and roles are replaced,
+    existing users keep their balance.
+    :param conn: Writable connection to the bot database
+    :param rows: Lines of an export, read lazily
+    :param fmt: jsonl or csv
+    :param batchSize: Rows handed to executemany at once
+    :return: Rows read per table and the guilds that were imported
+    """
+    counts: Dict[str, int] = {table: 0 for table, _ in GUILD_TABLES}
+    guildIds: Set[int] = set()
+    now = int(time())
+
+    if not conn.in_transaction:
+        conn.execute("BEGIN;")
+    # a savepoint keeps the import atomic inside a batch shared with other writes
+    conn.execute("SAVEPOINT guild_import;")
+    try:
+        table: Optional[str] = None
+        batch: List[Tuple] = list()
+        for rowTable, values in _read_rows(rows, fmt):
+            # batches never mix tables, so rows land in the order they were exported
+            if rowTable != table or len(batch) >= batchSize:
+                if batch:
+                    _import_batch(conn, table, batch, now)
+                table, batch = rowTable, list()
+            batch.append(values)
+            counts[rowTable] += 1
+            if rowTable == "guilds":
+                guildIds.add(int(values[0]))
+        if batch:
+            _import_batch(conn, table, batch, now)
+    except:
+        conn.execute("ROLLBACK TO guild_import;")
+        conn.execute("RELEASE guild_import;")
+        raise
+    conn.execute("RELEASE guild_import;")
+    return counts, guildIds
+
+def export_guild_file(conn: Connection, guildId: int, path: str, fmt: str) -> Dict[str, int]:
+    """
+    export_guild into a file, runs on a reader connection in async mode
+    """
+    with open(path, "w", newline="" if fmt == "csv" else None, encoding="utf-8") as fp:
+        return export_guild(conn, guildId, fp, fmt)
+
+def import_guild_file(conn: Connection, path: str, fmt: str) -> Tuple[Dict[str, int], Set[int]]:
+    """
+    import_guild from a file, runs on the writer in async mode
+    """
+    with open(path, "r", newline="" if fmt == "csv" else None, encoding="utf-8") as fp:
+        return import_guild(conn, fp, fmt)
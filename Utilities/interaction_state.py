@@ -0,0 +1,155 @@
+"""
+Short-lived state for multi-step component flows
+Owned by the bot so it survives extension reloads.
+"""
+
+from collections import OrderedDict
+from heapq import heapify, heappop, heappush
+from itertools import count
+from time import monotonic
+from typing import Any, Hashable, List, Optional, Tuple, Union
+
+# Discord rejects component custom IDs longer than this
+CUSTOM_ID_LIMIT = 100
+CUSTOM_ID_SEPARATOR = ":"
+
+class StateRecord:
+    """
+    A stored value and the monotonic time it expires at
+    """
+    __slots__ = ("value", "expires")
+
+    def __init__(self, value: Any, expires: float) -> None:
+        self.value = value
+        self.expires = expires
+
+class InteractionStateStore:
+    """
+    Key-value store with a TTL per entry and a global size cap.
+    Entries are kept in least recently used order, once the cap is reached
+    the least recently used entry is evicted. Expired entries are reclaimed by
+    a min-heap sweeper ordered on expiry, since reads and per-entry TTLs leave
+    the recency order unrelated to it.
+    """
+    def __init__(self, ttl: float = 900, maxEntries: int = 10000) -> None:
+        """
+        :param ttl: Default lifetime of an entry in seconds, component interactions last 15 minutes
+        :param maxEntries: Most entries kept at once
+        :return: None
+        """
+        self.ttl = ttl
+        self.maxEntries = maxEntries
+        self._records: "OrderedDict[Hashable, StateRecord]" = OrderedDict()
+        # (expires, sequence, key) entries, may hold stale entries for keys that were set again or removed.
+        # the sequence breaks ties so keys of different shapes are never compared
+        self._expiries: List[Tuple[float, int, Hashable]] = list()
+        self._sequence = count()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def _sweep(self, now: float) -> None:
+        """
+        Drop every expired entry
+        """
+        expiries = self._expiries
+        records = self._records
+        while expiries and expiries[0][0] <= now:
+            expires, _, key = heappop(expiries)
+            record = records.get(key)
+            if record is not None and record.expires == expires:
+                del records[key]
+                self.expirations += 1
+
+        # overwritten and evicted entries leave stale heap entries behind, compact once they dominate
+        if len(expiries) > 64 and len(expiries) > 2 * len(records):
+            self._expiries = [(record.expires, next(self._sequence), key) for key, record in records.items()]
+            heapify(self._expiries)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a value
+        :param key: Key of the entry, usually (namespace, user id)
+        :param value: Value to store
+        :param ttl: Lifetime in seconds, the store default if not given
+        :return: None
+        """
+        now = monotonic()
+        self._sweep(now)
+        record = self._records[key] = StateRecord(value, now + (self.ttl if ttl is None else ttl))
+        self._records.move_to_end(key)
+        heappush(self._expiries, (record.expires, next(self._sequence), key))
+        while len(self._records) > self.maxEntries:
+            self._records.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Look up a value
+        :param key: Key of the entry
+        :param default: Returned when the key is missing or expired
+        :return: The stored value or default
+        """
+        record = self._records.get(key)
+        if record is None:
+            self.misses += 1
+            return default
+        if record.expires <= monotonic():
+            del self._records[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._records.move_to_end(key)
+        return record.value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Remove and return a value
+        :param key: Key of the entry
+        :param default: Returned when the key is missing or expired
+        :return: The stored value or default
+        """
+        value = self.get(key, default)
+        self._records.pop(key, None)
+        return value
+
+    def metrics(self) -> dict:
+        return {
+            "entries": len(self._records),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+        }
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+def encode_custom_id(prefix: str, *values: Union[int, str]) -> str:
+    """
+    Pack small state into a component custom ID so it needs no server-side storage
+    :param prefix: Name of the component, what callbacks match on
+    :param values: Ints or strings without the separator
+    :return: The custom ID
+    """
+    parts = [prefix]
+    for value in values:
+        value = str(value)
+        if CUSTOM_ID_SEPARATOR in value:
+            raise ValueError(f"Custom ID values can't contain '{CUSTOM_ID_SEPARATOR}'")
+        parts.append(value)
+    customId = CUSTOM_ID_SEPARATOR.join(parts)
+    if len(customId) > CUSTOM_ID_LIMIT:
+        raise ValueError(f"Custom ID is longer than {CUSTOM_ID_LIMIT} characters")
+    return customId
+
+def decode_custom_id(customId: str) -> Tuple[str, List[str]]:
+    """
+    Unpack a custom ID made by encode_custom_id
+    :param customId: The custom ID
+    :return: The prefix and the encoded values as strings
+    """
+    prefix, *values = customId.split(CUSTOM_ID_SEPARATOR)
+    return prefix, values
@@ -0,0 +1,136 @@
+"""
+Per-guild XP leaderboards
+Each guild's ranking is read from the database once and then kept in order as
+XP changes, so pages and rank lookups never touch the database.
+"""
+
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+from Utilities.bot_sql import BotSQL
+from Utilities.leveling import LevelEngine
+
+# members shown per leaderboard page
+LEADERBOARD_PAGE_SIZE = 10
+
+class GuildLeaderboard:
+    """
+    A guild's members ordered by XP, ties broken by user ID
+    """
+    __slots__ = ("ranking", "xp")
+
+    def __init__(self) -> None:
+        # (-xp, user) so the first entry is the highest XP
+        self.ranking = SortedList()
+        self.xp: Dict[int, int] = dict()
+
+    def update(self, userId: int, xp: int) -> None:
+        """
+        Move a member to their new position, O(log n)
+        :param userId: The member's user ID
+        :param xp: The member's total XP
+        :return: None
+        """
+        previous = self.xp.get(userId)
+        if previous == xp:
+            return
+        if previous is not None:
+            self.ranking.remove((-previous, userId))
+        self.ranking.add((-xp, userId))
+        self.xp[userId] = xp
+
+    def rank(self, userId: int) -> Optional[int]:
+        """
+        :param userId: The member's user ID
+        :return: 1-based rank, None if the member has no XP yet
+        """
+        xp = self.xp.get(userId)
+        if xp is None:
+            return None
+        return self.ranking.bisect_left((-xp, userId)) + 1
+
+    def page(self, page: int, pageSize: int = LEADERBOARD_PAGE_SIZE) -> List[Tuple[int, int, int]]:
+        """
+        :param page: 0-based page number
+        :param pageSize: Members per page
+        :return: List of (rank, user_id, xp)
+        """
+        start = page * pageSize
+        return [(start + i + 1, userId, -negativeXp)
+                for i, (negativeXp, userId) in enumerate(self.ranking[start:start + pageSize])]
+
+    def page_count(self, pageSize: int = LEADERBOARD_PAGE_SIZE) -> int:
+        return max(1, -(-len(self.ranking) // pageSize))
+
+    def __len__(self) -> int:
+        return len(self.ranking)
+
+class LeaderboardCache:
+    """
+    Leaderboards of the guilds that have been looked at, kept current by the level engine
+    """
+    def __init__(self, sql: BotSQL, levels: LevelEngine) -> None:
+        """
+        :param sql: Database the leaderboards are first read from
+        :param levels: Level engine whose XP changes are applied
+        :return: None
+        """
+        self._sql = sql
+        self._levels = levels
+        self._boards: Dict[int, GuildLeaderboard] = dict()
+        # guilds being read from the database, changes meanwhile go to the board being loaded
+        self._loading: Dict[int, Tuple[GuildLeaderboard, asyncio.Task]] = dict()
+        levels.add_listener(self.update)
+
+    def update(self, guildId: int, userId: int, xp: int) -> None:
+        """
+        Level engine listener, guilds without a loaded leaderboard are skipped
+        """
+        board = self._boards.get(guildId)
+        if board is None and guildId in self._loading:
+            board = self._loading[guildId][0]
+        if board is not None:
+            board.update(userId, xp)
+
+    async def _load(self, guildId: int, board: GuildLeaderboard) -> GuildLeaderboard:
+        try:
+            # pending XP has to land before the guild is read back
+            await self._levels.flush_async()
+            await self._sql.flush_async()
+            for userId, xp in await self._sql.get_guild_leaderboard_async(guildId) or []:
+                # anything the level engine reported while reading is newer
+                if userId not in board.xp:
+                    board.update(userId, xp)
+            # members without a row yet only have XP in memory
+            for userId, xp in self._levels.get_pending(guildId):
+                if userId not in board.xp:
+                    board.update(userId, xp)
+            self._boards[guildId] = board
+            return board
+        finally:
+            del self._loading[guildId]
+
+    async def get(self, guildId: int) -> GuildLeaderboard:
+        """
+        Get a guild's leaderboard, reading it from the database the first time
+        :param guildId: The guild ID as an integer
+        :return: The guild's leaderboard
+        """
+        board = self._boards.get(guildId)
+        if board is not None:
+            return board
+        if guildId not in self._loading:
+            board = GuildLeaderboard()
+            self._loading[guildId] = (board, asyncio.ensure_future(self._load(guildId, board)))
+        return await asyncio.shield(self._loading[guildId][1])
+
+    def invalidate(self, guildId: int) -> None:
+        """
+        Drop a guild's leaderboard after its XP was replaced, it's read again on next use
+        """
+        self._boards.pop(guildId, None)
+
+    def __len__(self) -> int:
+        return len(self._boards)
@@ -0,0 +1,241 @@
+"""
+Message XP and levels
+XP is accumulated in memory per guild user and written back in batches, a
+message costs a couple of dict operations instead of a database write.
+"""
+
+import asyncio
+import logging
+from math import isqrt
+from random import randint
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from Utilities.bot_sql import BotSQL
+from Utilities.cooldown import CooldownManager
+from Utilities.enums import CommandEnums, CooldownEnums
+
+logger = logging.getLogger(__name__)
+
+# reaching level L takes LEVEL_XP_BASE * L * (L + 1) XP in total, so 100 for level 1, 300 for level 2
+LEVEL_XP_BASE = 50
+# XP given per message, inclusive
+MESSAGE_XP = (15, 25)
+# seconds a member has to wait before their messages count again
+MESSAGE_COOLDOWN = 60
+# seconds between writes of changed XP
+FLUSH_INTERVAL = 5.0
+
+# (guild, user)
+GuildUserKey = Tuple[int, int]
+
+def xp_for_level(level: int) -> int:
+    """
+    :param level: A level
+    :return: Total XP at which the level is reached
+    """
+    return LEVEL_XP_BASE * level * (level + 1)
+
+def level_for_xp(xp: int) -> int:
+    """
+    Solve LEVEL_XP_BASE * L * (L + 1) <= xp for the largest L
+    :param xp: Total XP
+    :return: Level reached with that XP
+    """
+    return (isqrt(4 * (xp // LEVEL_XP_BASE) + 1) - 1) // 2
+
+def xp_needed(xp: int) -> int:
+    """
+    :param xp: Total XP
+    :return: XP left until the next level
+    """
+    return xp_for_level(level_for_xp(xp) + 1) - xp
+
+class LevelEngine:
+    """
+    Holds every guild user's XP and the set of rows changed since the last flush
+    """
+    def __init__(self, sql: BotSQL, cooldowns: CooldownManager, messageXp: Tuple[int, int] = MESSAGE_XP,
+    cooldown: int = MESSAGE_COOLDOWN, flushInterval: float = FLUSH_INTERVAL) -> None:
+        """
+        :param sql: Database the XP is stored in
+        :param cooldowns: Cooldown manager used against message spam
+        :param messageXp: Inclusive range of XP given per message
+        :param cooldown: Seconds before a member's messages count again
+        :param flushInterval: Seconds between writes of changed XP
+        :return: None
+        """
+        self._sql = sql
+        self._cooldowns = cooldowns
+        self._messageXp = messageXp
+        self._cooldown = cooldown
+        self._flushInterval = flushInterval
+        self._xp: Dict[GuildUserKey, int] = dict()
+        self._dirty: Set[GuildUserKey] = set()
+        # flushes are skipped while above 0, see hold
+        self._holds = 0
+        # called with (guild, user, xp) after every change
+        self._listeners: List[Callable[[int, int, int], None]] = list()
+        self.messages = 0
+        self.levelUps = 0
+        self.flushes = 0
+        self.rowsFlushed = 0
+        self.failedFlushes = 0
+
+    def load(self, rows: Iterable[Tuple[int, int, int]]) -> None:
+        """
+        Fill XP from the database, done once at startup
+        :param rows: (guild_id, user_id, xp) of every guild user
+        :return: None
+        """
+        for guildId, userId, xp in rows:
+            self._xp[(int(guildId), int(userId))] = xp
+
+    def add_listener(self, listener: Callable[[int, int, int], None]) -> None:
+        """
+        Get notified of XP changes, used to keep derived structures current
+        :param listener: Called with (guild_id, user_id, xp)
+        :return: None
+        """
+        self._listeners.append(listener)
+
+    def get_xp(self, guildId: int, userId: int) -> int:
+        return self._xp.get((int(guildId), int(userId)), 0)
+
+    def get_level(self, guildId: int, userId: int) -> int:
+        return level_for_xp(self.get_xp(guildId, userId))
+
+    def add_message(self, guildId: int, userId: int) -> Optional[int]:
+        """
+        Count a message towards a member's XP unless they're on the message cooldown
+        :param guildId: Guild the message was sent in
+        :param userId: Author of the message
+        :return: The new level if the member leveled up, otherwise None
+        """
+        guildId, userId = int(guildId), int(userId)
+        if self._cooldowns.get_cooldown(userId, CommandEnums.MESSAGE_XP, guildId):
+            return None
+        self._cooldowns.set_cooldown(CommandEnums.MESSAGE_XP, userId, self._cooldown, CooldownEnums.GUILD, guildId)
+
+        key = (guildId, userId)
+        before = self._xp.get(key, 0)
+        after = before + randint(*self._messageXp)
+        self._xp[key] = after
+        self._dirty.add(key)
+        self.messages += 1
+        for listener in self._listeners:
+            listener(guildId, userId, after)
+
+        level = level_for_xp(after)
+        if level > level_for_xp(before):
+            self.levelUps += 1
+            return level
+        return None
+
+    def hold(self) -> None:
+        """
+        Stop flushing while a guild's XP is replaced in the database, XP keeps being counted meanwhile
+        :return: None
+        """
+        self._holds += 1
+
+    def release(self) -> None:
+        """
+        Undo one hold, flushes resume once every hold is released
+        :return: None
+        """
+        self._holds = max(0, self._holds - 1)
+
+    def reset_guild(self, guildId: int, rows: Iterable[Tuple[int, int]]) -> None:
+        """
+        Replace a guild's XP after it was replaced in the database, XP counted since is dropped
+        :param guildId: The guild ID as an integer
+        :param rows: (user_id, xp) of every stored guild user
+        :return: None
+        """
+        guildId = int(guildId)
+        self._dirty = {key for key in self._dirty if key[0] != guildId}
+        for key in [key for key in self._xp if key[0] == guildId]:
+            del self._xp[key]
+        self.load((guildId, userId, xp) for userId, xp in rows)
+
+    def _take_dirty_rows(self) -> List[Tuple[int, int, int, int, int]]:
+        """
+        Swap out the changed rows, anything changed while they're written is kept for the next flush.
+        Members without a guild user row stay pending until a command creates it with their permissions.
+        :return: List of (guild_id, user_id, xp, xp_needed, guild_level), empty while held
+        """
+        if self._holds:
+            return list()
+        dirty, self._dirty = self._dirty, set()
+        rows = list()
+        for guildId, userId in dirty:
+            if not self._sql.known.has_guild_user(guildId, userId):
+                self._dirty.add((guildId, userId))
+                continue
+            xp = self._xp[(guildId, userId)]
+            rows.append((guildId, userId, xp, xp_needed(xp), level_for_xp(xp)))
+        return rows
+
+    def get_pending(self, guildId: int) -> List[Tuple[int, int]]:
+        """
+        XP of a guild's members that isn't stored yet, including members without a guild user row
+        :param guildId: The guild ID as an integer
+        :return: List of (user_id, xp)
+        """
+        guildId = int(guildId)
+        return [(userId, self._xp[(g, userId)]) for g, userId in self._dirty if g == guildId]
+
+    def _restore_rows(self, rows: List[Tuple[int, int, int, int, int]]) -> None:
+        # a failed save leaves the rows pending, they're written with their latest XP next time
+        self._dirty.update((guildId, userId) for guildId, userId, *_ in rows)
+
+    def _count_flush(self, rows: List[Tuple[int, int, int, int, int]]) -> None:
+        self.flushes += 1
+        self.rowsFlushed += len(rows)
+
+    def flush(self) -> None:
+        """
+        Write every changed row in one transaction, blocks until done
+        :return: None
+        :raises Exception: Whatever the save raised, the rows stay pending
+        """
+        rows = self._take_dirty_rows()
+        if rows:
+            try:
+                self._sql.save_guild_user_xp(rows)
+            except BaseException:
+                self._restore_rows(rows)
+                raise
+            self._count_flush(rows)
+
+    async def flush_async(self) -> None:
+        """
+        Write every changed row in one transaction
+        :return: None
+        :raises Exception: Whatever the save raised, the rows stay pending
+        """
+        rows = self._take_dirty_rows()
+        if rows:
+            try:
+                await self._sql.save_guild_user_xp_async(rows)
+            except BaseException:
+                self._restore_rows(rows)
+                raise
+            self._count_flush(rows)
+
+    async def run_flusher(self) -> None:
+        """
+        Keep flushing changed XP every flushInterval seconds, a failed flush is retried on the next one
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(self._flushInterval)
+            try:
+                await self.flush_async()
+            except Exception:
+                self.failedFlushes += 1
+                logger.exception("flushing XP of %d guild users failed", len(self._dirty))
+
+    def metrics(self) -> Dict[str, int]:
+        return {"messages": self.messages, "level_ups": self.levelUps, "pending": len(self._dirty),
+                "flushes": self.flushes, "rows_flushed": self.rowsFlushed, "failed_flushes": self.failedFlushes}
@@ -0,0 +1,34 @@
+"""
+Small LRU cache shared by the worker-backed renderers and evaluators
+"""
+
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+class LRUCache:
+    """
+    Bounded mapping evicting the least recently used entry
+    """
+    def __init__(self, maxEntries: int) -> None:
+        self.maxEntries = maxEntries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxEntries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,263 @@
+"""
+Sandboxed math evaluation with sympy
+sympy is only ever imported inside worker processes, so it costs the bot
+nothing at startup. Workers are started ahead of time or on the first
+evaluation, every evaluation runs under a hard timeout after which its worker
+is killed and replaced, and results are kept in an LRU cache keyed on the
+normalized expression.
+"""
+
+import asyncio
+import multiprocessing
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from Utilities.lru import LRUCache
+
+MAX_EXPRESSION_LENGTH = 200
+MAX_RESULT_LENGTH = 1000
+# seconds an evaluation may take before its worker is killed
+EVALUATION_TIMEOUT = 5.0
+# seconds a freshly started worker gets to import sympy
+STARTUP_TIMEOUT = 60.0
+# address space of a worker, a runaway expression fails instead of swapping the host
+WORKER_MEMORY_BYTES = 512 * 1024 * 1024
+
+# names an expression may use besides single letter symbols, anything else is rejected before parsing
+FUNCTIONS = frozenset((
+    "sin", "cos", "tan", "cot", "sec", "csc", "asin", "acos", "atan", "sinh", "cosh", "tanh",
+    "sqrt", "cbrt", "root", "log", "ln", "exp", "abs", "floor", "ceiling", "factorial", "binomial",
+    "gcd", "lcm", "isprime", "prime", "pi", "oo", "diff", "integrate", "limit", "summation",
+    "simplify", "expand", "factor", "solve",
+))
+ALLOWED_CHARACTERS = re.compile(r"^[A-Za-z0-9\s+\-*/^().,=!<>]*$")
+NAME = re.compile(r"[A-Za-z]+")
+# a dot after a name or bracket is attribute access, only decimals may contain one
+ATTRIBUTE = re.compile(r"[A-Za-z)]\s*\.")
+
+class MathError(Exception):
+    """
+    An expression that was rejected, failed to evaluate or ran out of time
+    """
+
+def normalize(expression: str) -> str:
+    """
+    Canonical spelling of an expression, equal spellings share a cache entry
+    :return: The expression without redundant whitespace and with ^ for powers
+    """
+    expression = re.sub(r"\s+", " ", expression.strip()).replace("**", "^")
+    return re.sub(r" ?([+\-*/^(),=!<>]) ?", r"\1", expression)
+
+def validate(expression: str) -> None:
+    """
+    Reject anything that isn't plain math before it reaches sympy, which parses with eval
+    :raises MathError: When the expression isn't allowed
+    """
+    if not expression:
+        raise MathError("Give an expression to evaluate.")
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise MathError(f"Expressions are limited to {MAX_EXPRESSION_LENGTH} characters.")
+    if not ALLOWED_CHARACTERS.match(expression) or ATTRIBUTE.search(expression):
+        raise MathError("Only numbers, letters, brackets and + - * / ^ ! = < > are allowed.")
+    unknown = sorted({name for name in NAME.findall(expression) if len(name) > 1 and name not in FUNCTIONS})
+    if unknown:
+        raise MathError("Unknown names: " + ", ".join(unknown) + ". Symbols are single letters.")
+
+def _evaluate(expression: str) -> str:
+    """
+    Evaluate a validated expression, runs in a worker process
+    An equation is solved, an expression with symbols simplified, anything else computed exactly and numerically.
+    """
+    from sympy import Abs, Eq, N, log, simplify, solve
+    from sympy.parsing.sympy_parser import (parse_expr, standard_transformations, convert_xor,
+                                            implicit_multiplication_application)
+    transformations = standard_transformations + (convert_xor, implicit_multiplication_application)
+    names = {"ln": log, "abs": Abs}
+
+    def parse(text: str) -> Any:
+        return parse_expr(text, local_dict=names, transformations=transformations)
+
+    if "=" in expression and not re.search(r"[=!<>]=|[<>]", expression):
+        left, right = expression.split("=", 1)
+        return str(solve(Eq(parse(left), parse(right))))
+    result = parse(expression)
+    if getattr(result, "free_symbols", None):
+        return str(simplify(result))
+    # integers, decimals and truth values are already as exact as they get
+    if not getattr(result, "is_number", False) or result.is_Integer or result.is_Float:
+        return str(result)
+    numeric = N(result, 15)
+    return str(result) if str(result) == str(numeric) else f"{result} ≈ {numeric}"
+
+def _worker_main(conn: Any) -> None:
+    """
+    Body of a worker process, answers expressions until its pipe closes
+    """
+    try:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (WORKER_MEMORY_BYTES, WORKER_MEMORY_BYTES))
+    except (ImportError, ValueError, OSError):
+        # not limitable on this platform
+        pass
+    # the slow part of starting, done before the worker reports ready
+    import sympy.parsing.sympy_parser
+    conn.send(None)
+
+    while True:
+        try:
+            expression = conn.recv()
+        except EOFError:
+            return
+        try:
+            result = (True, _evaluate(expression))
+        except MemoryError:
+            result = (False, "The expression needs too much memory.")
+        except Exception as e:
+            result = (False, f"{type(e).__name__}: {e}")
+        conn.send(result)
+
+class _Worker:
+    """
+    One worker process and the pipe to it, used from one thread at a time
+    """
+    def __init__(self, context: Any) -> None:
+        self._conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child,), name="mallard-math", daemon=True)
+        self.process.start()
+        child.close()
+        self.ready = False
+
+    def wait_ready(self) -> None:
+        if not self.ready:
+            if not self._conn.poll(STARTUP_TIMEOUT):
+                raise MathError("The math workers didn't start in time.")
+            self._conn.recv()
+            self.ready = True
+
+    def evaluate(self, expression: str, timeout: float) -> Tuple[bool, str]:
+        self.wait_ready()
+        self._conn.send(expression)
+        if not self._conn.poll(timeout):
+            raise TimeoutError
+        return self._conn.recv()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self._conn.close()
+
+class MathEvaluator:
+    """
+    Pool of sympy worker processes with memoized results
+    """
+    def __init__(self, workers: int = 2, timeout: float = EVALUATION_TIMEOUT, cacheSize: int = 1024) -> None:
+        """
+        :param workers: Worker processes, also the most evaluations running at once
+        :param timeout: Seconds an evaluation may take before its worker is killed
+        :param cacheSize: Results kept
+        :return: None
+        """
+        # spawned rather than forked, replacements are started while the bot's threads run
+        self._context = multiprocessing.get_context("spawn")
+        self.timeout = timeout
+        self.results = LRUCache(cacheSize)
+        self._workers = max(1, workers)
+        self._idle: Optional["asyncio.Queue[_Worker]"] = None
+        self._all: Dict[int, _Worker] = dict()
+        # blocking pipe waits happen here, one thread per worker
+        self._threads = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="mallard-math")
+        # evaluations in flight, identical requests wait on the same one
+        self._pending: Dict[str, "asyncio.Future[Tuple[bool, str]]"] = dict()
+        self.timeouts = 0
+
+    def warm(self) -> None:
+        """
+        Start every worker, they import sympy in the background while the bot starts
+        :return: None
+        """
+        for _ in range(self._workers - len(self._all)):
+            worker = _Worker(self._context)
+            self._all[id(worker)] = worker
+
+    def _get_idle(self) -> "asyncio.Queue[_Worker]":
+        if self._idle is None:
+            self.warm()
+            self._idle = asyncio.Queue()
+            for worker in self._all.values():
+                self._idle.put_nowait(worker)
+        return self._idle
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.kill()
+        del self._all[id(worker)]
+        worker = _Worker(self._context)
+        self._all[id(worker)] = worker
+        return worker
+
+    async def _run(self, expression: str) -> Tuple[bool, str]:
+        idle = self._get_idle()
+        worker = await idle.get()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._threads, worker.evaluate, expression, self.timeout)
+        except TimeoutError:
+            self.timeouts += 1
+            # the worker may be stuck in C code that no signal interrupts, only killing it is certain
+            worker = self._replace(worker)
+            return False, f"The evaluation took longer than {self.timeout:g} seconds."
+        except (EOFError, OSError):
+            # the worker died, most likely over its memory limit
+            worker = self._replace(worker)
+            raise MathError("The evaluation crashed its worker, try something smaller.")
+        finally:
+            idle.put_nowait(worker)
+
+    async def evaluate(self, expression: str) -> str:
+        """
+        Evaluate an expression, answered from the cache when it was seen before
+        :param expression: Expression or equation as typed by the user
+        :return: The result as text
+        :raises MathError: When the expression is rejected, fails or times out
+        """
+        key = normalize(expression)
+        validate(key)
+
+        result = self.results.get(key)
+        if result is None:
+            pending = self._pending.get(key)
+            if pending is not None:
+                result = await asyncio.shield(pending)
+            else:
+                future = self._pending[key] = asyncio.get_running_loop().create_future()
+                try:
+                    result = await self._run(key)
+                    # failures and timeouts are cached too, the same expression would only fail again
+                    self.results.set(key, result)
+                    future.set_result(result)
+                except BaseException as e:
+                    future.set_exception(e)
+                    # consumed here so an unawaited failure isn't reported
+                    future.exception()
+                    raise
+                finally:
+                    del self._pending[key]
+
+        succeeded, text = result
+        if not succeeded:
+            raise MathError(text)
+        return text if len(text) <= MAX_RESULT_LENGTH else text[:MAX_RESULT_LENGTH] + "…"
+
+    def metrics(self) -> Dict[str, int]:
+        return {"hits": self.results.hits, "misses": self.results.misses, "results": len(self.results),
+                "timeouts": self.timeouts}
+
+    def close(self) -> None:
+        """
+        Stop the worker processes
+        :return: None
+        """
+        for worker in self._all.values():
+            worker.kill()
+        self._all.clear()
+        self._threads.shutdown(wait=False, cancel_futures=True)
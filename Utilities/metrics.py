@@ -0,0 +1,242 @@
+"""
+Per-command latency instrumentation and Prometheus text export
+Each command invocation runs with its own phase totals in a context variable,
+DB and REST time is added to them as it happens and CPU is what's left over.
+"""
+
+import asyncio
+import functools
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from os import replace
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+PHASES = ("db", "rest", "cpu")
+# latency buckets in seconds, upper bounds as Prometheus expects
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# phase -> seconds for the invocation running in the current context, None outside one
+_currentPhases: ContextVar[Optional[Dict[str, float]]] = ContextVar("mallard_phases", default=None)
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Count the time spent inside the block towards a phase of the current invocation.
+    Does nothing when no instrumented command is running.
+    :param name: "db" or "rest"
+    """
+    phases = _currentPhases.get()
+    if phases is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0) + perf_counter() - start
+
+class Histogram:
+    """
+    Cumulative-bucket latency histogram
+    """
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile as the upper bound of the bucket it falls in
+        :param q: Quantile between 0 and 1
+        :return: Latency in seconds
+        """
+        if not self.count:
+            return 0
+        target = q * self.count
+        seen = 0
+        for i, amount in enumerate(self.counts):
+            seen += amount
+            if seen >= target:
+                return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+        return float("inf")
+
+class BotMetrics:
+    """
+    Latency histograms per command and phase, plus counters and gauges read on export
+    """
+    def __init__(self) -> None:
+        # (command, phase) -> histogram, phase "total" is the whole invocation
+        self.histograms: Dict[Tuple[str, str], Histogram] = dict()
+        self.errors: Dict[str, int] = dict()
+        # name -> callable returning {label value: number}, read when exporting
+        self._collectors: Dict[str, Tuple[str, Callable[[], Dict[str, float]]]] = dict()
+
+    def _histogram(self, command: str, phaseName: str) -> Histogram:
+        histogram = self.histograms.get((command, phaseName))
+        if histogram is None:
+            histogram = self.histograms[(command, phaseName)] = Histogram()
+        return histogram
+
+    def record(self, command: str, total: float, phases: Dict[str, float]) -> None:
+        """
+        Record a finished invocation
+        :param command: Name of the command or callback
+        :param total: Wall time of the invocation in seconds
+        :param phases: Seconds spent in the db and rest phases
+        :return: None
+        """
+        db, rest = phases.get("db", 0), phases.get("rest", 0)
+        self._histogram(command, "total").observe(total)
+        self._histogram(command, "db").observe(db)
+        self._histogram(command, "rest").observe(rest)
+        self._histogram(command, "cpu").observe(max(0, total - db - rest))
+
+    def add_collector(self, name: str, label: str, collect: Callable[[], Dict[str, float]]) -> None:
+        """
+        Register a gauge or counter family read on every export
+        :param name: Metric name without the mallard_ prefix
+        :param label: Label name the collected keys are exported under
+        :param collect: Returns label value -> number
+        :return: None
+        """
+        self._collectors[name] = (label, collect)
+
+    def instrument(self, name: str, callback: Callable) -> Callable:
+        """
+        Wrap a command or component callback to record its latency
+        :param name: Name recorded for the callback
+        :param callback: The coroutine function to wrap
+        :return: The wrapped callback
+        """
+        if getattr(callback, "__instrumented__", False):
+            return callback
+
+        @functools.wraps(callback)
+        async def instrumented(*args, **kwargs) -> Any:
+            phases: Dict[str, float] = dict()
+            token = _currentPhases.set(phases)
+            start = perf_counter()
+            try:
+                return await callback(*args, **kwargs)
+            except Exception:
+                self.errors[name] = self.errors.get(name, 0) + 1
+                raise
+            finally:
+                _currentPhases.reset(token)
+                self.record(name, perf_counter() - start, phases)
+
+        instrumented.__instrumented__ = True
+        return instrumented
+
+    def instrument_extension(self, extension: Any) -> None:
+        """
+        Wrap every slash command and component callback of an extension
+        :param extension: A loaded extension
+        :return: None
+        """
+        for command in getattr(extension, "_commands", []):
+            callback = getattr(command, "callback", None)
+            if callback is None:
+                continue
+            # interactions binds callbacks to their extension with functools.partial, which has no __name__
+            name = getattr(callback, "func", callback).__name__
+            command.callback = self.instrument(f"{type(extension).__name__}.{name}", callback)
+
+    def instrument_http(self, client: Any) -> None:
+        """
+        Count every Discord REST request towards the rest phase
+        :param client: The interactions client
+        :return: None
+        """
+        http = getattr(client, "http", None)
+        request = getattr(http, "request", None)
+        if request is None or getattr(request, "__instrumented__", False):
+            return
+
+        @functools.wraps(request)
+        async def timed_request(*args, **kwargs) -> Any:
+            with phase("rest"):
+                return await request(*args, **kwargs)
+
+        timed_request.__instrumented__ = True
+        http.request = timed_request
+
+    def render_prometheus(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format
+        :return: The metrics text
+        """
+        lines: List[str] = [
+            "# HELP mallard_command_seconds Command latency split by phase",
+            "# TYPE mallard_command_seconds histogram",
+        ]
+        for (command, phaseName), histogram in sorted(self.histograms.items()):
+            labels = f'command="{command}",phase="{phaseName}"'
+            cumulative = 0
+            for bound, amount in zip(BUCKETS, histogram.counts):
+                cumulative += amount
+                lines.append(f'mallard_command_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'mallard_command_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"mallard_command_seconds_sum{{{labels}}} {histogram.total}")
+            lines.append(f"mallard_command_seconds_count{{{labels}}} {histogram.count}")
+
+        lines.append("# TYPE mallard_command_errors_total counter")
+        for command, amount in sorted(self.errors.items()):
+            lines.append(f'mallard_command_errors_total{{command="{command}"}} {amount}')
+
+        for name, (label, collect) in sorted(self._collectors.items()):
+            lines.append(f"# TYPE mallard_{name} gauge")
+            for key, value in sorted(collect().items()):
+                lines.append(f'mallard_{name}{{{label}="{key}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path: str) -> None:
+        """
+        Write the metrics text to a file, for node exporter's textfile collector
+        :param path: Destination path, replaced atomically
+        :return: None
+        """
+        temporary = path + ".tmp"
+        with open(temporary, "w") as fp:
+            fp.write(self.render_prometheus())
+        replace(temporary, path)
+
+    async def export_file(self, path: str, interval: float = 15) -> None:
+        """
+        Keep rewriting the metrics file
+        :param path: Destination path
+        :param interval: Seconds between writes
+        :return: None
+        """
+        while True:
+            self.write_file(path)
+            await asyncio.sleep(interval)
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 9464) -> asyncio.AbstractServer:
+        """
+        Serve the metrics text over HTTP on a local socket for a Prometheus scraper
+        :param host: Interface to listen on
+        :param port: Port to listen on
+        :return: The running server
+        """
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            try:
+                await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                pass
+            body = self.render_prometheus().encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                         + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+            writer.close()
+
+        return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,62 @@
+"""
+Versioned schema migrations
+Migration files are named NNNN_description.sql and applied in order. The
+number of the newest applied migration is kept in PRAGMA user_version.
+"""
+
+from os import scandir
+from sqlite3 import Connection
+from typing import List, Tuple
+
+MIGRATIONS_PATH = "./DatabaseQueries/Migrations"
+
+def get_migrations(directory: str = MIGRATIONS_PATH) -> List[Tuple[int, str]]:
+    """
+    Find every migration file
+    :param directory: Directory holding the migrations
+    :return: List of (version, path) sorted by version
+    """
+    migrations: List[Tuple[int, str]] = list()
+    for file in scandir(directory):
+        if file.is_file() and file.name.endswith(".sql"):
+            version, _, _ = file.name.partition("_")
+            if not version.isdigit():
+                raise ValueError(f"Migration {file.name} doesn't start with a version number")
+            migrations.append((int(version), file.path))
+    migrations.sort()
+
+    versions = [version for version, _ in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+def get_schema_version(conn: Connection) -> int:
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+def migrate(conn: Connection, directory: str = MIGRATIONS_PATH) -> List[int]:
+    """
+    Apply every migration newer than the database's schema version, all in one
+    transaction. A failing migration rolls back the whole run and is raised.
+    :param conn: Connection to the database
+    :param directory: Directory holding the migrations
+    :return: Versions that were applied, empty when the schema was current
+    """
+    current = get_schema_version(conn)
+    pending = [(version, path) for version, path in get_migrations(directory) if version > current]
+    if not pending:
+        return []
+
+    scripts: List[str] = list()
+    for version, path in pending:
+        with open(path, "r") as fp:
+            scripts.append(fp.read())
+
+    # user_version is transactional, it only moves if every migration succeeded
+    script = "BEGIN;\n" + "\n;\n".join(scripts) + f"\n;\nPRAGMA user_version = {pending[-1][0]};\nCOMMIT;"
+    try:
+        conn.executescript(script)
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    return [version for version, _ in pending]
@@ -0,0 +1,108 @@
+"""
+Per-guild cache of resolved user permissions
+Kept current by gateway events instead of re-fetching owners and members.
+"""
+
+from typing import Dict, Iterable, Optional
+from interactions import Permissions
+
+class GuildPermissions:
+    """
+    Permission data for a single guild
+    """
+    __slots__ = ("ownerId", "roleBits", "adminMask", "members")
+
+    def __init__(self, ownerId: int) -> None:
+        """
+        :param ownerId: User ID of the guild owner
+        :return: None
+        """
+        self.ownerId = ownerId
+        # every role gets a bit, adminMask has the bits of roles granting administrator
+        self.roleBits: Dict[int, int] = dict()
+        self.adminMask = 0
+        # user ID -> resolved UserType value
+        self.members: Dict[int, int] = dict()
+
+    def set_roles(self, roles: Iterable) -> None:
+        """
+        Rebuild the role bit assignment and admin mask
+        :param roles: Roles of the guild
+        :return: None
+        """
+        self.roleBits = dict()
+        self.adminMask = 0
+        for role in roles:
+            bit = 1 << len(self.roleBits)
+            self.roleBits[int(role.id)] = bit
+            if (role.permissions & Permissions.ADMINISTRATOR) == Permissions.ADMINISTRATOR:
+                self.adminMask |= bit
+
+    def role_mask(self, roleIds: Iterable[int]) -> int:
+        """
+        Combine a member's roles into one bitmask
+        :param roleIds: IDs of the member's roles
+        :return: Bitmask of known roles
+        """
+        mask = 0
+        for roleId in roleIds:
+            mask |= self.roleBits.get(int(roleId), 0)
+        return mask
+
+    def is_admin(self, roleIds: Iterable[int]) -> bool:
+        return bool(self.role_mask(roleIds) & self.adminMask)
+
+class PermissionCache:
+    """
+    Resolved permissions for every guild the bot has seen
+    """
+    def __init__(self) -> None:
+        self._guilds: Dict[int, GuildPermissions] = dict()
+
+    def get_guild(self, guildId: int) -> Optional[GuildPermissions]:
+        return self._guilds.get(guildId)
+
+    def set_guild(self, guildId: int, ownerId: int, roles: Iterable) -> GuildPermissions:
+        """
+        Store a guild's owner and roles
+        :param guildId: ID of the guild
+        :param ownerId: User ID of the guild owner
+        :param roles: Roles of the guild
+        :return: The stored guild permissions
+        """
+        guild = GuildPermissions(int(ownerId))
+        guild.set_roles(roles)
+        self._guilds[guildId] = guild
+        return guild
+
+    def get_member(self, guildId: int, userId: int) -> Optional[int]:
+        """
+        Look up a resolved member permission level
+        :param guildId: ID of the guild
+        :param userId: ID of the user
+        :return: UserType value or None if not resolved
+        """
+        guild = self._guilds.get(guildId)
+        return guild.members.get(userId) if guild else None
+
+    def set_member(self, guildId: int, userId: int, perms: int) -> None:
+        guild = self._guilds.get(guildId)
+        if guild:
+            guild.members[userId] = perms
+
+    def invalidate_member(self, guildId: int, userId: int) -> None:
+        """
+        Forget a member's resolved level, for when their roles change
+        """
+        guild = self._guilds.get(guildId)
+        if guild:
+            guild.members.pop(userId, None)
+
+    def invalidate_guild(self, guildId: int) -> None:
+        """
+        Forget everything about a guild, for when its roles or owner change
+        """
+        self._guilds.pop(guildId, None)
+
+    def __len__(self) -> int:
+        return len(self._guilds)
@@ -0,0 +1,89 @@
+"""
+Registry of named, parameterized SQL statements
+The text of every statement is constant, so sqlite3's per-connection
+statement cache prepares each one once and reuses it on every call.
+"""
+
+from typing import Dict
+
+# default amount of prepared statements each connection keeps around
+STATEMENT_CACHE_SIZE = 128
+
+QUERIES: Dict[str, str] = {
+    "get_user": "SELECT * FROM users WHERE user_id = ?;",
+    "get_guild_user": "SELECT * FROM guild_users WHERE guild_id = ? AND user_id = ?;",
+    "get_guild": "SELECT * FROM guilds WHERE guild_id = ?;",
+    "get_guild_user_permissions": "SELECT permissions FROM guild_users WHERE guild_id = ? AND user_id = ?;",
+    "get_assignable_guild_roles": "SELECT role_id, role_name, descr FROM role_reactions WHERE guild_id = ?;",
+    "get_all_assignable_roles": "SELECT guild_id, role_id, role_name, descr FROM role_reactions;",
+    "get_all_guild_ids": "SELECT guild_id FROM guilds;",
+    "get_all_user_ids": "SELECT user_id FROM users;",
+    "get_all_guild_user_ids": "SELECT guild_id, user_id FROM guild_users;",
+    "get_all_guild_user_xp": "SELECT guild_id, user_id, xp FROM guild_users;",
+    "get_user_currency": "SELECT currency FROM users WHERE user_id = ?;",
+    "get_ledger_balances": "SELECT user_id, SUM(amount) FROM currency_ledger GROUP BY user_id;",
+    # users with ledger entries after an entry, to sum again after an import opened their balances
+    "get_last_ledger_entry": "SELECT MAX(entry_id) FROM currency_ledger;",
+    "get_ledger_users_since": "SELECT user_id FROM currency_ledger WHERE entry_id > ?;",
+    "get_ledger_balances_since":
+        "SELECT user_id, SUM(amount) FROM currency_ledger "
+        "WHERE user_id IN (SELECT user_id FROM currency_ledger WHERE entry_id > ?) GROUP BY user_id;",
+    "get_currency_history":
+        "SELECT amount, reason, counterparty, created_at FROM currency_ledger "
+        "WHERE user_id = ? ORDER BY entry_id DESC LIMIT ?;",
+    "get_guild_leaderboard": "SELECT user_id, xp FROM guild_users WHERE guild_id = ? ORDER BY xp DESC;",
+    "add_user": "INSERT OR IGNORE INTO users(user_id) VALUES(?);",
+    "add_guild_user": "INSERT OR IGNORE INTO guild_users(user_id, guild_id, permissions) VALUES(?, ?, ?);",
+    "set_guild_user_permissions": "UPDATE guild_users SET permissions = ? WHERE guild_id = ? AND user_id = ?;",
+    "add_guild": "INSERT OR IGNORE INTO guilds(guild_id) VALUES(?);",
+    "add_assignable_guild_role":
+        "INSERT OR REPLACE INTO role_reactions(role_id, guild_id, role_name, descr) VALUES(?, ?, ?, ?);",
+    # update only, rows are created by setup_user with derived permissions, numbered so it binds (guild, user, ...)
+    "save_guild_user_xp":
+        "UPDATE guild_users SET xp = ?3, xp_needed = ?4, guild_level = ?5 WHERE guild_id = ?1 AND user_id = ?2;",
+    "add_ledger_entry":
+        "INSERT INTO currency_ledger(user_id, amount, reason, counterparty, created_at) VALUES(?, ?, ?, ?, ?);",
+    # users.currency mirrors the ledger so the balance can still be read straight from the table
+    "set_user_currency":
+        "INSERT INTO users(user_id, currency) VALUES(?, ?) "
+        "ON CONFLICT(user_id) DO UPDATE SET currency = excluded.currency;",
+    # guild exports, each walked in primary key order so a cursor streams them in chunks
+    "export_guild_guilds": "SELECT guild_id FROM guilds WHERE guild_id = ?;",
+    "export_guild_users":
+        "SELECT users.user_id, users.currency FROM guild_users JOIN users ON users.user_id = guild_users.user_id "
+        "WHERE guild_users.guild_id = ? ORDER BY guild_users.user_id;",
+    "export_guild_guild_users":
+        "SELECT guild_id, user_id, xp, xp_needed, guild_level, permissions FROM guild_users "
+        "WHERE guild_id = ? ORDER BY user_id;",
+    "export_guild_role_reactions":
+        "SELECT role_id, guild_id, role_name, descr FROM role_reactions WHERE guild_id = ? ORDER BY role_id;",
+    # imported users never overwrite a balance the ledger already holds
+    "import_user": "INSERT INTO users(user_id, currency) VALUES(?, ?) ON CONFLICT(user_id) DO NOTHING;",
+    "import_user_balance":
+        "INSERT INTO currency_ledger(user_id, amount, reason, created_at) SELECT ?, ?, 'imported balance', ? "
+        "WHERE NOT EXISTS (SELECT 1 FROM users WHERE user_id = ?);",
+    "import_guild_user":
+        "INSERT OR REPLACE INTO guild_users(guild_id, user_id, xp, xp_needed, guild_level, permissions) "
+        "VALUES(?, ?, ?, ?, ?, ?);",
+}
+
+# bulk loads read whole tables on purpose, every other query has to use an index
+FULL_SCAN_QUERIES = frozenset((
+    "get_all_assignable_roles",
+    "get_all_guild_ids",
+    "get_all_user_ids",
+    "get_all_guild_user_ids",
+    "get_all_guild_user_xp",
+    "get_ledger_balances",
+))
+
+# queries allowed to sort their rows through a temporary B-tree, everything else reads in index order
+TEMP_SORT_QUERIES = frozenset()
+
+def query(name: str) -> str:
+    """
+    Look up a registered statement
+    :param name: Name of the statement
+    :return: SQL text of the statement
+    """
+    return QUERIES[name]
@@ -0,0 +1,72 @@
+"""
+EXPLAIN QUERY PLAN regression check for the registered BotSQL statements
+Run from the repository root: python -m Utilities.query_plan
+Exits non-zero when a statement falls back to scanning a table or a whole index, or sorts through
+a temporary B-tree without being listed as allowed to.
+"""
+
+import sqlite3
+import sys
+from typing import Dict, List
+from Utilities.migrations import migrate
+from Utilities.queries import QUERIES, FULL_SCAN_QUERIES, TEMP_SORT_QUERIES
+
+def explain(conn: sqlite3.Connection, queryString: str) -> List[str]:
+    """
+    Get the query plan of a statement
+    :param conn: Connection to a migrated database
+    :param queryString: SQL text with ? placeholders
+    :return: Detail line of every plan step
+    """
+    params = (0,) * queryString.count("?")
+    return [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + queryString, params).fetchall()]
+
+def find_table_scans(conn: sqlite3.Connection) -> Dict[str, List[str]]:
+    """
+    Find registered statements whose plans scan a table or a whole index instead of searching one
+    :param conn: Connection to a migrated database
+    :return: Statement name -> offending plan steps
+    """
+    scans: Dict[str, List[str]] = dict()
+    for name, queryString in QUERIES.items():
+        if name in FULL_SCAN_QUERIES:
+            continue
+        # a scan over a covering index still reads every entry, only a constant row reads nothing
+        steps = [step for step in explain(conn, queryString)
+                 if step.startswith("SCAN") and step != "SCAN CONSTANT ROW"]
+        if steps:
+            scans[name] = steps
+    return scans
+
+def find_temp_sorts(conn: sqlite3.Connection) -> Dict[str, List[str]]:
+    """
+    Find registered statements whose ORDER BY, GROUP BY or DISTINCT sorts through a temporary B-tree
+    :param conn: Connection to a migrated database
+    :return: Statement name -> offending plan steps
+    """
+    sorts: Dict[str, List[str]] = dict()
+    for name, queryString in QUERIES.items():
+        if name in TEMP_SORT_QUERIES:
+            continue
+        steps = [step for step in explain(conn, queryString) if "USE TEMP B-TREE" in step]
+        if steps:
+            sorts[name] = steps
+    return sorts
+
+def main() -> int:
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    for name, queryString in QUERIES.items():
+        print(f"{name}: {'; '.join(explain(conn, queryString)) or 'no table access'}")
+
+    scans = find_table_scans(conn)
+    for name, steps in scans.items():
+        print(f"FAIL {name} scans a table: {'; '.join(steps)}")
+    sorts = find_temp_sorts(conn)
+    for name, steps in sorts.items():
+        print(f"FAIL {name} sorts through a temporary B-tree: {'; '.join(steps)}")
+    conn.close()
+    return 1 if scans or sorts else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
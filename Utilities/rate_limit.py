@@ -0,0 +1,238 @@
+"""
+Token bucket and sliding window rate limits
+Every update is O(1), limits can be scoped to a user, guild, command or the whole bot.
+"""
+
+from math import ceil
+from time import monotonic
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from Utilities.enums import CommandEnums, RateLimitScope, RateLimitType
+
+class RateLimitPolicy:
+    """
+    A single limit: at most `limit` uses every `period` seconds
+    """
+    __slots__ = ("kind", "scope", "limit", "period")
+
+    def __init__(self, kind: RateLimitType, scope: RateLimitScope, limit: int, period: float) -> None:
+        """
+        :param kind: Algorithm enforcing the limit
+        :param scope: Who shares the limit
+        :param limit: Uses allowed per period, also the burst size of a token bucket
+        :param period: Length of the period in seconds
+        :return: None
+        """
+        self.kind = kind
+        self.scope = scope
+        self.limit = limit
+        self.period = period
+
+class TokenBucket:
+    """
+    Holds up to `limit` tokens, refilled continuously at limit / period per second
+    """
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, policy: RateLimitPolicy, now: float) -> None:
+        self.tokens = float(policy.limit)
+        self.updated = now
+
+    def _refill(self, policy: RateLimitPolicy, now: float) -> None:
+        self.tokens = min(policy.limit, self.tokens + (now - self.updated) * policy.limit / policy.period)
+        self.updated = now
+
+    def retry_after(self, policy: RateLimitPolicy, now: float) -> float:
+        """
+        :return: Seconds until a token is available, 0 if one is available now
+        """
+        self._refill(policy, now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) * policy.period / policy.limit
+
+    def consume(self, policy: RateLimitPolicy, now: float) -> None:
+        self._refill(policy, now)
+        self.tokens -= 1
+
+    def idle(self, policy: RateLimitPolicy, now: float) -> bool:
+        """
+        :return: Whether the bucket is full again and can be dropped
+        """
+        return self.tokens + (now - self.updated) * policy.limit / policy.period >= policy.limit
+
+class SlidingWindowCounter:
+    """
+    Approximates a sliding window from the counts of the current and previous fixed windows
+    """
+    __slots__ = ("windowStart", "current", "previous")
+
+    def __init__(self, policy: RateLimitPolicy, now: float) -> None:
+        self.windowStart = now
+        self.current = 0
+        self.previous = 0
+
+    def _advance(self, policy: RateLimitPolicy, now: float) -> None:
+        elapsed = now - self.windowStart
+        if elapsed < policy.period:
+            return
+        # a gap of two or more windows means nothing recent is left
+        self.previous = self.current if elapsed < 2 * policy.period else 0
+        self.current = 0
+        self.windowStart += (elapsed // policy.period) * policy.period
+
+    def _estimate(self, policy: RateLimitPolicy, now: float) -> float:
+        weight = 1 - (now - self.windowStart) / policy.period
+        return self.previous * weight + self.current
+
+    def retry_after(self, policy: RateLimitPolicy, now: float) -> float:
+        """
+        :return: Seconds until a use is allowed, 0 if one is allowed now
+        """
+        self._advance(policy, now)
+        if self._estimate(policy, now) + 1 <= policy.limit:
+            return 0
+        if self.previous and self.current + 1 <= policy.limit:
+            # the previous window's weight has to shrink enough for one more use
+            weightNeeded = (policy.limit - 1 - self.current) / self.previous
+            return max(0, (1 - weightNeeded) * policy.period - (now - self.windowStart))
+        # the current window is full, once it rolls its count is the previous one and has to shrink the same way
+        untilRoll = self.windowStart + policy.period - now
+        weightNeeded = (policy.limit - 1) / self.current
+        return untilRoll + max(0, 1 - weightNeeded) * policy.period
+
+    def consume(self, policy: RateLimitPolicy, now: float) -> None:
+        self._advance(policy, now)
+        self.current += 1
+
+    def idle(self, policy: RateLimitPolicy, now: float) -> bool:
+        return now - self.windowStart >= 2 * policy.period
+
+Limiter = Union[TokenBucket, SlidingWindowCounter]
+
+_LIMITERS = {
+    RateLimitType.TOKEN_BUCKET: TokenBucket,
+    RateLimitType.SLIDING_WINDOW: SlidingWindowCounter,
+}
+
+# limits shared by every command
+GLOBAL_RATE_LIMITS: List[RateLimitPolicy] = [
+    RateLimitPolicy(RateLimitType.SLIDING_WINDOW, RateLimitScope.GLOBAL, 300, 10),
+]
+
+# per command limits, bursts are allowed instead of a flat lockout after every use
+DEFAULT_RATE_LIMITS: Dict[CommandEnums, List[RateLimitPolicy]] = {
+    CommandEnums.PICK_ROLE: [
+        RateLimitPolicy(RateLimitType.TOKEN_BUCKET, RateLimitScope.USER, 3, 15),
+        RateLimitPolicy(RateLimitType.SLIDING_WINDOW, RateLimitScope.GUILD, 30, 10),
+    ],
+    CommandEnums.ADD_ROLE: [
+        RateLimitPolicy(RateLimitType.TOKEN_BUCKET, RateLimitScope.USER, 5, 10),
+        RateLimitPolicy(RateLimitType.SLIDING_WINDOW, RateLimitScope.GUILD, 20, 60),
+    ],
+    CommandEnums.LEADERBOARD: [
+        RateLimitPolicy(RateLimitType.TOKEN_BUCKET, RateLimitScope.USER, 5, 15),
+    ],
+    CommandEnums.BALANCE: [
+        RateLimitPolicy(RateLimitType.TOKEN_BUCKET, RateLimitScope.USER, 5, 15),
+    ],
+    CommandEnums.PAY: [
+        RateLimitPolicy(RateLimitType.TOKEN_BUCKET, RateLimitScope.USER, 3, 30),
+    ],
+    CommandEnums.RANK: [
+        RateLimitPolicy(RateLimitType.TOKEN_BUCKET, RateLimitScope.USER, 3, 15),
+    ],
+    CommandEnums.PROFILE: [
+        RateLimitPolicy(RateLimitType.TOKEN_BUCKET, RateLimitScope.USER, 3, 15),
+    ],
+    CommandEnums.RELOAD: [
+        RateLimitPolicy(RateLimitType.SLIDING_WINDOW, RateLimitScope.COMMAND, 1, 10),
+    ],
+}
+
+class RateLimiter:
+    """
+    Applies the configured policies of a command, plus the global policies, to each use
+    """
+    def __init__(self, policies: Optional[Dict[CommandEnums, List[RateLimitPolicy]]] = None,
+    globalPolicies: Optional[Iterable[RateLimitPolicy]] = None, sweepEvery: int = 1024) -> None:
+        """
+        :param policies: Policies for each command, DEFAULT_RATE_LIMITS if not given
+        :param globalPolicies: Policies applied to every command, GLOBAL_RATE_LIMITS if not given
+        :param sweepEvery: Checks between sweeps dropping idle limiters
+        :return: None
+        """
+        self._policies: Dict[CommandEnums, List[RateLimitPolicy]] = dict(
+            DEFAULT_RATE_LIMITS if policies is None else policies)
+        self._globalPolicies = list(GLOBAL_RATE_LIMITS if globalPolicies is None else globalPolicies)
+        # (id of policy, scope id) -> limiter
+        self._limiters: Dict[Tuple[int, int], Limiter] = dict()
+        self._sweepEvery = sweepEvery
+        self._checks = 0
+        self.rejections = 0
+        self.rejectionsByCommand: Dict[str, int] = dict()
+
+    def set_policies(self, commandId: CommandEnums, policies: List[RateLimitPolicy]) -> None:
+        """
+        Replace the policies of a command
+        :param commandId: Command enumeration
+        :param policies: New policies, an empty list removes all limits
+        :return: None
+        """
+        self._policies[commandId] = list(policies)
+
+    def _scope_id(self, policy: RateLimitPolicy, userId: int, guildId: int) -> int:
+        if policy.scope == RateLimitScope.USER:
+            return userId
+        if policy.scope == RateLimitScope.GUILD:
+            return guildId
+        return 0
+
+    def _sweep(self, now: float) -> None:
+        """
+        Drop limiters that are back to their initial state
+        """
+        policies = {id(policy): policy for policy in self._globalPolicies}
+        for commandPolicies in self._policies.values():
+            policies.update((id(policy), policy) for policy in commandPolicies)
+        for key in [key for key, limiter in self._limiters.items()
+                    if key[0] not in policies or limiter.idle(policies[key[0]], now)]:
+            del self._limiters[key]
+
+    def check(self, commandId: CommandEnums, userId: Union[int, str],
+    guildId: Optional[Union[int, str]] = None) -> Optional[int]:
+        """
+        Count a use of a command if every limit allows it
+        :param commandId: Command enumeration
+        :param userId: User ID of the caller
+        :param guildId: Guild ID the command was used in
+        :return: Seconds to wait before retrying if limited, otherwise None
+        """
+        now = monotonic()
+        self._checks += 1
+        if self._checks % self._sweepEvery == 0:
+            self._sweep(now)
+
+        userId = int(userId)
+        guildId = int(guildId) if guildId else 0
+        applied: List[Tuple[RateLimitPolicy, Limiter]] = list()
+        wait = 0.0
+        for policy in self._policies.get(commandId, []) + self._globalPolicies:
+            key = (id(policy), self._scope_id(policy, userId, guildId))
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = self._limiters[key] = _LIMITERS[policy.kind](policy, now)
+            wait = max(wait, limiter.retry_after(policy, now))
+            applied.append((policy, limiter))
+
+        if wait > 0:
+            self.rejections += 1
+            self.rejectionsByCommand[commandId.name] = self.rejectionsByCommand.get(commandId.name, 0) + 1
+            return max(1, ceil(wait))
+
+        for policy, limiter in applied:
+            limiter.consume(policy, now)
+        return None
+
+    def __len__(self) -> int:
+        return len(self._limiters)
@@ -0,0 +1,110 @@
+"""
+Change tracking for command modules so reloads only touch what changed
+"""
+
+from hashlib import sha1
+from os import scandir
+from typing import Dict, List, Optional, Tuple
+
+class ModuleState:
+    """
+    What a command module's file looked like when it was last loaded
+    """
+    __slots__ = ("path", "mtime", "size", "digest")
+
+    def __init__(self, path: str, mtime: int, size: int, digest: Optional[str] = None) -> None:
+        """
+        :param path: Path of the module's file
+        :param mtime: Modification time in nanoseconds
+        :param size: File size in bytes
+        :param digest: Hash of the file contents, computed on demand
+        :return: None
+        """
+        self.path = path
+        self.mtime = mtime
+        self.size = size
+        self.digest = digest
+
+    def get_digest(self) -> str:
+        if self.digest is None:
+            with open(self.path, "rb") as fp:
+                self.digest = sha1(fp.read()).hexdigest()
+        return self.digest
+
+class ModuleChanges:
+    """
+    Result of comparing the command directory against the loaded modules
+    """
+    __slots__ = ("added", "changed", "removed")
+
+    def __init__(self) -> None:
+        self.added: List[Tuple[str, ModuleState]] = list()
+        self.changed: List[Tuple[str, ModuleState]] = list()
+        self.removed: List[str] = list()
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+class CommandTracker:
+    """
+    Remembers the mtime, size and content hash of every loaded command module.
+    Files are only read when their mtime or size moved, and a module whose
+    contents hash the same is not reported as changed.
+    """
+    def __init__(self, directory: str = "./Commands", package: str = "Commands") -> None:
+        """
+        :param directory: Directory holding the command modules
+        :param package: Package name the modules are imported under
+        :return: None
+        """
+        self.directory = directory
+        self.package = package
+        self._loaded: Dict[str, ModuleState] = dict()
+
+    def scan(self) -> Dict[str, ModuleState]:
+        """
+        Read the current state of every module file, without hashing
+        :return: Module name -> state
+        """
+        states: Dict[str, ModuleState] = dict()
+        for file in scandir(self.directory):
+            if file.is_file() and file.name.endswith(".py"):
+                stat = file.stat()
+                states[f"{self.package}.{file.name[:-3]}"] = ModuleState(file.path, stat.st_mtime_ns, stat.st_size)
+        return states
+
+    def changes(self) -> ModuleChanges:
+        """
+        Compare the command directory against the loaded modules
+        :return: Added, changed and removed modules
+        """
+        result = ModuleChanges()
+        current = self.scan()
+        for name, state in current.items():
+            loaded = self._loaded.get(name)
+            if loaded is None:
+                result.added.append((name, state))
+            elif loaded.mtime != state.mtime or loaded.size != state.size:
+                if loaded.size != state.size or loaded.get_digest() != state.get_digest():
+                    result.changed.append((name, state))
+                else:
+                    # touched but identical, just remember the new mtime
+                    loaded.mtime = state.mtime
+        result.removed = [name for name in self._loaded if name not in current]
+        return result
+
+    def mark_loaded(self, name: str, state: ModuleState) -> None:
+        """
+        Record the state a module was loaded from
+        :param name: Module name
+        :param state: State of its file at load time
+        :return: None
+        """
+        state.get_digest()
+        self._loaded[name] = state
+
+    def forget(self, name: str) -> None:
+        self._loaded.pop(name, None)
+
+    def loaded(self) -> List[str]:
+        return list(self._loaded)
@@ -0,0 +1,103 @@
+"""
+Single-flight Discord REST fetches
+Handlers of one guild asking for the same owner or member at once share a
+single request instead of each spending the REST rate limit, and the answer
+is reused for a few seconds after it arrives.
+"""
+
+import asyncio
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+# seconds a fetched owner or member is reused, gateway events drop it sooner when it changes
+REST_RESULT_TTL = 5.0
+
+# (endpoint, guild ID, member ID or None for guild level endpoints)
+RestKey = Tuple[str, int, Optional[int]]
+
+class RestCoalescer:
+    """
+    Shares in-flight and recent REST results between identical requests
+    """
+    def __init__(self, ttl: float = REST_RESULT_TTL, maxEntries: int = 10000) -> None:
+        """
+        :param ttl: Seconds a result is reused after it arrived, 0 only shares requests in flight
+        :param maxEntries: Most results kept at once
+        :return: None
+        """
+        self.ttl = ttl
+        self.maxEntries = maxEntries
+        # key -> (monotonic expiry, result), oldest first
+        self._results: "OrderedDict[RestKey, Tuple[float, Any]]" = OrderedDict()
+        self._pending: Dict[RestKey, "asyncio.Task[Any]"] = dict()
+        self._endpoints: Set[str] = set()
+        self.requests = 0
+        self.fetches = 0
+        self.coalesced = 0
+        self.cached = 0
+        self.failures = 0
+
+    async def fetch(self, endpoint: str, guildId: int, memberId: Optional[int],
+                    request: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run a REST request unless an identical one is in flight or was answered within the TTL
+        :param endpoint: Name of what's fetched, e.g. owner or member
+        :param guildId: Guild the request is for
+        :param memberId: Member the request is for, None for guild level endpoints
+        :param request: Makes the request, only called when nothing can be shared
+        :return: The request's result
+        """
+        key = (endpoint, int(guildId), None if memberId is None else int(memberId))
+        self.requests += 1
+
+        stored = self._results.get(key)
+        if stored is not None:
+            if stored[0] > monotonic():
+                self.cached += 1
+                return stored[1]
+            del self._results[key]
+
+        task = self._pending.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.fetches += 1
+            self._endpoints.add(endpoint)
+            # a task rather than the first caller's coroutine, so its cancellation doesn't fail the others
+            task = self._pending[key] = asyncio.ensure_future(request())
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: RestKey, task: "asyncio.Task[Any]") -> None:
+        # an invalidation while in flight already dropped the request, its answer may be stale
+        if self._pending.get(key) is not task:
+            return
+        del self._pending[key]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            # failures reach every waiter but aren't kept, the next request tries again
+            self.failures += 1
+            return
+        if self.ttl > 0:
+            self._results[key] = (monotonic() + self.ttl, task.result())
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxEntries:
+                self._results.popitem(last=False)
+
+    def invalidate(self, guildId: int, memberId: Optional[int] = None) -> None:
+        """
+        Forget everything fetched for a member, or for the guild itself when no member is given
+        :return: None
+        """
+        memberId = None if memberId is None else int(memberId)
+        for endpoint in self._endpoints:
+            key = (endpoint, int(guildId), memberId)
+            self._results.pop(key, None)
+            self._pending.pop(key, None)
+
+    def metrics(self) -> Dict[str, int]:
+        return {"requests": self.requests, "fetches": self.fetches, "coalesced": self.coalesced,
+                "cached": self.cached, "saved": self.coalesced + self.cached, "failures": self.failures,
+                "results": len(self._results), "in_flight": len(self._pending)}
@@ -0,0 +1,143 @@
+"""
+Bot-wide cache of each guild's self-assignable roles
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# (role_id, role_name, descr)
+RoleData = Tuple[int, str, str]
+
+class RoleCache:
+    """
+    LRU cache of assignable roles per guild, shared by every extension.
+    Filled in bulk on startup and kept current write-through, so it never goes stale.
+    """
+    def __init__(self, maxGuilds: int = 10000) -> None:
+        """
+        :param maxGuilds: Most guilds kept before the least recently used is evicted
+        :return: None
+        """
+        self.maxGuilds = maxGuilds
+        self._guilds: "OrderedDict[int, List[RoleData]]" = OrderedDict()
+        # values computed from a guild's roles, dropped whenever those roles change
+        self._derived: Dict[int, Dict[str, Any]] = dict()
+        # bumped by every write to a guild's roles, cached or not, so a read racing a write can tell
+        self._generations: Dict[int, int] = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, guildId: int) -> Optional[List[RoleData]]:
+        """
+        Look up a guild's roles
+        :param guildId: ID of the guild
+        :return: List of role data or None when the guild isn't cached
+        """
+        roles = self._guilds.get(guildId)
+        if roles is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._guilds.move_to_end(guildId)
+        return roles
+
+    def generation(self, guildId: int) -> int:
+        """
+        :return: Version of a guild's roles, taken before reading them from the database to set them
+        """
+        return self._generations.get(guildId, 0)
+
+    def _written(self, guildId: int) -> None:
+        self._generations[guildId] = self._generations.get(guildId, 0) + 1
+
+    def set(self, guildId: int, roles: Iterable[RoleData], generation: Optional[int] = None) -> bool:
+        """
+        Store all of a guild's roles
+        :param guildId: ID of the guild
+        :param roles: Every assignable role of the guild
+        :param generation: The guild's generation before the roles were read, they're dropped if it moved since
+        :return: Whether the roles were stored
+        """
+        if generation is not None and generation != self.generation(guildId):
+            # a write landed while these were read, they may be missing it
+            return False
+        self._guilds[guildId] = list(roles)
+        self._guilds.move_to_end(guildId)
+        self._derived.pop(guildId, None)
+        while len(self._guilds) > self.maxGuilds:
+            evicted, _ = self._guilds.popitem(last=False)
+            self._derived.pop(evicted, None)
+        return True
+
+    def load(self, rows: Iterable[Tuple[int, int, str, str]]) -> None:
+        """
+        Bulk load from (guild_id, role_id, role_name, descr) rows
+        :param rows: Rows of every guild's roles
+        :return: None
+        """
+        guilds: Dict[int, List[RoleData]] = dict()
+        for guildId, roleId, roleName, descr in rows:
+            guilds.setdefault(guildId, list()).append((roleId, roleName, descr))
+        for guildId, roles in guilds.items():
+            self.set(guildId, roles)
+
+    def put_role(self, guildId: int, role: RoleData) -> None:
+        """
+        Write through an added or replaced role. Guilds that aren't cached are
+        left alone, they're read in full on their next miss.
+        :param guildId: ID of the guild
+        :param role: The role's data
+        :return: None
+        """
+        self._written(guildId)
+        roles = self._guilds.get(guildId)
+        if roles is None:
+            return
+        # copy so lists handed out earlier don't change under their reader
+        roles = [cached for cached in roles if cached[0] != role[0]]
+        roles.append(role)
+        self._guilds[guildId] = roles
+        self._derived.pop(guildId, None)
+
+    def put_roles(self, guildId: int, roles: List[RoleData]) -> None:
+        """
+        Write through many added or replaced roles with one copy of the guild's list
+        :param guildId: ID of the guild
+        :param roles: Data of every role
+        :return: None
+        """
+        self._written(guildId)
+        cached = self._guilds.get(guildId)
+        if cached is None:
+            return
+        roleIds = {role[0] for role in roles}
+        self._guilds[guildId] = [role for role in cached if role[0] not in roleIds] + list(roles)
+        self._derived.pop(guildId, None)
+
+    def derived(self, guildId: int, name: str, builder: Callable[[List[RoleData]], Any]) -> Any:
+        """
+        Get a value computed from a guild's roles, building it once per change to them
+        :param guildId: ID of the guild
+        :param name: Name of the derived value
+        :param builder: Called with the guild's roles to compute the value
+        :return: The derived value or None when the guild isn't cached
+        """
+        roles = self._guilds.get(guildId)
+        if roles is None:
+            return None
+        derived = self._derived.setdefault(guildId, dict())
+        if name not in derived:
+            derived[name] = builder(roles)
+        return derived[name]
+
+    def invalidate(self, guildId: int) -> None:
+        self._written(guildId)
+        self._guilds.pop(guildId, None)
+        self._derived.pop(guildId, None)
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0
+
+    def __len__(self) -> int:
+        return len(self._guilds)
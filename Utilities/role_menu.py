@@ -0,0 +1,82 @@
+"""
+Precomputed, paginated select menu options for a guild's assignable roles
+"""
+
+from bisect import bisect_left
+from typing import AbstractSet, Dict, Iterable, List, Optional, Tuple
+from interactions import StringSelectOption
+
+# Discord caps select menus at 25 options
+PAGE_SIZE = 25
+
+# (role_id, role_name, descr)
+RoleData = Tuple[int, str, str]
+
+def _page_count(roleCount: int) -> int:
+    return max(1, -(-roleCount // PAGE_SIZE))
+
+class RoleMenuPages:
+    """
+    Select options for every role of a guild, built once per change of the
+    guild's roles. Roles are sorted by name so prefix searches are a bisect.
+    """
+    __slots__ = ("roles", "byId", "names", "options")
+
+    def __init__(self, roles: Iterable[RoleData]) -> None:
+        """
+        :param roles: Every assignable role of the guild
+        :return: None
+        """
+        self.roles: List[RoleData] = sorted(roles, key=lambda role: role[1].lower())
+        self.byId: Dict[int, RoleData] = {role[0]: role for role in self.roles}
+        self.names: List[str] = [role[1].lower() for role in self.roles]
+        self.options: List[Tuple[int, StringSelectOption]] = [
+            (roleId, StringSelectOption(label=roleName, value=str(roleId), description=descr[:100] if descr else None))
+            for roleId, roleName, descr in self.roles
+        ]
+
+    def _search_range(self, prefix: Optional[str]) -> Tuple[int, int]:
+        """
+        Find the slice of roles whose names start with prefix
+        :param prefix: Case insensitive name prefix or None for every role
+        :return: Start and end index into the sorted roles
+        """
+        if not prefix:
+            return 0, len(self.options)
+        prefix = prefix.lower()
+        start = bisect_left(self.names, prefix)
+        # every name starting with prefix sorts before prefix followed by the highest code point
+        end = bisect_left(self.names, prefix + "\U0010ffff", start)
+        return start, end
+
+    def page_count(self, prefix: Optional[str] = None) -> int:
+        start, end = self._search_range(prefix)
+        return _page_count(end - start)
+
+    def page(self, page: int, heldRoleIds: AbstractSet[int],
+    prefix: Optional[str] = None) -> Tuple[int, List[StringSelectOption]]:
+        """
+        Options of a page minus the roles a member already has. When every role
+        on the page is held the following pages are tried.
+        :param page: Index of the requested page
+        :param heldRoleIds: IDs of the roles the member has
+        :param prefix: Only include roles whose names start with this
+        :return: Index of the page returned and its options, empty when nothing is left
+        """
+        start, end = self._search_range(prefix)
+        pageCount = _page_count(end - start)
+        page = min(max(page, 0), pageCount - 1)
+        for current in range(page, pageCount):
+            pageStart = start + current * PAGE_SIZE
+            options = [option for roleId, option in self.options[pageStart:min(pageStart + PAGE_SIZE, end)]
+                       if roleId not in heldRoleIds]
+            if options:
+                return current, options
+        # nothing after the requested page, look back before giving up
+        for current in range(page - 1, -1, -1):
+            pageStart = start + current * PAGE_SIZE
+            options = [option for roleId, option in self.options[pageStart:pageStart + PAGE_SIZE]
+                       if roleId not in heldRoleIds]
+            if options:
+                return current, options
+        return page, []
@@ -0,0 +1,362 @@
+"""
+Multi-process sharded deployment
+Every worker process runs its own client and Bot for one gateway shard. One
+writer process owns the only writable database connection, workers read
+through their own read-only connections and send writes to it over a queue.
+Changes to state other workers cache are broadcast as small messages.
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import pickle
+import signal
+import sqlite3
+import threading
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from Utilities.db_executor import DatabaseExecutor, Notify, _FLUSH
+from Utilities.migrations import migrate
+from Utilities.queries import STATEMENT_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# seconds workers get to close after the writer process is gone, they're terminated afterwards
+WORKER_STOP_TIMEOUT = 10.0
+
+# write requests are (worker, request id or None, callable or None for a flush, args)
+WriteRequest = Tuple[int, Optional[int], Optional[Callable], Tuple]
+# replies are (request id, result, error, writer flush metrics or None),
+# a request id of None tells a worker the writer process is gone and error is why
+WriteReply = Tuple[Optional[int], Any, Optional[BaseException], Optional[Dict[str, float]]]
+
+def _sendable(error: Optional[BaseException]) -> Optional[BaseException]:
+    """
+    Errors cross the process boundary pickled, fall back to a description when that's impossible
+    """
+    if error is None:
+        return None
+    try:
+        pickle.dumps(error)
+        return error
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
+
+def run_writer(dbPath: str, requests: "multiprocessing.Queue", replies: List["multiprocessing.Queue"],
+writeBehind: bool, batchSize: int = 100, batchInterval: float = 0.25) -> None:
+    """
+    Body of the writer process, applies every worker's writes through one DatabaseExecutor
+    so concurrent writes from all workers share commits
+    :param dbPath: Path to the database file
+    :param requests: Queue every worker sends its writes to, None stops the writer
+    :param replies: Reply queue of each worker, indexed by worker ID
+    :param writeBehind: Hold batches open for batchSize writes or batchInterval seconds
+    :return: None
+    """
+    executor = DatabaseExecutor(dbPath, readers=1, cachedStatements=STATEMENT_CACHE_SIZE,
+                                writeBehind=writeBehind, batchSize=batchSize, batchInterval=batchInterval)
+
+    def reply(workerId: int, requestId: int, isFlush: bool) -> Notify:
+        def notify(result: Any, error: Optional[BaseException]) -> None:
+            metrics = executor.get_flush_metrics() if isFlush else None
+            replies[workerId].put((requestId, result, _sendable(error), metrics))
+        return notify
+
+    while True:
+        request: Optional[WriteRequest] = requests.get()
+        if request is None:
+            break
+        workerId, requestId, func, args = request
+        notify = reply(workerId, requestId, func is None) if requestId is not None else None
+        if func is None:
+            executor.request_flush(notify)
+        else:
+            executor.submit_write(func, *args, notify=notify)
+    executor.close()
+
+class RemoteDatabaseExecutor(DatabaseExecutor):
+    """
+    DatabaseExecutor for a worker process, reads run locally while writes go to the writer process.
+    Threads are only started once used, so the card renderer can still fork cleanly.
+    """
+    def __init__(self, dbPath: str, workerId: int, requests: "multiprocessing.Queue",
+    replies: "multiprocessing.Queue", readers: int = 2, cachedStatements: int = STATEMENT_CACHE_SIZE,
+    writeBehind: bool = False) -> None:
+        """
+        :param dbPath: Path to the database file
+        :param workerId: This worker's index into the writer's reply queues
+        :param requests: Queue of the writer process
+        :param replies: Queue the writer answers this worker on
+        :param readers: Amount of read-only connections to keep open
+        :param cachedStatements: Size of each connection's prepared statement cache
+        :param writeBehind: Whether the writer process holds batches open
+        :return: None
+        """
+        # no local writer thread, everything but the reader pool is replaced
+        self.dbPath = dbPath
+        self.cachedStatements = cachedStatements
+        self.writeBehind = writeBehind
+        self.workerId = workerId
+        self._requests = requests
+        self._replies = replies
+        self._pending: Dict[int, Notify] = dict()
+        self._requestIds = itertools.count()
+        self._listener: Optional[threading.Thread] = None
+        self._listenerLock = threading.Lock()
+        self._writerMetrics: Optional[Dict[str, float]] = None
+        # set once the launcher reports the writer process gone, writes fail right away from then on
+        self._writerError: Optional[BaseException] = None
+        self._pendingLock = threading.Lock()
+        self._start_readers(readers)
+        self._closed = False
+
+    def _listen(self) -> None:
+        """
+        Resolve pending writes as the writer process answers them
+        """
+        while True:
+            reply: Optional[WriteReply] = self._replies.get()
+            if reply is None:
+                break
+            requestId, result, error, metrics = reply
+            if requestId is None:
+                self._fail_pending(error)
+                continue
+            if metrics is not None:
+                self._writerMetrics = metrics
+            with self._pendingLock:
+                notify = self._pending.pop(requestId, None)
+            if notify:
+                notify(result, error)
+
+    def _fail_pending(self, error: BaseException) -> None:
+        """
+        Fail every write still waiting on the writer process, nothing will answer them
+        """
+        with self._pendingLock:
+            self._writerError = error
+            pending, self._pending = self._pending, dict()
+        for notify in pending.values():
+            notify(None, error)
+
+    def _enqueue(self, func: Any, args: Tuple, notify: Notify) -> None:
+        requestId = None
+        if notify is not None:
+            with self._listenerLock:
+                if self._listener is None:
+                    self._listener = threading.Thread(target=self._listen, name="mallard-db-replies", daemon=True)
+                    self._listener.start()
+            with self._pendingLock:
+                if self._writerError is None:
+                    requestId = next(self._requestIds)
+                    self._pending[requestId] = notify
+            if requestId is None:
+                notify(None, self._writerError)
+                return
+        elif self._writerError is not None:
+            if func is not _FLUSH:
+                logger.error("write %s dropped, the database writer is gone", getattr(func, "__name__", func))
+            return
+        self._requests.put((self.workerId, requestId, None if func is _FLUSH else func, args))
+
+    def get_flush_metrics(self) -> Dict[str, float]:
+        """
+        Flush metrics of the writer process as of the last flush this worker asked for
+        :return: Flush count, committed writes, average batch size and commit latency
+        """
+        return self._writerMetrics or {"flushes": 0, "writes": 0, "failed_writes": 0, "avg_batch_size": 0,
+                                       "avg_commit_latency": 0, "last_batch_size": 0, "last_commit_latency": 0}
+
+    def close(self) -> None:
+        """
+        Wait for this worker's writes to be committed and stop the local threads
+        :return: None
+        """
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        if self._listener is not None:
+            self._replies.put(None)
+            self._listener.join()
+        self._readers.shutdown(wait=True)
+
+class InvalidationBus:
+    """
+    Broadcasts changes of cached state to every other worker and applies theirs
+    """
+    def __init__(self, workerId: int, outbox: "multiprocessing.Queue", inbox: "multiprocessing.Queue") -> None:
+        """
+        :param workerId: This worker's ID, messages aren't echoed back to their sender
+        :param outbox: Queue the hub reads from
+        :param inbox: Queue the hub forwards other workers' messages to
+        :return: None
+        """
+        self.workerId = workerId
+        self._outbox = outbox
+        self._inbox = inbox
+        self._handlers: Dict[str, Callable[..., None]] = dict()
+        self.sent = 0
+        self.received = 0
+
+    def subscribe(self, kind: str, handler: Callable[..., None]) -> None:
+        self._handlers[kind] = handler
+
+    def publish(self, kind: str, *args: Any) -> None:
+        """
+        :param kind: Kind of state that changed
+        :param args: Picklable details the handlers of that kind take
+        :return: None
+        """
+        self.sent += 1
+        self._outbox.put((self.workerId, kind, args))
+
+    def _receive(self, loop: asyncio.AbstractEventLoop) -> None:
+        while True:
+            message = self._inbox.get()
+            if message is None:
+                return
+            try:
+                loop.call_soon_threadsafe(self._dispatch, message)
+            except RuntimeError:
+                # the loop closed while shutting down
+                return
+
+    def _dispatch(self, message: Tuple[int, str, Tuple]) -> None:
+        _, kind, args = message
+        self.received += 1
+        handler = self._handlers.get(kind)
+        if handler:
+            handler(*args)
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Apply incoming messages on the event loop, received on a daemon thread so exiting never waits on it
+        :param loop: The bot's running event loop
+        :return: None
+        """
+        threading.Thread(target=self._receive, args=(loop,), name="mallard-bus", daemon=True).start()
+
+    def metrics(self) -> Dict[str, int]:
+        return {"sent": self.sent, "received": self.received}
+
+def _run_hub(outbox: "multiprocessing.Queue", inboxes: List["multiprocessing.Queue"]) -> None:
+    """
+    Forward every worker's invalidation messages to all other workers until None arrives
+    """
+    while True:
+        message = outbox.get()
+        if message is None:
+            return
+        for workerId, inbox in enumerate(inboxes):
+            if workerId != message[0]:
+                inbox.put(message)
+
+def run_worker(token: str, dbPath: str, shardId: int, totalShards: int, requests: "multiprocessing.Queue",
+replies: "multiprocessing.Queue", outbox: "multiprocessing.Queue", inbox: "multiprocessing.Queue",
+writeBehind: bool, warmWorkers: bool = True) -> None:
+    """
+    Body of a worker process, runs the client and Bot of one gateway shard
+    :param token: Bot token
+    :param dbPath: Path to the database file
+    :param shardId: Shard run by this worker, also its worker ID
+    :param totalShards: Shards across every worker
+    :param requests: Queue of the writer process
+    :param replies: Queue the writer answers this worker on
+    :param outbox: Queue of the invalidation hub
+    :param inbox: Queue the hub forwards other workers' messages to
+    :param writeBehind: Whether the writer process holds batches open
+    :param warmWorkers: Start the card and math workers now instead of on first use
+    :return: None
+    """
+    # imported here so the launcher itself never loads the client or the commands
+    import interactions
+    from bot import Bot
+
+    executor = RemoteDatabaseExecutor(dbPath, shardId, requests, replies, writeBehind=writeBehind)
+    bus = InvalidationBus(shardId, outbox, inbox)
+    # only one shard registers the slash commands with Discord
+    client = interactions.Client(token=token, shard_id=shardId, total_shards=totalShards,
+                                 sync_interactions=shardId == 0)
+    db = sqlite3.connect(dbPath, cached_statements=STATEMENT_CACHE_SIZE)
+    bot = Bot(client, db, asyncDatabase=True, writeBehind=writeBehind,
+              metricsPath=f"mallard_metrics_{shardId}.prom", dbExecutor=executor, bus=bus,
+              warmWorkers=warmWorkers)
+    try:
+        client.start()
+    finally:
+        # writes pending XP and waits for this worker's writes to be committed
+        bot.close()
+
+def launch(token: str, dbPath: str, shards: int, writeBehind: bool = True, warmWorkers: bool = True) -> None:
+    """
+    Run the bot as one writer process plus a worker process for each gateway shard
+    :param token: Bot token
+    :param dbPath: Path to the database file
+    :param shards: Gateway shards, one worker process each
+    :param writeBehind: Hold write batches open in the writer process
+    :param warmWorkers: Start every shard's card and math workers at startup instead of on first use
+    :return: None
+    """
+    # migrations run once here instead of racing in every worker
+    conn = sqlite3.connect(dbPath)
+    migrate(conn)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.close()
+
+    context = multiprocessing.get_context()
+    requests = context.Queue()
+    replies = [context.Queue() for _ in range(shards)]
+    outbox = context.Queue()
+    inboxes = [context.Queue() for _ in range(shards)]
+
+    writer = context.Process(target=run_writer, args=(dbPath, requests, replies, writeBehind),
+                             name="mallard-writer")
+    writer.start()
+    processes = list()
+    for shardId in range(shards):
+        process = context.Process(target=run_worker, name=f"mallard-shard-{shardId}",
+                                  args=(token, dbPath, shardId, shards, requests, replies[shardId],
+                                        outbox, inboxes[shardId], writeBehind, warmWorkers))
+        process.start()
+        processes.append(process)
+    # started after forking so no worker inherits a copy of it
+    hub = threading.Thread(target=_run_hub, args=(outbox, inboxes), name="mallard-hub", daemon=True)
+    hub.start()
+
+    writerError: Optional[RuntimeError] = None
+    try:
+        running = {process.sentinel for process in processes}
+        while running:
+            exited = wait([writer.sentinel, *running])
+            if writer.sentinel in exited:
+                # nothing answers the workers' writes anymore, fail them instead of leaving them waiting
+                writer.join()
+                writerError = RuntimeError(f"database writer process exited with code {writer.exitcode}")
+                for workerReplies in replies:
+                    workerReplies.put((None, None, writerError, None))
+                # workers stop as on Ctrl+C, closing fails their remaining writes rather than waiting on them
+                for process in processes:
+                    if process.is_alive():
+                        os.kill(process.pid, signal.SIGINT)
+                for process in processes:
+                    process.join(WORKER_STOP_TIMEOUT)
+                # writes still queued for the writer would otherwise keep this process from exiting
+                requests.cancel_join_thread()
+                break
+            running.difference_update(exited)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        # workers flushed on their way out, the writer drains what's left and stops
+        requests.put(None)
+        writer.join()
+        outbox.put(None)
+        hub.join()
+    if writerError:
+        raise writerError
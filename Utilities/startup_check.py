@@ -0,0 +1,48 @@
+"""
+Startup check against the real interactions library
+Run from the repository root: python -m Utilities.startup_check
+Builds a Bot around an interactions.Client that never connects, loading every
+extension in Commands the way a real start does. Exits non-zero when the bot
+can't be built or a command callback wasn't instrumented.
+"""
+
+import sqlite3
+import sys
+from typing import List
+
+import interactions
+from bot import Bot, get_command_paths
+
+def find_problems(client: interactions.Client, bot: Bot) -> List[str]:
+    """
+    :return: Description of every extension or command that didn't load as expected
+    """
+    problems: List[str] = list()
+    for path in sorted(get_command_paths()):
+        extensions = client.get_extensions(path)
+        if not extensions:
+            problems.append(f"{path} created no extension")
+        for extension in extensions:
+            if getattr(extension, "_parent", None) is not bot:
+                problems.append(f"{type(extension).__name__} wasn't handed the bot")
+            for command in extension._commands:
+                if not getattr(command.callback, "__instrumented__", False):
+                    problems.append(f"{type(extension).__name__} command {command.resolved_name} isn't instrumented")
+    return problems
+
+def main() -> int:
+    client = interactions.Client(token="startup-check")
+    # only the extensions are checked, the card and math workers are never started
+    bot = Bot(client, sqlite3.connect(":memory:"), warmWorkers=False)
+    try:
+        problems = find_problems(client, bot)
+        for extension in sorted(client.ext):
+            print(f"{extension}: {len(client.ext[extension]._commands)} commands")
+    finally:
+        bot.close()
+    for problem in problems:
+        print(f"FAIL {problem}")
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
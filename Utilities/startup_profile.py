@@ -0,0 +1,150 @@
+"""
+Startup timing
+Every boot records how long each startup step takes and when the gateway was
+ready. In profile mode the time spent importing each module is recorded too,
+and a report is written once the bot is ready.
+Only the standard library is imported here, so a profile can start before
+anything it measures.
+"""
+
+import sys
+from contextlib import contextmanager
+from importlib.abc import Loader, MetaPathFinder
+from time import perf_counter
+from types import ModuleType
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# imports listed in a report, slowest first
+REPORT_IMPORTS = 40
+
+class _TimedLoader(Loader):
+    """
+    Wraps a module's loader to time executing it, everything else is passed through
+    """
+    def __init__(self, loader: Loader, name: str, timer: "ImportTimer") -> None:
+        self._loader = loader
+        self._name = name
+        self._timer = timer
+
+    def create_module(self, spec: Any) -> Optional[ModuleType]:
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module: ModuleType) -> None:
+        self._timer._enter()
+        start = perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer._exit(self._name, perf_counter() - start)
+        # later lookups of the loader see the real one
+        if getattr(module, "__loader__", None) is self:
+            module.__loader__ = self._loader
+        if module.__spec__ is not None and module.__spec__.loader is self:
+            module.__spec__.loader = self._loader
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._loader, name)
+
+class ImportTimer(MetaPathFinder):
+    """
+    Records the inclusive and self time of every module imported while installed, like python -X importtime
+    """
+    def __init__(self) -> None:
+        # module -> (inclusive seconds, self seconds)
+        self.times: Dict[str, Tuple[float, float]] = dict()
+        # time spent in nested imports, per import in progress
+        self._nested: List[float] = list()
+
+    def find_spec(self, name: str, path: Optional[Sequence[str]], target: Optional[ModuleType] = None) -> Any:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, name, self)
+                return spec
+        return None
+
+    def _enter(self) -> None:
+        self._nested.append(0.0)
+
+    def _exit(self, name: str, elapsed: float) -> None:
+        nested = self._nested.pop()
+        self.times[name] = (elapsed, elapsed - nested)
+        if self._nested:
+            self._nested[-1] += elapsed
+
+    def install(self) -> None:
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+class StartupProfile:
+    """
+    Durations of the startup steps, measured from the profile's creation to the gateway being ready
+    """
+    def __init__(self, reportPath: Optional[str] = None) -> None:
+        """
+        :param reportPath: Profile mode, import times are recorded and a report is written here once ready
+        :return: None
+        """
+        self.start = perf_counter()
+        self.reportPath = reportPath
+        self.steps: List[Tuple[str, float]] = list()
+        self.readyAfter: Optional[float] = None
+        self.imports: Optional[ImportTimer] = None
+        if reportPath:
+            self.imports = ImportTimer()
+            self.imports.install()
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        """
+        Record the time spent inside the block as a startup step
+        :param name: Name of the step in the report
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, perf_counter() - start))
+
+    def mark_ready(self) -> bool:
+        """
+        Note the gateway being ready, only the first call counts
+        :return: Whether this was the first call
+        """
+        if self.readyAfter is not None:
+            return False
+        self.readyAfter = perf_counter() - self.start
+        if self.imports:
+            self.imports.uninstall()
+        return True
+
+    def report(self) -> str:
+        """
+        :return: The steps in the order they ran, then the slowest imports
+        """
+        lines = [f"time to ready: {self.readyAfter * 1000:.1f}ms" if self.readyAfter is not None
+                 else "not ready yet", "", "steps:"]
+        lines.extend(f"  {elapsed * 1000:10.1f}ms  {name}" for name, elapsed in self.steps)
+        if self.imports:
+            times = sorted(self.imports.times.items(), key=lambda item: item[1][1], reverse=True)
+            lines.extend(("", f"imports: {len(times)} modules, "
+                          f"{sum(selfTime for _, (_, selfTime) in times) * 1000:.1f}ms total",
+                          f"  {'self':>10}    {'cumulative':>10}  module"))
+            lines.extend(f"  {selfTime * 1000:10.1f}ms  {inclusive * 1000:10.1f}ms  {name}"
+                         for name, (inclusive, selfTime) in times[:REPORT_IMPORTS])
+        return "\n".join(lines) + "\n"
+
+    def write_report(self) -> None:
+        if self.reportPath:
+            with open(self.reportPath, "w") as fp:
+                fp.write(self.report())
+
+    def metrics(self) -> Dict[str, float]:
+        return {**dict(self.steps), "ready": self.readyAfter or 0.0}
@@ -4,16 +4,35 @@ An implementation of a wrapper of core bot features
 Authored by John Rumler/rumlerjo
 """
 
+import asyncio
+import logging
 import interactions
 from os import scandir
-from typing import TypeVar, Set, Optional, Union, List, Any, Tuple
+from time import perf_counter
+from typing import TypeVar, Set, Optional, Union, List, Any, Tuple, Dict
 from Utilities.cooldown import CooldownManager
+from Utilities.rate_limit import RateLimiter
+from Utilities.role_cache import RoleCache
+from Utilities.rest_coalescer import RestCoalescer, REST_RESULT_TTL
+from Utilities.interaction_state import InteractionStateStore
+from Utilities.reloader import CommandTracker
+from Utilities.metrics import BotMetrics
+from Utilities.leveling import LevelEngine
+from Utilities.leaderboard import LeaderboardCache
+from Utilities.cards import CardRenderer
+from Utilities.math_eval import MathEvaluator
+from Utilities.sharding import InvalidationBus
+from Utilities.startup_profile import StartupProfile
 from interactions import Extension, Snowflake, SlashContext, Permissions
 from sqlite3 import Connection
-from Utilities.enums import UserType
+from Utilities.enums import UserType, CommandEnums, CooldownEnums
 from Utilities.bot_sql import BotSQL
+from Utilities.db_executor import DatabaseExecutor
+from Utilities.migrations import migrate
 
 
+logger = logging.getLogger(__name__)
+
 # A generic class
 T = TypeVar("T")
 # Forward declaration of Bot
@@ -33,49 +52,109 @@ def get_command_paths() -> Set[T]:
     """
     paths = set()
     for file in scandir("./Commands"):
-        if file.is_file and file.name.find(".py") != -1:
+        if file.is_file() and file.name.endswith(".py"):
             command_name = file.name.replace(".py", "")
             paths.add(f"Commands.{command_name}")
     return paths
 
-def get_database_paths() -> Set[T]:
-    paths = set()
-    for file in scandir("./DatabaseQueries/CreateTables"):
-        if file.is_file and file.name.find(".sql") != -1:
-            paths.add("./DatabaseQueries/CreateTables/" + file.name)
-    return paths
-
 class Bot:
     """
     Wrapper for the bot and some of its functions.
     """
-    def __init__(self, client: interactions.Client, dbConn: Connection) -> None:
+    def __init__(self, client: interactions.Client, dbConn: Connection, asyncDatabase: bool = False,
+    writeBehind: bool = False, watchCommands: bool = False, metricsPath: Optional[str] = None,
+    metricsPort: Optional[int] = None, dbExecutor: Optional[DatabaseExecutor] = None,
+    bus: Optional[InvalidationBus] = None, profile: Optional[StartupProfile] = None,
+    restResultTtl: float = REST_RESULT_TTL, cards: Optional[CardRenderer] = None,
+    math: Optional[MathEvaluator] = None, warmWorkers: bool = True) -> None:
         self._client = client
+        # set when running as one of several shard processes, see Utilities.sharding
+        self.bus = bus
+        # how long each startup step took, reported in full in profile mode
+        self.profile = profile if profile else StartupProfile()
+        # rank and profile cards and /math, without warmWorkers their workers start on the first command
+        self.cards = cards if cards else CardRenderer()
+        self.math = math if math else MathEvaluator()
+        if warmWorkers:
+            # card workers are forked before any database threads exist
+            with self.profile.step("card workers"):
+                self.cards.warm()
+            # math workers import sympy in the background so startup doesn't wait for it
+            with self.profile.step("math workers"):
+                self.math.warm()
+        # latency of every command, exported to metricsPath and/or a local metricsPort
+        self.metrics = BotMetrics()
+        self.metrics.instrument_http(client)
+        self._metricsPath = metricsPath
+        self._metricsPort = metricsPort
+        self._metricsTasks: List[Any] = list()
         self._cooldowns = CooldownManager()
-        self.sql = BotSQL(dbConn)
+        self._rateLimits = RateLimiter()
+        # shared by every extension, BotSQL keeps it current as roles are added
+        self.roles = RoleCache()
+        # identical owner and member fetches share one REST request, reused for restResultTtl seconds
+        self.rest = RestCoalescer(restResultTtl)
+        # component flow state lives here so it survives extension reloads
+        self.state = InteractionStateStore()
+        with self.profile.step("database executor"):
+            self.sql = BotSQL(dbConn, asyncMode=asyncDatabase, writeBehind=writeBehind, roleCache=self.roles,
+                              executor=dbExecutor, publish=bus.publish if bus else None, rest=self.rest)
+        # message XP, kept in memory and flushed in batches by a background task
+        self.levels = LevelEngine(self.sql, self._cooldowns)
+        self._levelFlusher: Optional[asyncio.Task] = None
+        # rankings of guilds that were looked at, updated as XP changes
+        self.leaderboards = LeaderboardCache(self.sql, self.levels)
 
         # used as a checker to see which commands are running
         self._extensions: Set[Extension] = set()
+        self._commandTracker = CommandTracker()
+        # reload commands as their files change, for development
+        self._watchCommands = watchCommands
+        self._commandWatcher: Optional[asyncio.Task] = None
 
         # load our commands and register discord events
         self.load_commands()
         self.register_events()
+        self._subscribe_invalidations()
 
         # setup database tables
-        self._create_database_tables()
+        with self.profile.step("database migrations"):
+            self._migrate_database()
+        with self.profile.step("known entities"):
+            self.sql.load_known_entities()
+        with self.profile.step("guild user xp"):
+            self.levels.load(self.sql.get_all_guild_user_xp() or [])
+        with self.profile.step("balances"):
+            self.sql.load_balances()
+        self._register_metric_collectors()
+
+    def _attach_extensions(self, command: str) -> None:
+        """
+        Hand the bot to every extension a command module created
+        :param command: Module name of the command
+        :return: None
+        """
+        extensions: List[BotExtension] = self._client.get_extensions(command)
+        # looping as a precaution however this should only return 1.
+        for extension in extensions:
+            self._extensions.add(extension) # this is now not necessary. may remove
+            extension.add_parent(self)
+            self.metrics.instrument_extension(extension)
+
+    def _detach_extensions(self, command: str) -> None:
+        for extension in self._client.get_extensions(command):
+            self._extensions.discard(extension)
 
     def load_commands(self) -> None:
         """
         Load commands onto the client
         :return: None
         """
-        for command in get_command_paths():
-            self._client.load_extension(command)
-            extensions: List[BotExtension] = self._client.get_extensions(command)
-            # looping as a precaution however this should only return 1.
-            for extension in extensions:
-                self._extensions.add(extension) # this is now not necessary. may remove
-                extension.add_parent(self)
+        for command, state in self._commandTracker.changes().added:
+            with self.profile.step("extension " + command):
+                self._client.load_extension(command)
+                self._attach_extensions(command)
+            self._commandTracker.mark_loaded(command, state)
     
     def register_events(self) -> None:
         """
@@ -84,27 +163,174 @@ class Bot:
         """
         @self._client.event(event_name="on_ready")
         async def __ready():
+            # warm the role cache for every guild with one query
+            with self.profile.step("role cache"):
+                await self.sql.flush_async()
+                self.roles.load(await self.sql.get_all_assignable_roles_async() or [])
+            if self.bus and self._levelFlusher is None:
+                self.bus.start(asyncio.get_running_loop())
+            if self._levelFlusher is None:
+                self._levelFlusher = asyncio.create_task(self.levels.run_flusher())
+            if self._watchCommands and self._commandWatcher is None:
+                self._commandWatcher = asyncio.create_task(self.watch_commands())
+            if not self._metricsTasks:
+                if self._metricsPath:
+                    self._metricsTasks.append(asyncio.create_task(self.metrics.export_file(self._metricsPath)))
+                if self._metricsPort:
+                    self._metricsTasks.append(await self.metrics.serve(port=self._metricsPort))
             print("started bot")
+            if self.profile.mark_ready():
+                print(f"ready {self.profile.readyAfter:.2f}s after starting")
+                self.profile.write_report()
+
+        @self._client.event(event_name="on_message_create")
+        async def __message_create(event):
+            message = event.message
+            if message.author.bot or message.guild is None:
+                return
+            self.levels.add_message(int(message.guild.id), int(message.author.id))
+
+        # permission cache invalidation, resolved levels are rebuilt on next use
+        @self._client.event(event_name="on_member_update")
+        async def __member_update(event):
+            self.sql.permissions.invalidate_member(int(event.guild_id), int(event.after.id))
+            self.rest.invalidate(int(event.guild_id), int(event.after.id))
+
+        @self._client.event(event_name="on_role_create")
+        async def __role_create(event):
+            self.sql.permissions.invalidate_guild(int(event.guild_id))
+
+        @self._client.event(event_name="on_role_update")
+        async def __role_update(event):
+            self.sql.permissions.invalidate_guild(int(event.guild_id))
+
+        @self._client.event(event_name="on_role_delete")
+        async def __role_delete(event):
+            self.sql.permissions.invalidate_guild(int(event.guild_id))
 
-    async def reload_commands(self) -> None:
+        @self._client.event(event_name="on_guild_update")
+        async def __guild_update(event):
+            self.sql.permissions.invalidate_guild(int(event.after.id))
+            # ownership may have been transferred
+            self.rest.invalidate(int(event.after.id))
+
+    def _subscribe_invalidations(self) -> None:
         """
-        Reload commands on the client
+        Apply cache changes made by other shard processes, guild state stays with the guild's shard
+        and only what's keyed on users is shared
         :return: None
         """
-        for command in get_command_paths():
-            self._client.reload_extension(command)
-            extensions: List[BotExtension] = self._client.get_extensions(command)
-            for extension in extensions:
-                self._extensions.add(extension)
-                extension.add_parent(self)
+        if not self.bus:
+            return
+        self.bus.subscribe("roles", lambda guildId: self.roles.invalidate(guildId))
+        self.bus.subscribe("levels_hold", self.levels.hold)
+        self.bus.subscribe("levels", lambda guildIds: asyncio.ensure_future(self._reload_imported_levels(guildIds)))
+        self.bus.subscribe("balances", lambda entryId:
+                           asyncio.ensure_future(self.sql.reload_balances_since_async(entryId)))
+        self.bus.subscribe("balance", lambda userId, balance: self.sql.balances.set(userId, balance))
+        self.bus.subscribe("cooldown", lambda cType, commandId, userId, time, guildId:
+                           self._cooldowns.set_cooldown(commandId, userId, time, CooldownEnums(cType), guildId))
+
+    async def _reload_guild_levels(self, guildId: int) -> None:
+        """
+        Read a guild's XP back into the level engine after it was replaced in the database
+        """
+        rows = await self.sql.get_guild_leaderboard_async(guildId) or []
+        self.levels.reset_guild(guildId, rows)
+        self.leaderboards.invalidate(guildId)
+
+    async def _reload_imported_levels(self, guildIds: List[int]) -> None:
+        """
+        Read back the XP of guilds another shard imported, then resume the flushes its levels_hold stopped
+        """
+        try:
+            for guildId in guildIds:
+                await self._reload_guild_levels(guildId)
+        finally:
+            self.levels.release()
+
+    async def import_guild_data(self, path: str, fmt: str) -> Tuple[Dict[str, int], Set[int]]:
+        """
+        Import a guild export and bring every cache of the imported guilds up to date
+        :param path: File read from
+        :param fmt: jsonl or csv
+        :return: Rows read per table and the guilds that were imported
+        """
+        # pending XP is written first, then flushes on every shard wait until the imported XP is read back
+        await self.levels.flush_async()
+        self.levels.hold()
+        if self.bus:
+            self.bus.publish("levels_hold")
+        guildIds: Set[int] = set()
+        try:
+            counts, guildIds = await self.sql.import_guild_async(path, fmt)
+            for guildId in guildIds:
+                await self._reload_guild_levels(guildId)
+        finally:
+            self.levels.release()
+            # other shards release their hold once they've read the guilds back, none when the import failed
+            if self.bus:
+                self.bus.publish("levels", sorted(guildIds))
+        return counts, guildIds
+
+    async def reload_commands(self) -> List[Tuple[str, str, float]]:
+        """
+        Reload only the command modules that changed since they were loaded.
+        New modules are loaded and deleted ones unloaded.
+        :return: List of (module, action, seconds taken) for every module touched
+        """
+        report: List[Tuple[str, str, float]] = list()
+        changes = self._commandTracker.changes()
+
+        for command in changes.removed:
+            start = perf_counter()
+            self._detach_extensions(command)
+            self._client.unload_extension(command)
+            self._commandTracker.forget(command)
+            report.append((command, "unloaded", perf_counter() - start))
+
+        for commands, action in ((changes.changed, "reloaded"), (changes.added, "loaded")):
+            for command, state in commands:
+                start = perf_counter()
+                try:
+                    if action == "reloaded":
+                        self._detach_extensions(command)
+                        self._client.reload_extension(command)
+                    else:
+                        self._client.load_extension(command)
+                except Exception as e:
+                    # left unmarked so the next reload tries it again
+                    report.append((command, f"failed ({e})", perf_counter() - start))
+                    continue
+                self._attach_extensions(command)
+                self._commandTracker.mark_loaded(command, state)
+                report.append((command, action, perf_counter() - start))
+
+        return report
+
+    async def watch_commands(self, interval: float = 1.0) -> None:
+        """
+        Development mode: poll the command directory and reload modules as they change
+        :param interval: Seconds between checks
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                for command, action, elapsed in await self.reload_commands():
+                    print(f"{command} {action} in {elapsed * 1000:.1f}ms")
+            except Exception:
+                # a file vanishing mid-scan or an extension failing to unload must not end the watcher
+                logger.exception("reloading commands failed, polling again in %gs", interval)
 
     async def unload_all_commands(self) -> None:
         """
         Unload all currently loaded commands
         :return None:
         """
-        for command in get_command_paths():
+        for command in self._commandTracker.loaded():
             self._client.unload_extension(command)
+            self._commandTracker.forget(command)
         # just set it back to empty because it (should) be
         self._extensions = set()
 
@@ -113,7 +339,7 @@ class Bot:
         Fully unload and reload every currently loaded extension
         :return None:
         """
-        self.unload_all_commands()
+        await self.unload_all_commands()
         self.load_commands()
 
     def set_cooldown(self, cType: int, commandId: int, userId: Union[str, int],
@@ -128,6 +354,9 @@ class Bot:
         :return: None
         """
         self._cooldowns.set_cooldown(commandId, userId, time, cType, guildId)
+        if self.bus and cType == CooldownEnums.GLOBAL:
+            # a global cooldown follows the user onto every shard
+            self.bus.publish("cooldown", cType.value, getattr(commandId, "value", commandId), int(userId), time, None)
 
     def get_cooldown(self, userId: Snowflake, commandId: int,
     guildId: Optional[Snowflake] = None) -> Optional[int]:
@@ -140,13 +369,66 @@ class Bot:
         """
         return self._cooldowns.get_cooldown(userId, commandId, guildId)
         
-    def _create_database_tables(self) -> None:
+    def check_rate_limit(self, commandId: CommandEnums, userId: Snowflake,
+    guildId: Optional[Snowflake] = None) -> Optional[int]:
+        """
+        A wrapper for RateLimiter's check, counts the use when it's allowed
+        :param commandId: Command enumeration
+        :param userId: Integer or String representation of a user's unique identifier
+        :param guildId: Integer or String representation of a guild's unique identifier
+        :return: Seconds to wait before retrying or None if allowed
+        """
+        return self._rateLimits.check(commandId, userId, guildId)
+
+    def get_rate_limit_rejections(self) -> Dict[str, int]:
+        """
+        :return: Name of each command -> times a use was rejected by its rate limits
+        """
+        return dict(self._rateLimits.rejectionsByCommand)
+
+    def _register_metric_collectors(self) -> None:
+        """
+        Expose cache, rate limit and database counters alongside command latency
+        :return: None
+        """
+        self.metrics.add_collector("role_cache", "stat", lambda: {
+            "hits": self.roles.hits, "misses": self.roles.misses, "guilds": len(self.roles)})
+        self.metrics.add_collector("interaction_state", "stat", self.state.metrics)
+        self.metrics.add_collector("rate_limit_rejections", "command",
+                                   self.get_rate_limit_rejections)
+        self.metrics.add_collector("known_entities", "stat", lambda: {
+            "guilds": len(self.sql.known.guilds), "users": len(self.sql.known.users),
+            "guild_users": len(self.sql.known.guildUsers)})
+        self.metrics.add_collector("db_flush", "stat", lambda: self.sql.get_flush_metrics() or {})
+        self.metrics.add_collector("levels", "stat", self.levels.metrics)
+        self.metrics.add_collector("leaderboards", "stat", lambda: {"guilds": len(self.leaderboards)})
+        self.metrics.add_collector("balances", "stat", lambda: {"users": len(self.sql.balances)})
+        self.metrics.add_collector("cards", "stat", self.cards.metrics)
+        self.metrics.add_collector("math", "stat", self.math.metrics)
+        self.metrics.add_collector("rest_coalescing", "stat", self.rest.metrics)
+        self.metrics.add_collector("startup_seconds", "step", self.profile.metrics)
+        if self.bus:
+            self.metrics.add_collector("invalidations", "stat", self.bus.metrics)
+
+    def _migrate_database(self) -> None:
+        """
+        Bring the database schema up to date on startup, a single pragma read when it already is
+        :return None:
+        """
+        applied = migrate(self.sql.conn)
+        if applied:
+            print("applied database migrations: " + ", ".join(str(version) for version in applied))
+
+    def close(self) -> None:
         """
-        Read in and execute database creation scripts on startup
+        Write pending XP and queued database writes, then stop the database, card and math workers
         :return None:
         """
-        for queryFile in get_database_paths():
-            fp = open(queryFile, "r")
-            fpData = fp.read()
-            self.sql.execute_and_commit(fpData)
-            fp.close()
\ No newline at end of file
+        try:
+            self.levels.flush()
+        except Exception:
+            # the database still gets closed, the unsaved XP is lost
+            logger.exception("writing pending XP on close failed")
+        self.sql.close()
+        self.cards.close()
+        self.math.close()
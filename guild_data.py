@@ -0,0 +1,40 @@
+import argparse
+import sqlite3
+import sys
+from Utilities.guild_data import FORMATS, export_guild, import_guild, format_for_path
+from Utilities.migrations import migrate
+
+DATABASE_PATH = "mallard.db"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or import one guild's bot data.")
+    parser.add_argument("--db", default=DATABASE_PATH, help="database file")
+    parser.add_argument("--format", choices=FORMATS, help="file format, taken from the file name if not given")
+    commands = parser.add_subparsers(dest="command", required=True)
+    exporting = commands.add_parser("export", help="write a guild's rows to a file, - for stdout")
+    exporting.add_argument("guild", type=int, help="guild ID")
+    exporting.add_argument("path")
+    # the running bot caches what it reads, import while it's stopped or use /guild-data import
+    importing = commands.add_parser("import", help="load an export in one transaction, - for stdin (bot stopped)")
+    importing.add_argument("path")
+    args = parser.parse_args()
+    fmt = args.format or format_for_path(args.path)
+
+    conn = sqlite3.connect(args.db)
+    migrate(conn)
+    try:
+        if args.command == "export":
+            out = sys.stdout if args.path == "-" else open(args.path, "w", newline="", encoding="utf-8")
+            with out:
+                counts = export_guild(conn, args.guild, out, fmt)
+        else:
+            rows = sys.stdin if args.path == "-" else open(args.path, "r", newline="", encoding="utf-8")
+            with rows:
+                counts, _ = import_guild(conn, rows, fmt)
+            conn.commit()
+    except:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    print(", ".join(f"{amount} {table}" for table, amount in counts.items()), file=sys.stderr)
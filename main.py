@@ -1,10 +1,42 @@
-import sqlite3
-from bot import Bot
-import interactions
+import argparse
+from Utilities.startup_profile import StartupProfile
 
-db = sqlite3.connect("mallard.db")
+DATABASE_PATH = "mallard.db"
 
-client = interactions.Client(token=open("token.txt", "r").read())
-bot = Bot(client, db)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the bot.")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="gateway shards, each in its own process sharing one database writer process")
+    parser.add_argument("--profile-startup", nargs="?", const="startup_profile.txt", metavar="PATH",
+                        help="time every import and startup step, the report is written once ready (single process)")
+    parser.add_argument("--lazy-workers", action="store_true",
+                        help="start the card and math workers on the first command that needs them, not at startup")
+    args = parser.parse_args()
+    # started before the imports below so they're part of the profile
+    profile = StartupProfile(args.profile_startup if args.shards == 1 else None)
 
-client.start()
\ No newline at end of file
+    token = open("token.txt", "r").read()
+
+    if args.shards > 1:
+        # the launcher never loads the client or the commands, every shard process imports its own
+        from Utilities.sharding import launch
+        launch(token, DATABASE_PATH, args.shards, warmWorkers=not args.lazy_workers)
+    else:
+        with profile.step("imports"):
+            import sqlite3
+            import interactions
+            from bot import Bot
+            from Utilities.queries import STATEMENT_CACHE_SIZE
+        db = sqlite3.connect(DATABASE_PATH, cached_statements=STATEMENT_CACHE_SIZE)
+
+        client = interactions.Client(token=token)
+        # async database mode keeps sqlite work off the gateway event loop,
+        # write-behind batches inserts so join bursts share a handful of commits
+        bot = Bot(client, db, asyncDatabase=True, writeBehind=True, metricsPath="mallard_metrics.prom",
+                  profile=profile, warmWorkers=not args.lazy_workers)
+
+        try:
+            client.start()
+        finally:
+            # flushes pending XP and anything still waiting in the write-behind queue
+            bot.close()